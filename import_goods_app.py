@@ -6,25 +6,77 @@ A comprehensive dashboard for tracking imported molecules, companies, distributo
 
 import os
 import json
+import hashlib
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+import tempfile
+import threading
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple, Optional, Any, Callable
 from dataclasses import dataclass, asdict
+import numpy as np
 import pandas as pd
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from werkzeug.utils import secure_filename
 import openpyxl
+from import_goods_storage import open_storage, empty_data, apply_checkpoints, CHECKPOINTS
+from import_goods_table import ImportTable, ImportSelection, INVALID_DATE
+from import_goods_index import EntityRegistry, TrigramIndex
+from import_goods_metrics import METRICS_ENGINES, MetricsCache, TOP_N
+from import_goods_rollup import DailyRollup
+from import_goods_hll import DailyDistinct
+from import_goods_tdigest import MonthlyPriceDigests
+from import_goods_parallel import ParallelAggregator, can_shard
+from import_goods_timeseries import GRANULARITIES, bucket_series, lttb
+from import_goods_sliding import SlidingWindows, WINDOW_DAYS
+from import_goods_ingest import (ALLOWED_CURRENCIES, REQUIRED_COLUMNS, INGEST_CHUNK_ROWS, INGEST_READERS,
+                                 ingest_frame, resolve_rows, open_reader, sheet_tasks, parse_workbooks,
+                                 file_digest)
+from import_goods_topk import HistoryTopK, top_k_indices, top_k_items
+from import_goods_jobs import IngestQueue, IngestJob
+from import_goods_fingerprint import FingerprintIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Allowed currencies
-ALLOWED_CURRENCIES = ["USD", "EUR", "INR", "GBP", "JPY", "CNY"]
-
 # Common units
 COMMON_UNITS = ["KG", "TON", "L", "ML", "PCS"]
 
+# Compact the import table in the background once this share of its rows are tombstones
+TOMBSTONE_COMPACT_RATIO = 0.25
+
+# Metrics results kept per data version by the LRU cache
+METRICS_CACHE_SIZE = 128
+
+# Date windows with at least this many rows are aggregated in month shards on a process pool
+PARALLEL_METRICS_ROWS = 200000
+
+# Largest accepted upload; uploads over STREAMING_UPLOAD_BYTES are spooled to
+# disk and streamed in chunks instead of being read into one DataFrame
+MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+STREAMING_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Largest k accepted by the top-k APIs
+MAX_TOP_N = 100
+
+# Quantiles reported by the price-quantiles API when none are requested
+DEFAULT_PRICE_QUANTILES = [0.5, 0.9]
+
+# Time series metrics: import count, quantity, or value (quantity x unit price)
+TIMESERIES_METRICS = ["count", "quantity", "value"]
+
+# Points returned by the time series API unless fewer are requested, and the most it accepts
+TIMESERIES_POINTS = 500
+MAX_TIMESERIES_POINTS = 5000
+
+# Import field referencing each entity type
+REFERENCE_FIELD_BY_ENTITY = {
+    "molecules": "molecule_id",
+    "companies": "company_id",
+    "distributors": "distributor_id"
+}
+
 # Data models
 @dataclass
 class Molecule:
@@ -52,7 +104,7 @@ class Import:
     company_id: str
     distributor_id: str
     country: str
-    shipment_mode: Optional[str] = None
+    shipment_mode: Optional[str]
     quantity: float
     unit: str
     unit_price: float
@@ -60,50 +112,97 @@ class Import:
     hs_code: Optional[str] = None
 
 class ImportGoodsApp:
-    def __init__(self, data_file: str = "import_goods_data.json"):
+    def __init__(self, data_file: str = "import_goods_data.json", storage=None,
+                 metrics_engine: str = "rollup", parallel_rows: Optional[int] = PARALLEL_METRICS_ROWS):
         self.data_file = data_file
+        # `storage` is an engine instance or name ("json", "journal", "sqlite");
+        # by default it is picked from the file extension (.db/.sqlite -> SQLite, else JSON)
+        if storage is None or isinstance(storage, str):
+            storage = open_storage(data_file, storage)
+        self.storage = storage
+        if metrics_engine not in METRICS_ENGINES:
+            raise ValueError(f"Unknown metrics engine: {metrics_engine}")
+        # "rollup" (sums of daily rollup buckets), "vectorized" (NumPy group-bys
+        # over the table columns) or "python" (row by row)
+        self.metrics_engine = metrics_engine
+        # With a row-scanning engine, windows of at least `parallel_rows` rows use
+        # the process pool instead (None disables it)
+        self.parallel_rows = parallel_rows
         self.data = self.load_data()
+        # id, normalized-name and trigram indexes over molecules, companies and distributors
+        self.registry = EntityRegistry(self.data)
+        # Trigram index over distinct country values, synced lazily from the import table
+        self._country_index = TrigramIndex()
+        self._country_index_source = None
+        # Serializes import table mutations with the background compaction that swaps the table
+        self._table_lock = threading.RLock()
+        self._compaction: Optional[threading.Thread] = None
+        self.parallel = ParallelAggregator(self._table_lock)
+        # Uploads run one at a time on the queue's worker thread
+        self.ingest_jobs = IngestQueue()
+        # Bumped by every mutation; cached metrics are only valid for the version they were computed at
+        self.data_version = 0
+        self.metrics_cache = MetricsCache(METRICS_CACHE_SIZE)
+        # Versions restart with the process, so ETags also carry a per-process salt
+        self._etag_salt = os.urandom(8).hex()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
     
     def load_data(self) -> Dict[str, Any]:
-        """Load data from JSON file or initialize empty structure"""
+        """Load data from the storage engine or initialize empty structure"""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.info(f"Loaded data from {self.data_file}")
-                    return data
+            data = self.storage.load()
+            if data is not None:
+                # Imports are held column-wise; entity lists stay plain dicts
+                data["imports"] = ImportTable(data.get("imports") or [])
+                data["imports"].rollup = DailyRollup(data["imports"])
+                data["imports"].listeners.append(HistoryTopK(data["imports"]))
+                data["imports"].listeners.append(DailyDistinct(data["imports"]))
+                data["imports"].listeners.append(MonthlyPriceDigests(data["imports"]))
+                data["imports"].listeners.append(SlidingWindows())
+                data["imports"].listeners.append(FingerprintIndex(data["imports"]))
+                data.setdefault(CHECKPOINTS, {})
+                logger.info(f"Loaded data from {self.data_file}")
+                return data
         except Exception as e:
             logger.warning(f"Error loading data: {e}")
         
         # Initialize empty structure
-        empty_data = {
-            "molecules": [],
-            "companies": [],
-            "distributors": [],
-            "imports": []
-        }
+        data = empty_data()
+        data["imports"] = ImportTable()
+        data["imports"].rollup = DailyRollup()
+        data["imports"].listeners.append(HistoryTopK())
+        data["imports"].listeners.append(DailyDistinct())
+        data["imports"].listeners.append(MonthlyPriceDigests())
+        data["imports"].listeners.append(SlidingWindows())
+        data["imports"].listeners.append(FingerprintIndex())
         logger.info("Initialized empty data structure")
-        return empty_data
+        return data
     
     def save_data(self, data: Dict[str, Any]) -> bool:
-        """Save data to JSON file atomically"""
-        try:
-            # Write to temporary file first
-            temp_file = f"{self.data_file}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            # Atomic move
-            if os.path.exists(self.data_file):
-                os.replace(temp_file, self.data_file)
-            else:
-                os.rename(temp_file, self.data_file)
-            
-            logger.info(f"Data saved to {self.data_file}")
-            return True
-        except Exception as e:
-            logger.error(f"Error saving data: {e}")
-            return False
+        """Save the full data set through the storage engine"""
+        return self.storage.save(data)
+    
+    def _commit(self, inserts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                deletes: Optional[Dict[str, List[str]]] = None,
+                checkpoints: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> bool:
+        """Persist records just added to or removed from self.data
+
+        `checkpoints` maps an ingest source to its resume state (None clears
+        it) and is written atomically with the records; it is only kept in
+        self.data if the write succeeds.
+        """
+        self.data_version += 1
+        # HTTP dates have one-second resolution; keep them strictly increasing
+        # so a second write within the same second still changes Last-Modified
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.last_modified = max(now, self.last_modified + timedelta(seconds=1))
+        stored = self.data.setdefault(CHECKPOINTS, {})
+        previous = {source: stored.get(source) for source in checkpoints or {}}
+        apply_checkpoints(stored, checkpoints)
+        saved = self.storage.apply(self.data, inserts=inserts, deletes=deletes, checkpoints=checkpoints)
+        if not saved:
+            apply_checkpoints(stored, previous)
+        return saved
     
     def validate_and_fix_data(self, data: Dict[str, Any]) -> List[str]:
         """Validate and fix data structure, return list of issues"""
@@ -111,7 +210,7 @@ class ImportGoodsApp:
         
         # Ensure all required lists exist
         for key in ["molecules", "companies", "distributors", "imports"]:
-            if key not in data or not isinstance(data[key], list):
+            if key not in data or not isinstance(data[key], (list, ImportTable)):
                 data[key] = []
         
         # Validate molecules
@@ -158,7 +257,7 @@ class ImportGoodsApp:
         
         # Validate imports
         for import_record in data["imports"]:
-            if not isinstance(import_record, dict):
+            if not isinstance(import_record, Mapping):
                 issues.append(f"Invalid import format: {import_record}")
                 continue
             
@@ -179,7 +278,8 @@ class ImportGoodsApp:
             # Validate quantity
             try:
                 quantity = float(import_record["quantity"])
-                if quantity <= 0:
+                # NaN marks a value the import table could not parse
+                if not quantity > 0:
                     issues.append(f"Invalid quantity in import: {quantity}")
             except (ValueError, TypeError):
                 issues.append(f"Invalid quantity format in import: {import_record['quantity']}")
@@ -187,7 +287,7 @@ class ImportGoodsApp:
             # Validate unit price
             try:
                 unit_price = float(import_record["unit_price"])
-                if unit_price < 0:
+                if not unit_price >= 0:
                     issues.append(f"Invalid unit price in import: {unit_price}")
             except (ValueError, TypeError):
                 issues.append(f"Invalid unit price format in import: {import_record['unit_price']}")
@@ -201,213 +301,288 @@ class ImportGoodsApp:
     def get_time_filtered_data(self, time_filter: str, search_molecule: str = "", 
                               search_country: str = "") -> Dict[str, Any]:
         """Get data filtered by time and search criteria"""
-        # Calculate date window
+        # Calculate date window; unknown filters default to monthly
         today = datetime.now().date()
-        
-        if time_filter == "daily":
-            start_date = today - timedelta(days=1)
-        elif time_filter == "weekly":
-            start_date = today - timedelta(days=7)
-        elif time_filter == "monthly":
-            start_date = today - timedelta(days=30)
-        elif time_filter == "quarterly":
-            start_date = today - timedelta(days=90)
-        elif time_filter == "yearly":
-            start_date = today - timedelta(days=365)
-        else:
-            start_date = today - timedelta(days=30)  # Default to monthly
-        
-        # Filter imports by date and search
-        filtered_imports = []
-        for import_record in self.data["imports"]:
-            try:
-                import_date = datetime.strptime(import_record["date"], "%Y-%m-%d").date()
-                if import_date < start_date or import_date > today:
-                    continue
-                
-                # Apply search filters
-                if search_molecule:
-                    molecule = next((m for m in self.data["molecules"] if m["id"] == import_record["molecule_id"]), None)
-                    if molecule and search_molecule.lower() not in molecule["name"].lower():
-                        continue
-                
-                if search_country and search_country.lower() not in import_record["country"].lower():
-                    continue
-                
-                filtered_imports.append(import_record)
-            except ValueError:
-                continue
+        start_date = today - timedelta(days=WINDOW_DAYS.get(time_filter, WINDOW_DAYS["monthly"]))
         
         return {
-            "imports": filtered_imports,
+            "imports": self._select_imports(start_date, today, search_molecule, search_country),
             "molecules": self.data["molecules"],
             "companies": self.data["companies"],
             "distributors": self.data["distributors"]
         }
     
+    def response_etag(self, *params) -> str:
+        """Strong ETag for a response derived from the data version and the query parameters"""
+        key = repr((self._etag_salt, self.data_version) + params)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+    
+    def get_metrics(self, time_filter: str, search_molecule: str = "",
+                    search_country: str = "", top_n: int = TOP_N) -> Dict[str, Any]:
+        """Metrics for a rolling time window, served from the metrics cache
+
+        Unfiltered standard windows come from the sliding-window totals when
+        the rollup engine is in use.
+        """
+        def compute():
+            if (self.metrics_engine == "rollup" and time_filter in WINDOW_DAYS
+                    and not search_molecule and not search_country):
+                imports = self.data["imports"]
+                with self._table_lock:
+                    windows = next(listener for listener in imports.listeners
+                                   if isinstance(listener, SlidingWindows))
+                    return windows.metrics(imports, time_filter, self.registry,
+                                           datetime.now().date().toordinal(), top_n)
+            return self.calculate_metrics(
+                self.get_time_filtered_data(time_filter, search_molecule, search_country), top_n=top_n)
+        
+        key = ("window", time_filter, search_molecule.lower(), search_country.lower(), top_n)
+        return self.metrics_cache.get_or_compute(key, self.data_version, compute)
+    
+    def get_custom_date_metrics(self, start_date: str, end_date: str, search_molecule: str = "",
+                                search_country: str = "", top_n: int = TOP_N) -> Dict[str, Any]:
+        """Metrics for a custom date range, served from the metrics cache; {"error": ...} on bad input"""
+        def compute():
+            result = self.get_custom_date_data(start_date, end_date, search_molecule, search_country)
+            return result if "error" in result else self.calculate_metrics(result, top_n=top_n)
+        
+        key = ("custom", start_date, end_date, search_molecule.lower(), search_country.lower(), top_n)
+        return self.metrics_cache.get_or_compute(key, self.data_version, compute)
+    
     def get_custom_date_data(self, start_date: str, end_date: str, 
                             search_molecule: str = "", search_country: str = "") -> Dict[str, Any]:
         """Get data for custom date range"""
-        try:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
-            
-            if start_dt > end_dt:
-                return {"error": "Start date must be before end date"}
-            
-            if (end_dt - start_dt).days > 366:
-                return {"error": "Date range cannot exceed 366 days"}
-            
-        except ValueError:
-            return {"error": "Invalid date format. Use YYYY-MM-DD"}
-        
-        # Filter imports by date range and search
-        filtered_imports = []
-        for import_record in self.data["imports"]:
-            try:
-                import_date = datetime.strptime(import_record["date"], "%Y-%m-%d").date()
-                if import_date < start_dt or import_date > end_dt:
-                    continue
-                
-                # Apply search filters
-                if search_molecule:
-                    molecule = next((m for m in self.data["molecules"] if m["id"] == import_record["molecule_id"]), None)
-                    if molecule and search_molecule.lower() not in molecule["name"].lower():
-                        continue
-                
-                if search_country and search_country.lower() not in import_record["country"].lower():
-                    continue
-                
-                filtered_imports.append(import_record)
-            except ValueError:
-                continue
+        start_dt, end_dt, error = self._parse_date_range(start_date, end_date, max_days=366)
+        if error:
+            return {"error": error}
         
         return {
-            "imports": filtered_imports,
+            "imports": self._select_imports(start_dt, end_dt, search_molecule, search_country),
             "molecules": self.data["molecules"],
             "companies": self.data["companies"],
             "distributors": self.data["distributors"]
         }
     
-    def calculate_metrics(self, filtered_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Calculate KPIs and aggregations"""
+    @staticmethod
+    def _parse_date_range(start_date: str, end_date: str, max_days: Optional[int] = None):
+        """Parse a YYYY-MM-DD date range; returns (start, end, error message or None)"""
+        try:
+            start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
+            end_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
+        except ValueError:
+            return None, None, "Invalid date format. Use YYYY-MM-DD"
+        
+        if start_dt > end_dt:
+            return None, None, "Start date must be before end date"
+        
+        if max_days is not None and (end_dt - start_dt).days > max_days:
+            return None, None, f"Date range cannot exceed {max_days} days"
+        
+        return start_dt, end_dt, None
+    
+    def _molecule_codes(self, search_molecule: str) -> List[int]:
+        """Molecule codes matching a molecule search, via the trigram index"""
+        molecule_codes = self.data["imports"].dictionaries["molecule_id"].codes
+        matching = self.registry.search_ids("molecules", search_molecule)
+        codes = [molecule_codes[m] for m in matching if m in molecule_codes]
+        # Imports of molecules missing from the catalog are not filtered out
+        codes += [code for molecule_id, code in molecule_codes.items()
+                  if not self.registry.exists("molecules", molecule_id)]
+        return codes
+    
+    def _select_imports(self, start_date, end_date, search_molecule: str = "",
+                        search_country: str = "") -> ImportSelection:
+        """Select imports dated within [start_date, end_date] that match the search filters"""
+        imports = self.data["imports"]
+        selection = imports.date_range(start_date.toordinal(), end_date.toordinal())
+        
+        # Search filters resolve to candidate code sets through the trigram indexes
+        if search_molecule:
+            selection = selection.where("molecule_id", self._molecule_codes(search_molecule))
+        
+        if search_country:
+            selection = selection.where("country", self._search_countries(search_country))
+        
+        return selection
+    
+    def _search_countries(self, needle: str):
+        """Country codes whose value contains `needle`, via the country trigram index"""
+        countries = self.data["imports"].dictionaries["country"]
+        if self._country_index_source is not countries:
+            self._country_index = TrigramIndex()
+            self._country_index_source = countries
+        
+        # Country values only ever get appended to the table dictionary
+        for code in range(len(self._country_index), len(countries.values)):
+            value = countries.values[code]
+            self._country_index.add(code, value if isinstance(value, str) else "")
+        return self._country_index.search(needle)
+    
+    def calculate_metrics(self, filtered_data: Dict[str, Any], engine: Optional[str] = None,
+                          top_n: int = TOP_N) -> Dict[str, Any]:
+        """Calculate KPIs and top-`top_n` aggregations with the configured (or given) metrics engine
+
+        `engine="parallel"` aggregates a date window in month shards on the
+        process pool; large windows switch to it unless an engine is given.
+        """
         imports = filtered_data["imports"]
-        molecules = filtered_data["molecules"]
-        companies = filtered_data["companies"]
-        distributors = filtered_data["distributors"]
-        
-        # Basic KPIs
-        total_imports = len(imports)
-        total_quantity = sum(import_record["quantity"] for import_record in imports)
-        
-        # Active companies and distributors
-        active_companies = len(set(import_record["company_id"] for import_record in imports))
-        active_distributors = len(set(import_record["distributor_id"] for import_record in imports))
-        
-        # Top molecules by import count
-        molecule_counts = {}
-        for import_record in imports:
-            molecule_id = import_record["molecule_id"]
-            molecule_counts[molecule_id] = molecule_counts.get(molecule_id, 0) + 1
-        
-        top_molecules = []
-        for molecule_id, count in sorted(molecule_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            molecule = next((m for m in molecules if m["id"] == molecule_id), None)
-            if molecule:
-                top_molecules.append({
-                    "name": molecule["name"],
-                    "count": count
-                })
-        
-        # Top companies
-        company_stats = {}
-        for import_record in imports:
-            company_id = import_record["company_id"]
-            if company_id not in company_stats:
-                company_stats[company_id] = {"count": 0, "quantity": 0}
-            company_stats[company_id]["count"] += 1
-            company_stats[company_id]["quantity"] += import_record["quantity"]
-        
-        top_companies = []
-        for company_id, stats in sorted(company_stats.items(), key=lambda x: x[1]["count"], reverse=True)[:10]:
-            company = next((c for c in companies if c["id"] == company_id), None)
-            if company:
-                top_companies.append({
-                    "name": company["name"],
-                    "count": stats["count"],
-                    "total_quantity": stats["quantity"]
-                })
-        
-        # Top distributors
-        distributor_stats = {}
-        for import_record in imports:
-            distributor_id = import_record["distributor_id"]
-            if distributor_id not in distributor_stats:
-                distributor_stats[distributor_id] = {
-                    "count": 0, 
-                    "molecules": set(),
-                    "countries": set()
-                }
-            distributor_stats[distributor_id]["count"] += 1
-            distributor_stats[distributor_id]["molecules"].add(import_record["molecule_id"])
-            distributor_stats[distributor_id]["countries"].add(import_record["country"])
-        
-        top_distributors = []
-        for distributor_id, stats in sorted(distributor_stats.items(), key=lambda x: x[1]["count"], reverse=True)[:10]:
-            distributor = next((d for d in distributors if d["id"] == distributor_id), None)
-            if distributor:
-                # Get top molecules and origins for tooltip
-                top_mols = []
-                for mol_id in list(stats["molecules"])[:3]:
-                    molecule = next((m for m in molecules if m["id"] == mol_id), None)
-                    if molecule:
-                        top_mols.append(molecule["name"])
-                
-                top_distributors.append({
-                    "name": distributor["name"],
-                    "count": stats["count"],
-                    "location": distributor.get("location", ""),
-                    "top_molecules": ", ".join(top_mols),
-                    "countries": ", ".join(list(stats["countries"])[:3])
-                })
-        
-        # Chart data
-        chart_data = {
-            "molecules": top_molecules,
-            "companies": top_companies,
-            "distributors": top_distributors
+        # The rollup engine already sums daily buckets, which beats a sharded row scan
+        if (engine is None and self.metrics_engine != "rollup" and self.parallel_rows is not None
+                and len(imports) >= self.parallel_rows):
+            engine = "parallel"
+        if engine == "parallel":
+            if can_shard(imports):
+                return self.parallel.metrics(imports, self.registry, self.data_version, top_n)
+            engine = None
+        return METRICS_ENGINES[engine or self.metrics_engine](imports, self.registry, top_n)
+    
+    def top_entities(self, entity_type: str, k: int = TOP_N, approximate: bool = False) -> List[Dict[str, Any]]:
+        """Top-k molecules, companies or distributors by number of imports over all history
+
+        Exact counts come from the reference counters of the current imports;
+        approximate counts come from Space-Saving sketches over every import
+        recorded since startup, with an error bound per entry.
+        """
+        field = REFERENCE_FIELD_BY_ENTITY[entity_type]
+        imports = self.data["imports"]
+        values = imports.dictionaries[field].values
+        
+        if approximate:
+            sketch = next(listener for listener in imports.listeners
+                          if isinstance(listener, HistoryTopK)).sketches[field]
+            ranked = [(values[entry["item"]], entry["count"], entry) for entry in sketch.top(k)]
+        else:
+            counts = imports.reference_counts(field)
+            ranked = [(values[code], int(counts[code]), None)
+                      for code in top_k_indices(counts, np.arange(len(counts)), k).tolist() if counts[code]]
+        
+        top = []
+        for entity_id, count, entry in ranked:
+            row = {"id": entity_id, "name": self.registry.name_of(entity_type, entity_id), "count": count}
+            if entry is not None:
+                row["error"] = entry["error"]
+                row["guaranteed"] = entry["guaranteed"]
+            top.append(row)
+        return top
+    
+    def price_quantiles(self, start_date: str, end_date: str, search_molecule: str = "",
+                        currency: str = "", quantiles: Optional[List[float]] = None,
+                        top_n: int = TOP_N) -> Dict[str, Any]:
+        """Unit-price quantiles per molecule x currency for a date range; {"error": ...} on bad input
+
+        Answered by merging the monthly t-digests, so the estimates carry the
+        digest's rank error (largest near the median, smallest at the tails).
+        Groups are ordered by number of imports; at most `top_n` are returned.
+        """
+        start_dt, end_dt, error = self._parse_date_range(start_date, end_date)
+        if error:
+            return {"error": error}
+        quantiles = DEFAULT_PRICE_QUANTILES if quantiles is None else quantiles
+        
+        imports = self.data["imports"]
+        currencies = imports.dictionaries["currency"]
+        molecule_codes = set(self._molecule_codes(search_molecule)) if search_molecule else None
+        currency_codes = None
+        if currency:
+            currency_codes = {code for code, value in enumerate(currencies.values)
+                              if isinstance(value, str) and value.upper() == currency.upper()}
+        
+        with self._table_lock:
+            digests = next(listener for listener in imports.listeners
+                           if isinstance(listener, MonthlyPriceDigests))
+            window = digests.window(imports, start_dt.toordinal(), end_dt.toordinal(),
+                                    molecule_codes, currency_codes)
+        
+        molecules = imports.dictionaries["molecule_id"].values
+        ranked = top_k_items(window.items(), top_n, key=lambda item: item[1].count)
+        groups = []
+        for (molecule, currency_code), digest in ranked:
+            molecule_id = molecules[molecule]
+            groups.append({
+                "molecule_id": molecule_id,
+                "molecule_name": self.registry.name_of("molecules", molecule_id),
+                "currency": currencies.values[currency_code],
+                "count": int(digest.count),
+                "min": round(digest.min, 2),
+                "max": round(digest.max, 2),
+                "quantiles": {str(q): round(digest.quantile(q), 2) for q in quantiles}
+            })
+        
+        return {
+            "start_date": start_dt.isoformat(),
+            "end_date": end_dt.isoformat(),
+            "quantiles": quantiles,
+            "groups": groups
         }
+    
+    def timeseries(self, metric: str = "count", granularity: str = "month", start_date: str = "",
+                   end_date: str = "", search_molecule: str = "", search_country: str = "",
+                   currency: str = "", max_points: int = TIMESERIES_POINTS) -> Dict[str, Any]:
+        """Bucketed time series of a metric, downsampled with LTTB; {"error": ...} on bad input
+
+        Without a date range the series spans all dated imports. Empty buckets
+        count as zero. `value` adds quantity x unit price in each row's own
+        currency, so filter by currency to get a meaningful total.
+        """
+        if metric not in TIMESERIES_METRICS:
+            return {"error": f"metric must be one of {', '.join(TIMESERIES_METRICS)}"}
+        if granularity not in GRANULARITIES:
+            return {"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}
+        
+        imports = self.data["imports"]
+        if start_date or end_date:
+            start_dt, end_dt, error = self._parse_date_range(start_date, end_date)
+            if error:
+                return {"error": error}
+        else:
+            ordinals = imports.by_date().column("date_ordinal")
+            ordinals = ordinals[ordinals != INVALID_DATE]
+            if not len(ordinals):
+                return {"metric": metric, "granularity": granularity, "buckets": 0, "points": []}
+            start_dt, end_dt = date.fromordinal(int(ordinals[0])), date.fromordinal(int(ordinals[-1]))
+        
+        selection = self._select_imports(start_dt, end_dt, search_molecule, search_country)
+        if currency:
+            currencies = imports.dictionaries["currency"].values
+            selection = selection.where("currency", [code for code, value in enumerate(currencies)
+                                                     if isinstance(value, str) and value.upper() == currency.upper()])
+        
+        if metric == "count":
+            weights = np.ones(len(selection))
+        elif metric == "quantity":
+            weights = selection.column("quantity")
+        else:
+            weights = np.nan_to_num(selection.column("quantity") * selection.column("unit_price"))
+        starts, values = bucket_series(selection.column("date_ordinal"), weights, start_dt.toordinal(),
+                                       end_dt.toordinal(), granularity)
+        kept = lttb(starts, values, max_points)
+        values = values[kept].astype(np.int64) if metric == "count" else values[kept].round(2)
         
         return {
-            "kpis": {
-                "total_imports": total_imports,
-                "total_quantity": total_quantity,
-                "active_companies": active_companies,
-                "active_distributors": active_distributors
-            },
-            "charts": chart_data,
-            "tables": {
-                "top_molecules": top_molecules,
-                "top_companies": top_companies,
-                "top_distributors": top_distributors
-            }
+            "metric": metric,
+            "granularity": granularity,
+            "start_date": start_dt.isoformat(),
+            "end_date": end_dt.isoformat(),
+            "buckets": len(starts),
+            "points": [[date.fromordinal(day).isoformat(), value]
+                       for day, value in zip(starts[kept].tolist(), values.tolist())]
         }
     
-    def process_excel_data(self, file_stream, column_mapping: Dict[str, str]) -> Dict[str, Any]:
-        """Process Excel file and return import results"""
+    def process_excel_data(self, file_stream, column_mapping: Dict[str, str],
+                           progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Process Excel file and return import results
+
+        `progress(processed, skipped, created, total_rows, duplicates=...)` is
+        called once the rows are committed. Rows identical to an import already
+        stored (or to an earlier row) are not added; they are counted under
+        "duplicates".
+        """
         try:
             # Read Excel file
             df = pd.read_excel(file_stream, engine='openpyxl')
             
             # Validate required columns
-            required_columns = ["Date", "Product Description", "Consignee Name", "Shipper Name", 
-                              "Country of Origin", "QTY", "Unit", "Rate In FC", "Rate Currency"]
-            
-            missing_columns = []
-            for col in required_columns:
-                if col not in df.columns:
-                    missing_columns.append(col)
-            
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
             if missing_columns:
                 return {
                     "error": f"Missing required columns: {', '.join(missing_columns)}",
@@ -417,152 +592,15 @@ class ImportGoodsApp:
                 }
             
             created_counts = {"molecules": 0, "companies": 0, "distributors": 0, "imports": 0}
-            skipped_rows = []
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Parse and validate row data
-                    date_str = str(row["Date"]).strip()
-                    try:
-                        # Handle various date formats
-                        if pd.isna(row["Date"]):
-                            raise ValueError("Date is required")
-                        
-                        if isinstance(row["Date"], str):
-                            date_obj = pd.to_datetime(date_str)
-                        else:
-                            date_obj = pd.to_datetime(row["Date"])
-                        
-                        date_str = date_obj.strftime("%Y-%m-%d")
-                    except:
-                        skipped_rows.append({
-                            "row": index + 2,  # Excel rows start at 1, +1 for header
-                            "reason": f"Invalid date format: {row['Date']}"
-                        })
-                        continue
-                    
-                    # Validate quantity
-                    try:
-                        quantity = float(row["QTY"])
-                        if quantity <= 0:
-                            raise ValueError("Quantity must be positive")
-                    except:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": f"Invalid quantity: {row['QTY']}"
-                        })
-                        continue
-                    
-                    # Validate unit
-                    unit = str(row["Unit"]).strip()
-                    if not unit:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": "Unit is required"
-                        })
-                        continue
-                    
-                    # Validate unit price
-                    try:
-                        unit_price = float(row["Rate In FC"])
-                        if unit_price < 0:
-                            raise ValueError("Unit price cannot be negative")
-                    except:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": f"Invalid unit price: {row['Rate In FC']}"
-                        })
-                        continue
-                    
-                    # Validate currency
-                    currency = str(row["Rate Currency"]).strip().upper()
-                    if currency not in ALLOWED_CURRENCIES:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": f"Invalid currency: {currency}"
-                        })
-                        continue
-                    
-                    # Get or create molecule
-                    molecule_name = str(row["Product Description"]).strip()
-                    if not molecule_name:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": "Product description is required"
-                        })
-                        continue
-                    
-                    molecule = self._find_or_create_entity(
-                        "molecules", molecule_name, 
-                        lambda name: {"id": self._generate_id(), "name": name},
-                        created_counts, "molecules"
-                    )
-                    
-                    # Get or create company
-                    company_name = str(row["Consignee Name"]).strip()
-                    if not company_name:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": "Consignee name is required"
-                        })
-                        continue
-                    
-                    company = self._find_or_create_entity(
-                        "companies", company_name,
-                        lambda name: {"id": self._generate_id(), "name": name},
-                        created_counts, "companies"
-                    )
-                    
-                    # Get or create distributor
-                    distributor_name = str(row["Shipper Name"]).strip()
-                    if not distributor_name:
-                        skipped_rows.append({
-                            "row": index + 2,
-                            "reason": "Shipper name is required"
-                        })
-                        continue
-                    
-                    distributor = self._find_or_create_entity(
-                        "distributors", distributor_name,
-                        lambda name: {"id": self._generate_id(), "name": name},
-                        created_counts, "distributors"
-                    )
-                    
-                    # Create import record
-                    import_record = {
-                        "id": self._generate_id(),
-                        "date": date_str,
-                        "molecule_id": molecule["id"],
-                        "company_id": company["id"],
-                        "distributor_id": distributor["id"],
-                        "country": str(row["Country of Origin"]).strip(),
-                        "shipment_mode": str(row.get("Shipment Mode", "")).strip() if pd.notna(row.get("Shipment Mode")) else None,
-                        "quantity": quantity,
-                        "unit": unit,
-                        "unit_price": unit_price,
-                        "currency": currency,
-                        "hs_code": str(row.get("HS Code", "")).strip() if pd.notna(row.get("HS Code")) else None
-                    }
-                    
-                    self.data["imports"].append(import_record)
-                    created_counts["imports"] += 1
-                    
-                except Exception as e:
-                    skipped_rows.append({
-                        "row": index + 2,
-                        "reason": f"Processing error: {str(e)}"
-                    })
-                    continue
-            
-            # Save updated data
-            if created_counts["imports"] > 0:
-                self.save_data(self.data)
+            skipped_rows, duplicates = self._ingest_chunk(df, created_counts)
+            if progress is not None:
+                progress(len(df), len(skipped_rows), created_counts, len(df), duplicates=duplicates)
             
             return {
                 "processed": len(df),
                 "created": created_counts,
                 "skipped": len(skipped_rows),
+                "duplicates": duplicates,
                 "errors": skipped_rows[:10]  # Return top 10 errors
             }
             
@@ -575,21 +613,276 @@ class ImportGoodsApp:
                 "skipped": 0
             }
     
+    def process_file(self, path: str, chunk_rows: int = INGEST_CHUNK_ROWS,
+                     progress: Optional[Callable[..., None]] = None, resume: bool = True) -> Dict[str, Any]:
+        """Stream an .xlsx, .csv or .parquet file from disk in chunks of `chunk_rows` rows and return import results
+
+        Each chunk is committed atomically together with a checkpoint keyed by
+        the file's SHA-256 (last row, running totals), so memory stays bounded
+        and a chunk that fails is rolled back whole while earlier chunks stay.
+        Ingesting the same content again resumes after the checkpointed row
+        unless `resume` is False; the checkpoint is cleared once the file is
+        done. Every format gets the same validation, skip reasons and entity
+        resolution, and the same result dict as process_excel_data; `progress`
+        is called after every chunk, with the file's row count estimate as
+        total_rows.
+        """
+        try:
+            source = file_digest(path)
+            state = self.data.get(CHECKPOINTS, {}).get(source) if resume else None
+            with open_reader(path, chunk_rows) as reader:
+                missing_columns = [col for col in REQUIRED_COLUMNS if col not in reader.columns]
+                if missing_columns:
+                    return {
+                        "error": f"Missing required columns: {', '.join(missing_columns)}",
+                        "processed": 0,
+                        "created": 0,
+                        "skipped": 0
+                    }
+                
+                created_counts = {"molecules": 0, "companies": 0, "distributors": 0, "imports": 0}
+                processed, skipped, duplicates, errors, last_row = 0, 0, 0, [], 1
+                if state is not None:
+                    logger.info(f"Resuming ingest of {path} after row {state['row']}")
+                    created_counts.update(state["created"])
+                    processed, skipped, errors, last_row = (state["processed"], state["skipped"],
+                                                            list(state["errors"]), state["row"])
+                    duplicates = state.get("duplicates", 0)
+                resumed_after_row = last_row if state is not None else None
+                if progress is not None:
+                    progress(processed, skipped, created_counts, reader.total_rows, duplicates=duplicates)
+                for df in reader:
+                    # Row numbers are index + 2; rows up to the checkpoint are already committed
+                    df = df[df.index + 2 > last_row]
+                    if df.empty:
+                        continue
+                    
+                    def checkpoint(skipped_rows: List[Dict[str, Any]], chunk_duplicates: int,
+                                   counts: Dict[str, int]) -> Dict[str, Any]:
+                        return {source: {
+                            "row": int(df.index[-1]) + 2,
+                            "processed": processed + len(df),
+                            "skipped": skipped + len(skipped_rows),
+                            "duplicates": duplicates + chunk_duplicates,
+                            "created": {key: created_counts[key] + counts[key] for key in created_counts},
+                            "errors": errors + skipped_rows[:10 - len(errors)]
+                        }}
+                    
+                    skipped_rows, chunk_duplicates = self._ingest_chunk(df, created_counts, checkpoint)
+                    processed += len(df)
+                    skipped += len(skipped_rows)
+                    duplicates += chunk_duplicates
+                    errors.extend(skipped_rows[:10 - len(errors)])
+                    last_row = int(df.index[-1]) + 2
+                    if progress is not None:
+                        progress(processed, skipped, created_counts, reader.total_rows, duplicates=duplicates)
+            
+            if source in self.data[CHECKPOINTS] and not self._commit(checkpoints={source: None}):
+                logger.warning(f"Could not clear the ingest checkpoint of {path}")
+            result = {
+                "processed": processed,
+                "created": created_counts,
+                "skipped": skipped,
+                "duplicates": duplicates,
+                "errors": errors  # Return top 10 errors
+            }
+            if resumed_after_row is not None:
+                result["resumed_after_row"] = resumed_after_row
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing file: {e}")
+            return {
+                "error": f"Error processing file: {str(e)}",
+                "processed": 0,
+                "created": 0,
+                "skipped": 0
+            }
+    
+    def submit_upload(self, path: str, filename: str, column_mapping: Dict[str, str]) -> IngestJob:
+        """Queue an uploaded .xlsx, .csv or .parquet file for ingest and return its job
+
+        The job owns `path` and removes it when it finishes. CSV, Parquet and
+        .xlsx files over STREAMING_UPLOAD_BYTES are streamed in chunks; smaller
+        .xlsx files are read whole.
+        """
+        def run(job: IngestJob) -> Dict[str, Any]:
+            try:
+                if not path.endswith('.xlsx') or os.path.getsize(path) > STREAMING_UPLOAD_BYTES:
+                    return self.process_file(path, progress=job.update)
+                return self.process_excel_data(path, column_mapping, progress=job.update)
+            finally:
+                os.remove(path)
+
+        return self.ingest_jobs.submit(filename, run)
+
+    def process_batch(self, paths: List[str], filenames: Optional[List[str]] = None,
+                      max_workers: Optional[int] = None, chunk_rows: int = INGEST_CHUNK_ROWS,
+                      progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Ingest every sheet of several .xlsx, .csv or .parquet files in one commit and return import results
+
+        Sheets are parsed on a process pool; their entity names are then
+        resolved here in file and sheet order, so a new molecule, company or
+        distributor named on many sheets is created once, and the outcome does
+        not depend on which worker finished first. Sheets that lack a required
+        column or cannot be read are reported under "sheets" and skipped.
+        Errors carry the file and sheet of their row.
+        """
+        filenames = dict(zip(paths, filenames or [os.path.basename(path) for path in paths]))
+        try:
+            created_counts = {"molecules": 0, "companies": 0, "distributors": 0, "imports": 0}
+            created_records = {"molecules": [], "companies": [], "distributors": [], "imports": []}
+            resolve = self._entity_resolver(created_counts, created_records)
+            records, sheets, errors, sheet_starts = [], [], [], []
+            processed, skipped = 0, 0
+            
+            tasks = sheet_tasks(paths)
+            total_rows = sum(task["total_rows"] for task in tasks)
+            if progress is not None:
+                progress(processed, skipped, created_counts, total_rows)
+            for sheet in parse_workbooks(tasks, max_workers, chunk_rows):
+                summary = {"file": filenames[sheet["path"]], "sheet": sheet["sheet"], "processed": 0, "skipped": 0}
+                sheet_starts.append(len(records))
+                if "error" in sheet:
+                    summary["error"] = sheet["error"]
+                for parsed in sheet.get("chunks", []):
+                    sheet_records, skipped_rows = resolve_rows(parsed, resolve)
+                    records.extend(sheet_records)
+                    summary["processed"] += len(parsed)
+                    summary["skipped"] += len(skipped_rows)
+                    errors.extend(dict(row, file=summary["file"], sheet=summary["sheet"])
+                                  for row in skipped_rows[:10 - len(errors)])
+                sheets.append(summary)
+                processed += summary["processed"]
+                skipped += summary["skipped"]
+                if progress is not None:
+                    progress(processed, skipped, created_counts, total_rows)
+            
+            with self._table_lock:
+                duplicate = self._fingerprints().duplicates(records)
+                records = [record for record, repeat in zip(records, duplicate) if not repeat]
+                self.data["imports"].extend(records)
+            created_records["imports"] = records
+            created_counts["imports"] = len(records)
+            if any(created_records.values()) and not self._commit(inserts=created_records):
+                raise IOError("Could not save the batch")
+            for summary, start, end in zip(sheets, sheet_starts, sheet_starts[1:] + [len(duplicate)]):
+                summary["duplicates"] = int(duplicate[start:end].sum())
+            
+            return {
+                "processed": processed,
+                "created": created_counts,
+                "skipped": skipped,
+                "duplicates": int(duplicate.sum()),
+                "errors": errors,  # Return top 10 errors
+                "sheets": sheets
+            }
+            
+        except Exception as e:
+            # Nothing of the batch is saved unless the single commit succeeded
+            self._roll_back_ingest(created_records)
+            logger.error(f"Error processing batch: {e}")
+            return {
+                "error": f"Error processing batch: {str(e)}",
+                "processed": 0,
+                "created": 0,
+                "skipped": 0
+            }
+    
+    def submit_batch(self, paths: List[str], filenames: List[str]) -> IngestJob:
+        """Queue a batch of uploaded files for ingest and return its job; the job removes `paths`"""
+        def run(job: IngestJob) -> Dict[str, Any]:
+            try:
+                return self.process_batch(paths, filenames, progress=job.update)
+            finally:
+                for path in paths:
+                    os.remove(path)
+        
+        return self.ingest_jobs.submit(", ".join(filenames), run)
+    
+    def _entity_resolver(self, created_counts: Dict[str, int],
+                         created_records: Dict[str, List[Dict[str, Any]]]) -> Callable[[str, str], Dict[str, Any]]:
+        """find_or_create(entity_type, name) for the ingest, counting and collecting new entities"""
+        return lambda entity_type, name: self._find_or_create_entity(
+            entity_type, name, lambda name: {"id": self._generate_id(), "name": name},
+            created_counts, entity_type, created_records)
+    
+    def _ingest_chunk(self, df: pd.DataFrame, created_counts: Dict[str, int],
+                      checkpoint: Optional[Callable[..., Dict[str, Any]]] = None
+                      ) -> Tuple[List[Dict[str, Any]], int]:
+        """Validate a frame of upload rows, add its imports and commit them
+
+        Returns the skipped rows and the number of valid rows left out as
+        duplicates of stored imports or of earlier rows. The chunk's new
+        entities, imports and `checkpoint(skipped_rows, duplicates, counts)`
+        are committed in one write. If anything fails, the chunk is rolled
+        back, leaving no orphan entities, and the error is raised;
+        `created_counts` only grows once the chunk is saved.
+        """
+        counts = {"molecules": 0, "companies": 0, "distributors": 0, "imports": 0}
+        created_records = {"molecules": [], "companies": [], "distributors": [], "imports": []}
+        try:
+            # Rows are validated column by column; names resolve once per distinct name
+            records, skipped_rows = ingest_frame(df, self._entity_resolver(counts, created_records))
+            
+            # Re-uploaded rows match an existing fingerprint; checked and added under one lock
+            with self._table_lock:
+                duplicate = self._fingerprints().duplicates(records)
+                records = [record for record, repeat in zip(records, duplicate) if not repeat]
+                self.data["imports"].extend(records)
+            created_records["imports"] = records
+            counts["imports"] = len(records)
+            duplicates = len(duplicate) - len(records)
+            
+            # Save updated data
+            checkpoints = checkpoint(skipped_rows, duplicates, counts) if checkpoint is not None else None
+            if (any(created_records.values()) or checkpoints) and \
+                    not self._commit(inserts=created_records, checkpoints=checkpoints):
+                raise IOError("Could not save the imported rows")
+        except Exception:
+            self._roll_back_ingest(created_records)
+            raise
+        
+        for key, count in counts.items():
+            created_counts[key] += count
+        return skipped_rows, duplicates
+    
+    def _fingerprints(self) -> FingerprintIndex:
+        """The fingerprint index of the import table"""
+        return next(listener for listener in self.data["imports"].listeners
+                    if isinstance(listener, FingerprintIndex))
+    
+    def _roll_back_ingest(self, created_records: Dict[str, List[Dict[str, Any]]]):
+        """Remove the imports and entities of an ingest that was not saved from memory"""
+        if not any(created_records.values()):
+            return
+        with self._table_lock:
+            self.data["imports"].tombstone(record["id"] for record in created_records["imports"])
+        for entity_type in ("molecules", "companies", "distributors"):
+            ids = {entity["id"] for entity in created_records[entity_type]}
+            if ids:
+                self.data[entity_type] = [e for e in self.data[entity_type] if e["id"] not in ids]
+                for entity_id in ids:
+                    self.registry.remove(entity_type, entity_id)
+        self.data_version += 1
+        logger.warning(f"Rolled back {len(created_records['imports'])} unsaved import records")
+    
     def _find_or_create_entity(self, entity_type: str, name: str, 
-                              create_func, created_counts: Dict[str, int], count_key: str):
+                              create_func, created_counts: Dict[str, int], count_key: str,
+                              created_records: Optional[Dict[str, List[Dict[str, Any]]]] = None):
         """Find existing entity by name or create new one"""
-        # Normalize name for comparison
-        normalized_name = name.lower().strip()
-        
-        # Look for existing entity
-        for entity in self.data[entity_type]:
-            if entity["name"].lower().strip() == normalized_name:
-                return entity
+        # Look for existing entity (case-insensitive)
+        entity = self.registry.find_by_name(entity_type, name)
+        if entity is not None:
+            return entity
         
         # Create new entity
         new_entity = create_func(name)
         self.data[entity_type].append(new_entity)
+        self.registry.add(entity_type, new_entity)
         created_counts[count_key] += 1
+        if created_records is not None:
+            created_records[entity_type].append(new_entity)
         return new_entity
     
     def _generate_id(self) -> str:
@@ -609,10 +902,8 @@ class ImportGoodsApp:
             return False, "Description cannot exceed 500 characters"
         
         # Check for duplicate names (case-insensitive)
-        normalized_name = name.lower().strip()
-        for molecule in self.data["molecules"]:
-            if molecule["name"].lower().strip() == normalized_name:
-                return False, "Molecule with this name already exists"
+        if self.registry.find_by_name("molecules", name) is not None:
+            return False, "Molecule with this name already exists"
         
         molecule = Molecule(
             id=self._generate_id(),
@@ -620,8 +911,10 @@ class ImportGoodsApp:
             description=description.strip() if description else None
         )
         
-        self.data["molecules"].append(asdict(molecule))
-        self.save_data(self.data)
+        record = asdict(molecule)
+        self.data["molecules"].append(record)
+        self.registry.add("molecules", record)
+        self._commit(inserts={"molecules": [record]})
         return True, "Molecule added successfully"
     
     def add_company(self, name: str, location: str = "") -> Tuple[bool, str]:
@@ -636,10 +929,8 @@ class ImportGoodsApp:
             return False, "Location cannot exceed 100 characters"
         
         # Check for duplicate names (case-insensitive)
-        normalized_name = name.lower().strip()
-        for company in self.data["companies"]:
-            if company["name"].lower().strip() == normalized_name:
-                return False, "Company with this name already exists"
+        if self.registry.find_by_name("companies", name) is not None:
+            return False, "Company with this name already exists"
         
         company = Company(
             id=self._generate_id(),
@@ -647,8 +938,10 @@ class ImportGoodsApp:
             location=location.strip() if location else None
         )
         
-        self.data["companies"].append(asdict(company))
-        self.save_data(self.data)
+        record = asdict(company)
+        self.data["companies"].append(record)
+        self.registry.add("companies", record)
+        self._commit(inserts={"companies": [record]})
         return True, "Company added successfully"
     
     def add_distributor(self, name: str, location: str = "") -> Tuple[bool, str]:
@@ -663,10 +956,8 @@ class ImportGoodsApp:
             return False, "Location cannot exceed 100 characters"
         
         # Check for duplicate names (case-insensitive)
-        normalized_name = name.lower().strip()
-        for distributor in self.data["distributors"]:
-            if distributor["name"].lower().strip() == normalized_name:
-                return False, "Distributor with this name already exists"
+        if self.registry.find_by_name("distributors", name) is not None:
+            return False, "Distributor with this name already exists"
         
         distributor = Distributor(
             id=self._generate_id(),
@@ -674,8 +965,10 @@ class ImportGoodsApp:
             location=location.strip() if location else None
         )
         
-        self.data["distributors"].append(asdict(distributor))
-        self.save_data(self.data)
+        record = asdict(distributor)
+        self.data["distributors"].append(record)
+        self.registry.add("distributors", record)
+        self._commit(inserts={"distributors": [record]})
         return True, "Distributor added successfully"
     
     def add_import(self, import_data: Dict[str, Any]) -> Tuple[bool, str]:
@@ -721,15 +1014,11 @@ class ImportGoodsApp:
                 return False, "HS code must be 4-10 digits"
         
         # Check if referenced entities exist
-        molecule_exists = any(m["id"] == import_data["molecule_id"] for m in self.data["molecules"])
-        company_exists = any(c["id"] == import_data["company_id"] for c in self.data["companies"])
-        distributor_exists = any(d["id"] == import_data["distributor_id"] for d in self.data["distributors"])
-        
-        if not molecule_exists:
+        if not self.registry.exists("molecules", import_data["molecule_id"]):
             return False, "Referenced molecule does not exist"
-        if not company_exists:
+        if not self.registry.exists("companies", import_data["company_id"]):
             return False, "Referenced company does not exist"
-        if not distributor_exists:
+        if not self.registry.exists("distributors", import_data["distributor_id"]):
             return False, "Referenced distributor does not exist"
         
         # Create import record
@@ -748,8 +1037,10 @@ class ImportGoodsApp:
             hs_code=import_data.get("hs_code")
         )
         
-        self.data["imports"].append(asdict(import_record))
-        self.save_data(self.data)
+        record = asdict(import_record)
+        with self._table_lock:
+            self.data["imports"].append(record)
+        self._commit(inserts={"imports": [record]})
         return True, "Import record added successfully"
     
     def bulk_delete_imports(self, import_ids: List[str]) -> Tuple[bool, str]:
@@ -757,71 +1048,106 @@ class ImportGoodsApp:
         if not import_ids:
             return False, "No import records selected"
         
-        # Remove imports by ID
-        original_count = len(self.data["imports"])
-        self.data["imports"] = [imp for imp in self.data["imports"] if imp["id"] not in import_ids]
-        deleted_count = original_count - len(self.data["imports"])
+        # Tombstone imports by ID; the rows are removed later by a background compaction
+        with self._table_lock:
+            deleted_count = self.data["imports"].tombstone(import_ids)
         
         if deleted_count > 0:
-            self.save_data(self.data)
+            self._commit(deletes={"imports": list(import_ids)})
+            self._maybe_compact_imports()
             return True, f"Successfully deleted {deleted_count} import records"
         else:
             return False, "No import records were deleted"
     
+    def _maybe_compact_imports(self):
+        """Start a background compaction when enough import rows are tombstoned"""
+        imports = self.data["imports"]
+        if imports.tombstones < TOMBSTONE_COMPACT_RATIO * (len(imports) + imports.tombstones):
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.compact_imports,
+                                            name="import-compaction", daemon=True)
+        self._compaction.start()
+    
+    def compact_imports(self) -> int:
+        """Remove tombstoned import rows and return how many were removed"""
+        # Compact a copy and swap it in, so readers holding the old table
+        # (or positions into it) keep a consistent view
+        with self._table_lock:
+            imports = self.data["imports"]
+            removed = imports.tombstones
+            if removed:
+                self.data["imports"] = imports.compacted()
+        if removed:
+            logger.info(f"Compacted {removed} deleted import records")
+        return removed
+    
+    def wait_for_compaction(self):
+        """Block until a running import compaction has finished"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+    
     def delete_molecule(self, molecule_id: str) -> Tuple[bool, str]:
         """Delete molecule if not referenced by imports"""
         # Check if molecule exists
-        molecule = next((m for m in self.data["molecules"] if m["id"] == molecule_id), None)
+        molecule = self.registry.get("molecules", molecule_id)
         if not molecule:
             return False, "Molecule not found"
         
         # Check for references
-        reference_count = sum(1 for imp in self.data["imports"] if imp["molecule_id"] == molecule_id)
+        reference_count = self.data["imports"].reference_count("molecule_id", molecule_id)
         if reference_count > 0:
             return False, f"Cannot delete molecule. It is referenced by {reference_count} import records"
         
         # Delete molecule
         self.data["molecules"] = [m for m in self.data["molecules"] if m["id"] != molecule_id]
-        self.save_data(self.data)
+        self.registry.remove("molecules", molecule_id)
+        self._commit(deletes={"molecules": [molecule_id]})
         return True, "Molecule deleted successfully"
     
     def delete_company(self, company_id: str) -> Tuple[bool, str]:
         """Delete company if not referenced by imports"""
         # Check if company exists
-        company = next((c for c in self.data["companies"] if c["id"] == company_id), None)
+        company = self.registry.get("companies", company_id)
         if not company:
             return False, "Company not found"
         
         # Check for references
-        reference_count = sum(1 for imp in self.data["imports"] if imp["company_id"] == company_id)
+        reference_count = self.data["imports"].reference_count("company_id", company_id)
         if reference_count > 0:
             return False, f"Cannot delete company. It is referenced by {reference_count} import records"
         
         # Delete company
         self.data["companies"] = [c for c in self.data["companies"] if c["id"] != company_id]
-        self.save_data(self.data)
+        self.registry.remove("companies", company_id)
+        self._commit(deletes={"companies": [company_id]})
         return True, "Company deleted successfully"
     
     def delete_distributor(self, distributor_id: str) -> Tuple[bool, str]:
         """Delete distributor if not referenced by imports"""
         # Check if distributor exists
-        distributor = next((d for d in self.data["distributors"] if d["id"] == distributor_id), None)
+        distributor = self.registry.get("distributors", distributor_id)
         if not distributor:
             return False, "Distributor not found"
         
         # Check for references
-        reference_count = sum(1 for imp in self.data["imports"] if imp["distributor_id"] == distributor_id)
+        reference_count = self.data["imports"].reference_count("distributor_id", distributor_id)
         if reference_count > 0:
             return False, f"Cannot delete distributor. It is referenced by {reference_count} import records"
         
         # Delete distributor
         self.data["distributors"] = [d for d in self.data["distributors"] if d["id"] != distributor_id]
-        self.save_data(self.data)
+        self.registry.remove("distributors", distributor_id)
+        self._commit(deletes={"distributors": [distributor_id]})
         return True, "Distributor deleted successfully"
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = "import_goods_secret_key_2024"
+# Uploads are spooled to temporary files by Werkzeug; allow room for the form around the file
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
 # Initialize application
 import_app = ImportGoodsApp()
@@ -839,11 +1165,8 @@ def dashboard():
     if time_filter not in allowed_filters:
         time_filter = 'monthly'
     
-    # Get filtered data
-    filtered_data = import_app.get_time_filtered_data(time_filter, search_molecule, search_country)
-    
-    # Calculate metrics
-    metrics = import_app.calculate_metrics(filtered_data)
+    # Metrics for the filtered window, cached until the next write
+    metrics = import_app.get_metrics(time_filter, search_molecule, search_country)
     
     return render_template('dashboard.html', 
                          metrics=metrics,
@@ -865,13 +1188,13 @@ def custom_date():
     error = None
     
     if start_date and end_date:
-        # Get custom date data
-        result = import_app.get_custom_date_data(start_date, end_date, search_molecule, search_country)
+        # Get custom date metrics
+        result = import_app.get_custom_date_metrics(start_date, end_date, search_molecule, search_country)
         
         if "error" in result:
             error = result["error"]
         else:
-            metrics = import_app.calculate_metrics(result)
+            metrics = result
     
     return render_template('custom_date.html',
                          metrics=metrics,
@@ -889,30 +1212,22 @@ def imports():
     page = request.args.get('page', 1, type=int)
     per_page = 25
     
-    # Get all imports sorted by date desc
-    sorted_imports = sorted(import_app.data["imports"], 
-                           key=lambda x: x["date"], reverse=True)
+    # Imports by date desc, read straight off the date index
+    all_imports = import_app.data["imports"]
+    newest_first = all_imports.by_date().positions[::-1]
     
     # Pagination
-    total = len(sorted_imports)
-    start = (page - 1) * per_page
+    total = len(all_imports)
+    start = max(page - 1, 0) * per_page
     end = start + per_page
-    imports_page = sorted_imports[start:end]
+    # Copy the page rows so display-only names never reach the stored records
+    imports_page = [all_imports.record(position) for position in newest_first[start:end].tolist()]
     
     # Add entity names for display
     for import_record in imports_page:
-        import_record["molecule_name"] = next(
-            (m["name"] for m in import_app.data["molecules"] if m["id"] == import_record["molecule_id"]), 
-            "Unknown"
-        )
-        import_record["company_name"] = next(
-            (c["name"] for c in import_app.data["companies"] if c["id"] == import_record["company_id"]), 
-            "Unknown"
-        )
-        import_record["distributor_name"] = next(
-            (d["name"] for d in import_app.data["distributors"] if d["id"] == import_record["distributor_id"]), 
-            "Unknown"
-        )
+        import_record["molecule_name"] = import_app.registry.name_of("molecules", import_record["molecule_id"])
+        import_record["company_name"] = import_app.registry.name_of("companies", import_record["company_id"])
+        import_record["distributor_name"] = import_app.registry.name_of("distributors", import_record["distributor_id"])
     
     return render_template('imports.html',
                          imports=imports_page,
@@ -935,10 +1250,15 @@ def molecules():
     
     molecules_list = import_app.data["molecules"]
     if search:
-        molecules_list = [m for m in molecules_list if search.lower() in m["name"].lower()]
+        molecules_list = import_app.registry.search("molecules", search)
+    
+    # Imports per molecule, read from the table's reference counters
+    import_counts = {molecule["id"]: import_app.data["imports"].reference_count("molecule_id", molecule["id"])
+                     for molecule in molecules_list}
     
     return render_template('molecules.html', 
                          molecules=molecules_list,
+                         import_counts=import_counts,
                          search=search)
 
 @app.route('/companies')
@@ -948,10 +1268,15 @@ def companies():
     
     companies_list = import_app.data["companies"]
     if search:
-        companies_list = [c for c in companies_list if search.lower() in c["name"].lower()]
+        companies_list = import_app.registry.search("companies", search)
+    
+    # Imports per company, read from the table's reference counters
+    import_counts = {company["id"]: import_app.data["imports"].reference_count("company_id", company["id"])
+                     for company in companies_list}
     
     return render_template('companies.html', 
                          companies=companies_list,
+                         import_counts=import_counts,
                          search=search)
 
 @app.route('/distributors')
@@ -961,13 +1286,48 @@ def distributors():
     
     distributors_list = import_app.data["distributors"]
     if search:
-        distributors_list = [d for d in distributors_list if search.lower() in d["name"].lower()]
+        distributors_list = import_app.registry.search("distributors", search)
+    
+    # Imports per distributor, read from the table's reference counters
+    import_counts = {distributor["id"]: import_app.data["imports"].reference_count("distributor_id", distributor["id"])
+                     for distributor in distributors_list}
     
     return render_template('distributors.html', 
                          distributors=distributors_list,
+                         import_counts=import_counts,
                          search=search)
 
+def _upload_extension(filename: str) -> str:
+    """Lower-case extension of an uploaded file's name, e.g. '.csv'"""
+    return os.path.splitext(filename)[1].lower()
+
 # API Routes
+def conditional_json(etag: str, last_modified: datetime, build):
+    """JSON response with ETag/Last-Modified, or 304 if the client's copy is current
+
+    The validators are checked before `build()` runs, so a revalidation costs no
+    filtering or aggregation. `build` returns the payload and status code.
+    """
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    
+    if not_modified:
+        response = app.response_class(status=304)
+    else:
+        payload, status = build()
+        response = jsonify(payload)
+        response.status_code = status
+        if status != 200:
+            return response
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Let browsers and proxies store the response but revalidate it on every use
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/api/chart-data')
 def api_chart_data():
     """API endpoint for chart data"""
@@ -975,16 +1335,25 @@ def api_chart_data():
     search_molecule = request.args.get('search_molecule', '').strip()[:100]
     search_country = request.args.get('search_country', '').strip()[:100]
     
+    top_n = request.args.get('top', TOP_N, type=int)
+    
     # Validate time filter
     allowed_filters = ['daily', 'weekly', 'monthly', 'quarterly', 'yearly']
     if time_filter not in allowed_filters:
         return jsonify({"error": "Invalid time filter"}), 400
     
-    # Get filtered data and metrics
-    filtered_data = import_app.get_time_filtered_data(time_filter, search_molecule, search_country)
-    metrics = import_app.calculate_metrics(filtered_data)
+    if not 1 <= top_n <= MAX_TOP_N:
+        return jsonify({"error": f"top must be between 1 and {MAX_TOP_N}"}), 400
+    
+    # Rolling windows move with the calendar day, so it is part of the validators
+    today = datetime.now().date()
+    etag = import_app.response_etag("chart-data", today.isoformat(), time_filter,
+                                    search_molecule.lower(), search_country.lower(), top_n)
+    start_of_day = datetime.combine(today, datetime.min.time()).astimezone(timezone.utc)
+    last_modified = max(import_app.last_modified, start_of_day)
     
-    return jsonify(metrics)
+    return conditional_json(etag, last_modified, lambda: (
+        import_app.get_metrics(time_filter, search_molecule, search_country, top_n), 200))
 
 @app.route('/api/custom-date-data')
 def api_custom_date_data():
@@ -993,18 +1362,149 @@ def api_custom_date_data():
     end_date = request.args.get('end_date')
     search_molecule = request.args.get('search_molecule', '').strip()[:100]
     search_country = request.args.get('search_country', '').strip()[:100]
+    top_n = request.args.get('top', TOP_N, type=int)
+    
+    if not start_date or not end_date:
+        return jsonify({"error": "Start date and end date are required"}), 400
+    
+    if not 1 <= top_n <= MAX_TOP_N:
+        return jsonify({"error": f"top must be between 1 and {MAX_TOP_N}"}), 400
+    
+    def build():
+        result = import_app.get_custom_date_metrics(start_date, end_date, search_molecule,
+                                                    search_country, top_n)
+        if "error" in result:
+            return {"error": result["error"]}, 400
+        return result, 200
+    
+    etag = import_app.response_etag("custom-date-data", start_date, end_date,
+                                    search_molecule.lower(), search_country.lower(), top_n)
+    return conditional_json(etag, import_app.last_modified, build)
+
+@app.route('/api/top-k')
+def api_top_k():
+    """API endpoint for all-history top-k molecules, companies or distributors"""
+    entity_type = request.args.get('entity', 'molecules')
+    k = request.args.get('k', TOP_N, type=int)
+    approximate = request.args.get('approximate', '').lower() in ('1', 'true', 'yes')
+    
+    if entity_type not in REFERENCE_FIELD_BY_ENTITY:
+        return jsonify({"error": "Invalid entity"}), 400
+    if not 1 <= k <= MAX_TOP_N:
+        return jsonify({"error": f"k must be between 1 and {MAX_TOP_N}"}), 400
+    
+    return jsonify({
+        "entity": entity_type,
+        "k": k,
+        "approximate": approximate,
+        "top": import_app.top_entities(entity_type, k, approximate)
+    })
+
+@app.route('/api/price-quantiles')
+def api_price_quantiles():
+    """API endpoint for unit-price quantiles per molecule and currency"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    search_molecule = request.args.get('search_molecule', '').strip()[:100]
+    currency = request.args.get('currency', '').strip()[:10]
+    top_n = request.args.get('top', TOP_N, type=int)
     
     if not start_date or not end_date:
         return jsonify({"error": "Start date and end date are required"}), 400
     
-    # Get custom date data
-    result = import_app.get_custom_date_data(start_date, end_date, search_molecule, search_country)
+    if not 1 <= top_n <= MAX_TOP_N:
+        return jsonify({"error": f"top must be between 1 and {MAX_TOP_N}"}), 400
     
-    if "error" in result:
-        return jsonify({"error": result["error"]}), 400
+    quantiles = DEFAULT_PRICE_QUANTILES
+    if request.args.get('q'):
+        try:
+            quantiles = [float(q) for q in request.args['q'].split(',')][:20]
+        except ValueError:
+            return jsonify({"error": "q must be a comma-separated list of numbers"}), 400
+        if not all(0 <= q <= 1 for q in quantiles):
+            return jsonify({"error": "Quantiles must be between 0 and 1"}), 400
     
-    metrics = import_app.calculate_metrics(result)
-    return jsonify(metrics)
+    def build():
+        result = import_app.price_quantiles(start_date, end_date, search_molecule, currency,
+                                            quantiles, top_n)
+        if "error" in result:
+            return {"error": result["error"]}, 400
+        return result, 200
+    
+    etag = import_app.response_etag("price-quantiles", start_date, end_date, search_molecule.lower(),
+                                    currency.upper(), tuple(quantiles), top_n)
+    return conditional_json(etag, import_app.last_modified, build)
+
+@app.route('/api/timeseries')
+def api_timeseries():
+    """API endpoint for a bucketed, downsampled time series"""
+    metric = request.args.get('metric', 'count')
+    granularity = request.args.get('granularity', 'month')
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    search_molecule = request.args.get('search_molecule', '').strip()[:100]
+    search_country = request.args.get('search_country', '').strip()[:100]
+    currency = request.args.get('currency', '').strip()[:10]
+    max_points = request.args.get('max_points', TIMESERIES_POINTS, type=int)
+    
+    if bool(start_date) != bool(end_date):
+        return jsonify({"error": "Give both start date and end date, or neither"}), 400
+    
+    if not 3 <= max_points <= MAX_TIMESERIES_POINTS:
+        return jsonify({"error": f"max_points must be between 3 and {MAX_TIMESERIES_POINTS}"}), 400
+    
+    def build():
+        result = import_app.timeseries(metric, granularity, start_date, end_date, search_molecule,
+                                       search_country, currency, max_points)
+        if "error" in result:
+            return {"error": result["error"]}, 400
+        return result, 200
+    
+    etag = import_app.response_etag("timeseries", metric, granularity, start_date, end_date,
+                                    search_molecule.lower(), search_country.lower(), currency.upper(),
+                                    max_points)
+    return conditional_json(etag, import_app.last_modified, build)
+
+@app.route('/api/ingest-batch', methods=['POST'])
+def api_ingest_batch():
+    """API endpoint to queue several .xlsx, .csv or .parquet files, every sheet of each, as one ingest job"""
+    files = request.files.getlist('files')
+    if not files or any(file.filename == '' for file in files):
+        return jsonify({"error": "No files selected"}), 400
+    for file in files:
+        if _upload_extension(file.filename) not in INGEST_READERS:
+            return jsonify({"error": f"Only {', '.join(INGEST_READERS)} files are allowed: {file.filename}"}), 400
+        file.seek(0, 2)
+        file_size = file.tell()
+        file.seek(0)
+        if file_size > MAX_UPLOAD_BYTES:
+            return jsonify({"error": f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit: {file.filename}"}), 400
+
+    paths = []
+    for file in files:
+        spooled = tempfile.NamedTemporaryFile(suffix=_upload_extension(file.filename), delete=False)
+        with spooled:
+            file.save(spooled)
+        paths.append(spooled.name)
+    job = import_app.submit_batch(paths, [secure_filename(file.filename) for file in files])
+
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('api_ingest_job', job_id=job.id)
+    return response
+
+@app.route('/api/ingest-jobs/<job_id>')
+def api_ingest_job(job_id):
+    """API endpoint for the progress of a queued upload"""
+    job = import_app.ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown ingest job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/metrics-cache')
+def api_metrics_cache():
+    """API endpoint for metrics cache statistics"""
+    return jsonify(import_app.metrics_cache.stats())
 
 # CRUD Routes
 @app.route('/add_molecule', methods=['POST'])
@@ -1092,9 +1592,37 @@ def bulk_delete_imports_route():
     
     return redirect(url_for('imports'))
 
+@app.route('/api/imports/delete', methods=['POST'])
+def api_delete_imports():
+    """API endpoint to delete imports by id list, or by date range and search filters"""
+    payload = request.get_json(silent=True) or {}
+    
+    if "ids" in payload:
+        import_ids = payload["ids"]
+        if not isinstance(import_ids, list):
+            return jsonify({"error": "ids must be a list"}), 400
+    else:
+        start_date = payload.get("start_date")
+        end_date = payload.get("end_date")
+        if not start_date or not end_date:
+            return jsonify({"error": "Either ids or start date and end date are required"}), 400
+        
+        result = import_app.get_custom_date_data(
+            start_date, end_date,
+            str(payload.get("search_molecule", "")).strip()[:100],
+            str(payload.get("search_country", "")).strip()[:100])
+        if "error" in result:
+            return jsonify({"error": result["error"]}), 400
+        import_ids = [imp["id"] for imp in result["imports"]]
+    
+    success, message = import_app.bulk_delete_imports(import_ids)
+    if not success:
+        return jsonify({"error": message}), 400
+    return jsonify({"message": message})
+
 @app.route('/upload_excel', methods=['POST'])
 def upload_excel_route():
-    """Upload and process Excel file"""
+    """Upload an .xlsx, .csv or .parquet file and queue it for processing"""
     if 'file' not in request.files:
         flash('No file selected', 'error')
         return redirect(url_for('imports'))
@@ -1104,17 +1632,17 @@ def upload_excel_route():
         flash('No file selected', 'error')
         return redirect(url_for('imports'))
     
-    if not file.filename.endswith('.xlsx'):
-        flash('Only .xlsx files are allowed', 'error')
+    if _upload_extension(file.filename) not in INGEST_READERS:
+        flash(f"Only {', '.join(INGEST_READERS)} files are allowed", 'error')
         return redirect(url_for('imports'))
     
-    # Check file size (10MB limit)
+    # Check file size
     file.seek(0, 2)  # Seek to end
     file_size = file.tell()
     file.seek(0)  # Reset to beginning
     
-    if file_size > 10 * 1024 * 1024:  # 10MB
-        flash('File size exceeds 10MB limit', 'error')
+    if file_size > MAX_UPLOAD_BYTES:
+        flash(f'File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit', 'error')
         return redirect(url_for('imports'))
     
     # Default column mapping
@@ -1132,19 +1660,19 @@ def upload_excel_route():
         "Rate Currency": "currency"
     }
     
-    # Process Excel file
-    result = import_app.process_excel_data(file, column_mapping)
-    
-    if "error" in result:
-        flash(f"Upload failed: {result['error']}", 'error')
-    else:
-        message = f"Upload completed. Processed: {result['processed']}, Created: {result['created']['imports']}, Skipped: {result['skipped']}"
-        flash(message, 'success')
-        
-        if result['errors']:
-            error_details = "; ".join([f"Row {e['row']}: {e['reason']}" for e in result['errors'][:5]])
-            flash(f"Errors: {error_details}", 'warning')
-    
+    # Copy the file to disk and queue it; the job processes it in the background
+    spooled = tempfile.NamedTemporaryFile(suffix=_upload_extension(file.filename), delete=False)
+    with spooled:
+        file.save(spooled)
+    job = import_app.submit_upload(spooled.name, secure_filename(file.filename), column_mapping)
+
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify(job.to_dict())
+        response.status_code = 202
+        response.headers['Location'] = url_for('api_ingest_job', job_id=job.id)
+        return response
+
+    flash(f"Upload queued as job {job.id}. Progress: {url_for('api_ingest_job', job_id=job.id)}", 'success')
     return redirect(url_for('imports'))
 
 @app.route('/delete_molecule/<molecule_id>', methods=['POST'])
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Row fingerprints for the Import Goods Dashboard
+A 128-bit fingerprint of each import's business fields (date, HS code,
+molecule, consignee, shipper, country, quantity, unit, rate and currency),
+kept for every live row so re-uploaded rows can be recognised and skipped.
+
+Lookups go through a Bloom filter first, checked for a whole batch of rows
+with NumPy; only rows it cannot rule out are looked up in the exact set of
+fingerprints. The index is rebuilt from the stored imports on load.
+"""
+
+import hashlib
+from typing import Dict, List, Any, Mapping, Tuple
+
+import numpy as np
+
+from import_goods_hll import hash64
+from import_goods_table import NUMERIC_FIELDS
+
+# Fields that make two imports the same shipment; ids and shipment mode are left out
+FINGERPRINT_FIELDS = ["date", "hs_code", "molecule_id", "company_id", "distributor_id", "country",
+                      "quantity", "unit", "unit_price", "currency"]
+
+# Bloom filter bits per expected row and hash functions (about 1% false positives)
+BLOOM_BITS_PER_ROW = 10
+BLOOM_HASHES = 7
+
+
+def _value_hash(value: Any) -> int:
+    """64-bit hash of a coded field value, stable across processes"""
+    digest = hashlib.blake2b(repr(value).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _combine(field_hashes: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Fold per-field hashes into the two 64-bit halves of each row's fingerprint"""
+    count = len(field_hashes[0]) if field_hashes else 0
+    high = np.zeros(count, dtype=np.uint64)
+    low = np.zeros(count, dtype=np.uint64)
+    for index, hashes in enumerate(field_hashes):
+        high = hash64(high ^ hashes, salt=index)
+        low = hash64(low ^ hashes, salt=index + len(FINGERPRINT_FIELDS))
+    return high, low
+
+
+class BloomFilter:
+    """Bit-array Bloom filter over (high, low) 64-bit hash pairs, probed by double hashing"""
+
+    def __init__(self, capacity: int, bits_per_row: int = BLOOM_BITS_PER_ROW, hashes: int = BLOOM_HASHES):
+        self.capacity = capacity
+        self.hashes = hashes
+        # A power of two, so a probe is reduced to a bit index with a mask
+        bits = 1 << max(6, int(capacity * bits_per_row - 1).bit_length())
+        self._mask = np.uint64(bits - 1)
+        self.bits = np.zeros(bits // 8, dtype=np.uint8)
+
+    def _probes(self, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+        """Bit index of each hash function (columns) for each item (rows)"""
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return ((high[:, None] + steps * (low[:, None] | np.uint64(1))) & self._mask).astype(np.int64)
+
+    def add(self, high: np.ndarray, low: np.ndarray):
+        probes = self._probes(high, low).ravel()
+        np.bitwise_or.at(self.bits, probes >> 3, (1 << (probes & 7)).astype(np.uint8))
+
+    def might_contain(self, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+        """False where an item was certainly never added"""
+        probes = self._probes(high, low)
+        return ((self.bits[probes >> 3] >> (probes & 7).astype(np.uint8)) & 1).all(axis=1)
+
+
+class FingerprintIndex:
+    """Fingerprints of the live rows of an ImportTable
+
+    Attach to the table's listeners. The exact set counts live rows per
+    fingerprint, so deleting one of two identical rows keeps the other
+    matchable. Bloom filter bits cannot be cleared: deletes only make the
+    filter pass more rows on to the exact set, until it is rebuilt the next
+    time it grows.
+    """
+
+    def __init__(self, table=None):
+        self._counts: Dict[int, int] = {}
+        # Hash of each dictionary value, by code, for the table's coded fields
+        self._code_hashes: Dict[str, np.ndarray] = {}
+        self._value_hashes: Dict[str, Dict[Any, int]] = {}
+        self.bloom = BloomFilter(1024)
+        if table is not None:
+            self.add(table, table.live_positions())
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _hashes_of_values(self, field: str, values: List[Any]) -> np.ndarray:
+        """Hash of each value of a coded field, computed once per distinct value"""
+        cache = self._value_hashes.setdefault(field, {})
+        hashes = np.empty(len(values), dtype=np.uint64)
+        for index, value in enumerate(values):
+            value_hash = cache.get(value)
+            if value_hash is None:
+                value_hash = cache[value] = _value_hash(value)
+            hashes[index] = value_hash
+        return hashes
+
+    def _hashes_of_codes(self, table, field: str, positions: np.ndarray) -> np.ndarray:
+        """Hash of the value of a coded field at each row position"""
+        values = table.dictionaries[field].values
+        cached = self._code_hashes.get(field, np.zeros(0, dtype=np.uint64))
+        if len(cached) < len(values):
+            cached = self._code_hashes[field] = np.concatenate(
+                [cached, self._hashes_of_values(field, values[len(cached):])])
+        return cached[table.column(field)[positions]]
+
+    def table_fingerprints(self, table, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fingerprint halves of rows of `table`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return _combine([table.column(field)[positions].view(np.uint64) if field in NUMERIC_FIELDS
+                         else self._hashes_of_codes(table, field, positions)
+                         for field in FINGERPRINT_FIELDS])
+
+    def record_fingerprints(self, records: List[Mapping[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Fingerprint halves of validated import records (numeric fields already floats)"""
+        return _combine([np.array([r[field] for r in records], dtype=np.float64).view(np.uint64)
+                         if field in NUMERIC_FIELDS
+                         else self._hashes_of_values(field, [r.get(field) for r in records])
+                         for field in FINGERPRINT_FIELDS])
+
+    def add(self, table, positions: np.ndarray):
+        """Count the fingerprints of rows just added to `table`"""
+        if not len(positions):
+            return
+        high, low = self.table_fingerprints(table, positions)
+        for key in _keys(high, low):
+            self._counts[key] = self._counts.get(key, 0) + 1
+        if len(self._counts) > self.bloom.capacity:
+            self._rebuild_bloom()
+        else:
+            self.bloom.add(high, low)
+
+    def remove(self, table, positions: np.ndarray):
+        """Forget the fingerprints of rows just tombstoned"""
+        high, low = self.table_fingerprints(table, positions)
+        for key in _keys(high, low):
+            count = self._counts.get(key, 0)
+            if count > 1:
+                self._counts[key] = count - 1
+            else:
+                self._counts.pop(key, None)
+
+    def renumber(self, keep: np.ndarray):
+        """Fingerprints hold values, not positions"""
+
+    def _rebuild_bloom(self):
+        """Size the filter for twice the rows now held and re-add every fingerprint"""
+        self.bloom = BloomFilter(2 * len(self._counts))
+        keys = np.array(list(self._counts), dtype=object)
+        if len(keys):
+            self.bloom.add((keys >> 64).astype(np.uint64), (keys & 0xFFFFFFFFFFFFFFFF).astype(np.uint64))
+
+    def duplicates(self, records: List[Mapping[str, Any]]) -> np.ndarray:
+        """True for each record that matches a live row, or an earlier record of the same list"""
+        duplicate = np.zeros(len(records), dtype=bool)
+        if not records:
+            return duplicate
+        high, low = self.record_fingerprints(records)
+        candidates = np.flatnonzero(self.bloom.might_contain(high, low))
+        keys = _keys(high[candidates], low[candidates])
+        duplicate[candidates] = [key in self._counts for key in keys]
+        # Repeats within the list: every occurrence after the first
+        pairs = np.stack([high, low], axis=1)
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        repeated = np.ones(len(records), dtype=bool)
+        repeated[first] = False
+        return duplicate | repeated
+
+
+def _keys(high: np.ndarray, low: np.ndarray) -> List[int]:
+    """128-bit fingerprints as Python ints, for the exact set"""
+    return [(h << 64) | l for h, l in zip(high.tolist(), low.tolist())]
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+HyperLogLog distinct counters for the Import Goods Dashboard
+Per-day sketches of company and distributor codes, merged to estimate the
+number of distinct companies/distributors in any date window in constant
+memory and without touching import rows.
+
+Error bound: with 2**precision registers the relative standard error is
+1.04 / sqrt(2**precision), i.e. about 1.6% at the default precision of 12;
+estimates fall within three standard errors (about 5%) of the true count
+with 99.7% probability.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Set
+
+import numpy as np
+
+# Registers per sketch are 2 ** HLL_PRECISION (4 KB per day and field at 12)
+HLL_PRECISION = 12
+
+# Fields with a distinct-count KPI
+DISTINCT_FIELDS = ["company_id", "distributor_id"]
+
+# The hash bits below the register index that are used for ranks; 52 bits
+# convert exactly to float64, which lets np.frexp find the leading one
+_RANK_BITS = 52
+
+
+def hash64(values: np.ndarray, salt: int = 0) -> np.ndarray:
+    """SplitMix64 hash of integer values"""
+    z = values.astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 + salt) & 0xFFFFFFFFFFFFFFFF)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class HyperLogLog:
+    """HyperLogLog sketch over 64-bit hashes; sketches of equal precision merge by register max"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray = None):
+        if not 4 <= precision <= 64 - _RANK_BITS:
+            raise ValueError(f"HyperLogLog precision must be between 4 and {64 - _RANK_BITS}")
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Add items given by their 64-bit hashes"""
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = (hashes & np.uint64((1 << _RANK_BITS) - 1)).astype(np.float64)
+        # Rank = position of the leftmost one bit in the rank bits (all zeros -> _RANK_BITS + 1)
+        _, bit_length = np.frexp(rest)
+        np.maximum.at(self.registers, index, (_RANK_BITS + 1 - bit_length).astype(np.uint8))
+
+    def merge(self, other: "HyperLogLog"):
+        """Fold another sketch of the same precision into this one"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    @staticmethod
+    def estimate(registers: np.ndarray) -> float:
+        """Cardinality estimate from a register array, with linear counting for small counts"""
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return float(raw)
+
+    def count(self) -> float:
+        """Estimated number of distinct items added"""
+        return self.estimate(self.registers)
+
+
+class DailyDistinct:
+    """Per-day HyperLogLog sketches of the DISTINCT_FIELDS codes of an ImportTable
+
+    Attach to the table's listeners. Sketches cannot forget items, so a day
+    that loses rows is marked stale and rebuilt from its live rows the next
+    time a window covering it is queried.
+    """
+
+    def __init__(self, table=None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        # Day ordinal -> registers, one row per field in DISTINCT_FIELDS
+        self._days: Dict[int, np.ndarray] = {}
+        self._sorted_days: List[int] = []
+        self._stale: Set[int] = set()
+        if table is not None:
+            self.add(table, table.live_positions())
+
+    def _day_registers(self, day: int) -> np.ndarray:
+        registers = self._days.get(day)
+        if registers is None:
+            registers = self._days[day] = np.zeros((len(DISTINCT_FIELDS), 1 << self.precision), dtype=np.uint8)
+            insort(self._sorted_days, day)
+        return registers
+
+    def add(self, table, positions: np.ndarray):
+        """Sketch rows just added to `table`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return
+        days = table.column("date_ordinal")[positions]
+        order = np.argsort(days, kind="stable")
+        day_values, starts = np.unique(days[order], return_index=True)
+        bounds = starts.tolist() + [len(order)]
+        for index, day in enumerate(day_values.tolist()):
+            rows = positions[order[bounds[index]:bounds[index + 1]]]
+            registers = self._day_registers(day)
+            for row, field in enumerate(DISTINCT_FIELDS):
+                HyperLogLog(self.precision, registers[row]).add_hashes(
+                    hash64(table.column(field)[rows], salt=row))
+
+    def remove(self, table, positions: np.ndarray):
+        """Mark the days of rows just tombstoned for a rebuild"""
+        self._stale.update(np.unique(table.column("date_ordinal")[positions]).tolist())
+
+    def renumber(self, keep: np.ndarray):
+        """Sketches hold codes, not positions"""
+
+    def _rebuild(self, table, day: int):
+        """Re-sketch a day from its live rows"""
+        self._day_registers(day)[:] = 0
+        self._stale.discard(day)
+        self.add(table, table.date_range(day, day).positions)
+
+    def distinct(self, table, start: int, end: int) -> Dict[str, int]:
+        """Estimated distinct codes per DISTINCT_FIELDS field among rows dated within [start, end]"""
+        days = self._sorted_days[bisect_left(self._sorted_days, start):bisect_right(self._sorted_days, end)]
+        for day in self._stale.intersection(days):
+            self._rebuild(table, day)
+        merged = np.zeros((len(DISTINCT_FIELDS), 1 << self.precision), dtype=np.uint8)
+        for day in days:
+            np.maximum(merged, self._days[day], out=merged)
+        return {field: int(round(HyperLogLog.estimate(merged[row])))
+                for row, field in enumerate(DISTINCT_FIELDS)}
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+In-memory indexes for the Import Goods Dashboard
+Hash indexes over molecules, companies and distributors so lookups by id or
+name do not scan the entity lists, and n-gram indexes for substring search.
+"""
+
+from typing import Dict, List, Optional, Any, Hashable, Set
+
+# Entity collections covered by the registry
+ENTITY_TYPES = ["molecules", "companies", "distributors"]
+
+
+def normalize_name(name: str) -> str:
+    """Normalize an entity name for case-insensitive comparison"""
+    return name.lower().strip()
+
+
+def ngrams(text: str, size: int) -> Set[str]:
+    """Return the distinct substrings of length `size`"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class TrigramIndex:
+    """Inverted index from n-grams of lowercased names to keys, for substring search
+
+    Unigrams and bigrams are indexed too, so needles of one or two characters
+    are answered straight from their posting set. Longer needles intersect the
+    posting sets of their trigrams and confirm the substring on the survivors.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self._names: Dict[Hashable, str] = {}
+        self._order: Dict[Hashable, int] = {}
+        self._next_order = 0
+
+    def add(self, key: Hashable, name: str):
+        """Index `name` under `key`, replacing any previous name for the key"""
+        if key in self._names:
+            self.remove(key)
+        text = name.lower()
+        self._names[key] = text
+        self._order[key] = self._next_order
+        self._next_order += 1
+        for size in range(1, self.GRAM_SIZE + 1):
+            for gram in ngrams(text, size):
+                self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: Hashable):
+        """Drop a key from the index"""
+        text = self._names.pop(key, None)
+        if text is None:
+            return
+        del self._order[key]
+        for size in range(1, self.GRAM_SIZE + 1):
+            for gram in ngrams(text, size):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(key)
+                    if not posting:
+                        del self._postings[gram]
+
+    def search(self, needle: str) -> Set[Hashable]:
+        """Return the keys whose name contains `needle` (case-insensitive)"""
+        needle = needle.lower()
+        if not needle:
+            return set(self._names)
+        if len(needle) <= self.GRAM_SIZE:
+            return set(self._postings.get(needle, ()))
+
+        postings = []
+        for gram in ngrams(needle, self.GRAM_SIZE):
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {key for key in candidates if needle in self._names[key]}
+
+    def search_ordered(self, needle: str) -> List[Hashable]:
+        """Matching keys in the order they were first indexed"""
+        return sorted(self.search(needle), key=self._order.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class EntityRegistry:
+    """id -> entity and normalized name -> entity maps for each entity type,
+    plus a trigram index over the names for substring search"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        self._by_id: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._by_name: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self._name_index: Dict[str, TrigramIndex] = {}
+        self.rebuild(data or {})
+
+    def rebuild(self, data: Dict[str, Any]):
+        """Re-index every entity list in `data`"""
+        for entity_type in ENTITY_TYPES:
+            self._by_id[entity_type] = {}
+            self._by_name[entity_type] = {}
+            self._name_index[entity_type] = TrigramIndex()
+            for entity in data.get(entity_type, []):
+                self.add(entity_type, entity)
+
+    def add(self, entity_type: str, entity: Dict[str, Any]):
+        """Index a newly added entity"""
+        if not isinstance(entity, dict) or "id" not in entity:
+            return
+        if entity["id"] in self._by_id[entity_type]:
+            return
+        self._by_id[entity_type][entity["id"]] = entity
+        if isinstance(entity.get("name"), str):
+            self._by_name[entity_type].setdefault(normalize_name(entity["name"]), []).append(entity)
+            self._name_index[entity_type].add(entity["id"], entity["name"])
+
+    def remove(self, entity_type: str, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Drop an entity from the indexes and return it"""
+        entity = self._by_id[entity_type].pop(entity_id, None)
+        if entity is not None and isinstance(entity.get("name"), str):
+            key = normalize_name(entity["name"])
+            # Legacy data may hold several entities with the same name
+            remaining = [e for e in self._by_name[entity_type].get(key, []) if e is not entity]
+            if remaining:
+                self._by_name[entity_type][key] = remaining
+            else:
+                self._by_name[entity_type].pop(key, None)
+            self._name_index[entity_type].remove(entity_id)
+        return entity
+
+    def get(self, entity_type: str, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Return the entity with the given id"""
+        return self._by_id[entity_type].get(entity_id)
+
+    def exists(self, entity_type: str, entity_id: str) -> bool:
+        """Return whether an entity with the given id exists"""
+        return entity_id in self._by_id[entity_type]
+
+    def find_by_name(self, entity_type: str, name: str) -> Optional[Dict[str, Any]]:
+        """Return the first entity whose normalized name matches `name`"""
+        matches = self._by_name[entity_type].get(normalize_name(name))
+        return matches[0] if matches else None
+
+    def search_ids(self, entity_type: str, needle: str) -> Set[str]:
+        """Ids of entities whose name contains `needle` (case-insensitive)"""
+        return self._name_index[entity_type].search(needle)
+
+    def search(self, entity_type: str, needle: str) -> List[Dict[str, Any]]:
+        """Entities whose name contains `needle`, in the order they were added"""
+        by_id = self._by_id[entity_type]
+        return [by_id[entity_id] for entity_id in self._name_index[entity_type].search_ordered(needle)]
+
+    def name_of(self, entity_type: str, entity_id: str, default: str = "Unknown") -> str:
+        """Return an entity's display name"""
+        entity = self._by_id[entity_type].get(entity_id)
+        return entity["name"] if entity is not None else default
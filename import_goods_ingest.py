@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+Column-wise ingest of customs exports for the Import Goods Dashboard
+Validates a DataFrame of import rows one column at a time instead of row by
+row: each distinct cell value is parsed once, entity names are resolved once
+per distinct name, and record ids are minted in bulk. Rows are rejected with
+the same reasons, checked in the same order, as the original row loop.
+Large workbooks are streamed in fixed-size chunks with openpyxl's read-only
+mode, and CSV and Parquet files through pandas' C parser and Arrow record
+batches, so memory stays bounded by the chunk size rather than the file size.
+Streamed files are checkpointed by content digest after every chunk, so an
+interrupted ingest resumes after the last committed row.
+Batches of workbooks are parsed sheet by sheet on a process pool; entity
+names are resolved afterwards, in one pass, by the process that commits.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+# Columns every upload must have
+REQUIRED_COLUMNS = ["Date", "Product Description", "Consignee Name", "Shipper Name",
+                    "Country of Origin", "QTY", "Unit", "Rate In FC", "Rate Currency"]
+
+# Rows validated and committed together when a workbook is streamed
+INGEST_CHUNK_ROWS = 20000
+
+# Worker processes parsing sheets in a batch ingest
+INGEST_WORKERS = min(4, os.cpu_count() or 1)
+
+# Allowed currencies
+ALLOWED_CURRENCIES = ["USD", "EUR", "INR", "GBP", "JPY", "CNY"]
+
+# Entity type created from each name column, and the reason given when the name is blank
+ENTITY_COLUMNS = [
+    ("molecules", "Product Description", "Product description is required"),
+    ("companies", "Consignee Name", "Consignee name is required"),
+    ("distributors", "Shipper Name", "Shipper name is required")
+]
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# Character positions of the hex digits in a canonical 36-character UUID
+_UUID_DIGITS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+
+def generate_ids(count: int) -> List[str]:
+    """`count` random (version 4) UUID strings, minted in one batch"""
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    digits = np.empty((count, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    text = np.full((count, 36), ord("-"), dtype=np.uint8)
+    text[:, _UUID_DIGITS] = digits
+    return text.view("S36").reshape(-1).astype(str).tolist()
+
+
+def parse_date(value) -> str:
+    """YYYY-MM-DD for a date cell; raises for missing or unparseable dates"""
+    if pd.isna(value):
+        raise ValueError("Date is required")
+    return pd.to_datetime(value.strip() if isinstance(value, str) else value).strftime("%Y-%m-%d")
+
+
+def map_unique(series: pd.Series, parse: Callable[[Any], Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply `parse` once per distinct value of a column
+
+    Returns the parsed value of every row and a mask of the rows whose value
+    `parse` rejected by raising. Missing values are parsed row by row, since
+    distinct kinds of missing value (None, NaN, NaT) compare equal here.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    results = np.empty(len(uniques) + 1, dtype=object)
+    failed = np.zeros(len(uniques) + 1, dtype=np.bool_)
+    for index, value in enumerate(uniques):
+        try:
+            results[index] = parse(value)
+        except Exception:
+            failed[index] = True
+    values, rejected = results[codes], failed[codes]
+
+    missing = np.flatnonzero(codes == -1)
+    cells = series.to_numpy(dtype=object)
+    for position in missing.tolist():
+        try:
+            values[position] = parse(cells[position])
+            rejected[position] = False
+        except Exception:
+            rejected[position] = True
+    return values, rejected
+
+
+def parse_floats(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """float() of every cell, and a mask of the cells float() rejects"""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan), np.zeros(len(series), dtype=np.bool_)
+    values, rejected = map_unique(series, float)
+    values[rejected] = np.nan
+    return values.astype(np.float64), rejected
+
+
+# Date text formats parsed in one vectorized call; anything else goes through parse_date
+ISO_DATE_FORMATS = {
+    r"\d{4}-\d{2}-\d{2}": "%Y-%m-%d",
+    r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}": "%Y-%m-%d %H:%M:%S"
+}
+
+
+def iso_dates(series: pd.Series) -> Dict[str, str]:
+    """YYYY-MM-DD of the distinct text cells written as plain ISO dates (as CSV exports write them)
+
+    Cells that match a format but are not valid dates are left out, so
+    parse_date still rejects them.
+    """
+    texts = pd.Series(series[series.map(type) == str].unique(), dtype=object)
+    found = {}
+    for pattern, date_format in ISO_DATE_FORMATS.items():
+        matching = texts[texts.str.strip().str.fullmatch(pattern)]
+        parsed = pd.to_datetime(matching.str.strip(), format=date_format, errors="coerce")
+        found.update(zip(matching[parsed.notna()], parsed[parsed.notna()].dt.strftime("%Y-%m-%d")))
+    return found
+
+
+def parse_dates(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """YYYY-MM-DD of every cell, and a mask of the cells that are not dates"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        rejected = series.isna().to_numpy()
+        return series.dt.strftime("%Y-%m-%d").to_numpy(dtype=object), rejected
+    known = iso_dates(series)
+    return map_unique(series, lambda value: known[value] if type(value) is str and value in known
+                      else parse_date(value))
+
+
+def stripped(series: pd.Series, optional: bool = False) -> np.ndarray:
+    """str(cell).strip() of every cell; None for missing cells if `optional`"""
+    if optional:
+        return map_unique(series, lambda value: None if pd.isna(value) else str(value).strip())[0]
+    return map_unique(series, lambda value: str(value).strip())[0]
+
+
+@dataclass
+class ParsedRows:
+    """An upload chunk after every check that needs no entity lookup
+
+    Plain arrays only, so chunks parsed in worker processes pickle cheaply.
+    `reasons` holds the skip reason of rows already rejected, None for the rest.
+    """
+    row_numbers: np.ndarray
+    reasons: np.ndarray
+    dates: np.ndarray
+    quantity: np.ndarray
+    unit: np.ndarray
+    unit_price: np.ndarray
+    currency: np.ndarray
+    # Stripped name of every row per entity type
+    names: Dict[str, np.ndarray]
+    country: np.ndarray
+    shipment_mode: np.ndarray
+    hs_code: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.row_numbers)
+
+
+def parse_frame(df: pd.DataFrame) -> ParsedRows:
+    """Parse an upload's rows and reject those failing the checks before the entity names"""
+    count = len(df)
+    reasons = np.full(count, None, dtype=object)
+    pending = np.ones(count, dtype=np.bool_)
+
+    def reject(failed: np.ndarray, reason: Callable[[int], str]):
+        failed = failed & pending
+        for position in np.flatnonzero(failed).tolist():
+            reasons[position] = reason(position)
+        pending[failed] = False
+
+    def cell(column: str) -> Callable[[int], Any]:
+        values = df[column].to_numpy(dtype=object)
+        return lambda position: values[position]
+
+    dates, rejected = parse_dates(df["Date"])
+    date_cell = cell("Date")
+    reject(rejected, lambda p: f"Invalid date format: {date_cell(p)}")
+
+    quantity, rejected = parse_floats(df["QTY"])
+    with np.errstate(invalid="ignore"):
+        rejected |= quantity <= 0
+    quantity_cell = cell("QTY")
+    reject(rejected, lambda p: f"Invalid quantity: {quantity_cell(p)}")
+
+    unit = stripped(df["Unit"])
+    reject(unit == "", lambda p: "Unit is required")
+
+    unit_price, rejected = parse_floats(df["Rate In FC"])
+    with np.errstate(invalid="ignore"):
+        rejected |= unit_price < 0
+    price_cell = cell("Rate In FC")
+    reject(rejected, lambda p: f"Invalid unit price: {price_cell(p)}")
+
+    currency = map_unique(df["Rate Currency"], lambda value: str(value).strip().upper())[0]
+    reject(~np.isin(currency, ALLOWED_CURRENCIES), lambda p: f"Invalid currency: {currency[p]}")
+
+    absent = np.full(count, None, dtype=object)
+    return ParsedRows(
+        # Excel rows start at 1, +1 for the header
+        row_numbers=df.index.to_numpy() + 2,
+        reasons=reasons,
+        dates=dates,
+        quantity=quantity,
+        unit=unit,
+        unit_price=unit_price,
+        currency=currency,
+        names={entity_type: stripped(df[column]) for entity_type, column, _ in ENTITY_COLUMNS},
+        country=stripped(df["Country of Origin"]),
+        shipment_mode=stripped(df["Shipment Mode"], optional=True) if "Shipment Mode" in df.columns else absent,
+        hs_code=stripped(df["HS Code"], optional=True) if "HS Code" in df.columns else absent
+    )
+
+
+def resolve_rows(parsed: ParsedRows,
+                 find_or_create: Callable[[str, str], Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Check the entity names of parsed rows, resolve them and build import records
+
+    `find_or_create(entity_type, name)` returns the molecule, company or
+    distributor with that name, creating it if needed; like the row loop it
+    is only called for rows that passed every earlier check. Returns the
+    import records and the skipped rows ({"row", "reason"}, in row order).
+    """
+    count = len(parsed)
+    reasons = parsed.reasons.copy()
+    pending = np.array([reason is None for reason in reasons.tolist()], dtype=np.bool_)
+
+    # Resolve each distinct name once, in order of first appearance
+    entity_ids = {}
+    for entity_type, _, reason in ENTITY_COLUMNS:
+        names = parsed.names[entity_type]
+        rejected = (names == "") & pending
+        reasons[rejected] = reason
+        pending &= ~rejected
+        ids = np.full(count, None, dtype=object)
+        codes, uniques = pd.factorize(names[pending])
+        ids[pending] = np.array([find_or_create(entity_type, name)["id"] for name in uniques],
+                                dtype=object)[codes]
+        entity_ids[entity_type] = ids
+
+    rows = np.flatnonzero(pending)
+    records = [{
+        "id": record_id,
+        "date": parsed.dates[p],
+        "molecule_id": entity_ids["molecules"][p],
+        "company_id": entity_ids["companies"][p],
+        "distributor_id": entity_ids["distributors"][p],
+        "country": parsed.country[p],
+        "shipment_mode": parsed.shipment_mode[p],
+        "quantity": float(parsed.quantity[p]),
+        "unit": parsed.unit[p],
+        "unit_price": float(parsed.unit_price[p]),
+        "currency": parsed.currency[p],
+        "hs_code": parsed.hs_code[p]
+    } for record_id, p in zip(generate_ids(len(rows)), rows.tolist())]
+
+    skipped = [{"row": int(parsed.row_numbers[p]), "reason": reasons[p]}
+               for p in np.flatnonzero(~pending).tolist()]
+    return records, skipped
+
+
+def ingest_frame(df: pd.DataFrame,
+                 find_or_create: Callable[[str, str], Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Validate an upload's rows and build import records; parse_frame then resolve_rows"""
+    return resolve_rows(parse_frame(df), find_or_create)
+
+
+def _count_row_tags(sheet, block: int = 1 << 20) -> int:
+    """Number of <row> elements in a read-only worksheet's XML, without parsing it"""
+    count, tail = 0, b""
+    with sheet._get_source() as source:
+        while True:
+            data = source.read(block)
+            if not data:
+                return count
+            # Carry 4 bytes, one short of a tag, so a tag split across blocks is counted once
+            text = tail + data
+            count += text.count(b"<row ") + text.count(b"<row>")
+            tail = text[-4:]
+
+
+def sheet_rows(sheet) -> int:
+    """Data rows of a read-only worksheet, blank ones included
+
+    Taken from the sheet's stored dimensions, or by counting row tags when
+    the writer left them out.
+    """
+    rows = sheet.max_row if sheet.max_row is not None else _count_row_tags(sheet)
+    return max(0, rows - 1)
+
+
+class ExcelChunkReader:
+    """A worksheet of an .xlsx file as DataFrames of at most `chunk_rows` rows
+
+    `sheet` is a sheet name or index (default: the first sheet). Rows are
+    streamed with openpyxl's read-only mode. Cells come through as
+    pd.read_excel would give them (empty cells as NaN); fully empty rows are
+    skipped, and each frame is indexed so that index + 2 is the sheet row.
+    """
+
+    def __init__(self, source, chunk_rows: int = INGEST_CHUNK_ROWS, sheet: Union[int, str] = 0):
+        self.chunk_rows = chunk_rows
+        self._workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        sheet = self._workbook[sheet] if isinstance(sheet, str) else self._workbook.worksheets[sheet]
+        self.total_rows = sheet_rows(sheet)
+        self._rows = sheet.iter_rows(values_only=True)
+        header = next(self._rows, ())
+        self.columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        width = len(self.columns)
+        rows, index = [], []
+        for number, row in enumerate(self._rows):
+            if all(value is None for value in row):
+                continue
+            row = [np.nan if value is None else value for value in row[:width]]
+            rows.append(row + [np.nan] * (width - len(row)))
+            index.append(number)
+            if len(rows) == self.chunk_rows:
+                yield pd.DataFrame(rows, columns=self.columns, index=index)
+                rows, index = [], []
+        if rows:
+            yield pd.DataFrame(rows, columns=self.columns, index=index)
+
+    def close(self):
+        self._workbook.close()
+
+    def __enter__(self) -> "ExcelChunkReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def file_digest(path: str, block: int = 1 << 20) -> str:
+    """SHA-256 hex digest of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for data in iter(lambda: source.read(block), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _count_lines(path: str, block: int = 1 << 20) -> int:
+    """Number of lines in a text file, counted in raw blocks"""
+    count, last = 0, b"\n"
+    with open(path, "rb") as source:
+        while True:
+            data = source.read(block)
+            if not data:
+                # A final line without a newline still counts
+                return count + (last != b"\n")
+            count += data.count(b"\n")
+            last = data[-1:]
+
+
+class CsvChunkReader:
+    """A .csv file as DataFrames of at most `chunk_rows` rows, read with pandas' C parser
+
+    Types are inferred per chunk as read_csv does, except that HS codes stay
+    text so leading zeros survive. Blank lines are skipped but still counted,
+    so index + 2 is the line number as long as no quoted field spans lines.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = INGEST_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.columns = pd.read_csv(path, nrows=0).columns.tolist()
+        self.total_rows = max(0, _count_lines(path) - 1)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(self.path, chunksize=self.chunk_rows, engine="c", skip_blank_lines=False,
+                         dtype={"HS Code": str}) as chunks:
+            for df in chunks:
+                df = df.dropna(how="all")
+                if len(df):
+                    yield df
+
+    def close(self):
+        """Chunks are read inside iteration, which closes the file itself"""
+
+    def __enter__(self) -> "CsvChunkReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetChunkReader:
+    """A .parquet file as DataFrames of at most `chunk_rows` rows, one record batch at a time
+
+    Needs pyarrow. Numeric and timestamp columns convert without copying
+    where Arrow allows it; nulls in text columns become NaN, as in the other
+    readers. Rows are numbered as if the file had a header row.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = INGEST_CHUNK_ROWS):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet uploads need the pyarrow package")
+        self.chunk_rows = chunk_rows
+        self._file = pq.ParquetFile(path)
+        self.columns = self._file.schema_arrow.names
+        self.total_rows = self._file.metadata.num_rows
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        offset = 0
+        for batch in self._file.iter_batches(batch_size=self.chunk_rows):
+            df = batch.to_pandas(date_as_object=False)
+            df.index = pd.RangeIndex(offset, offset + len(df))
+            offset += len(df)
+            for column in df.columns[df.dtypes == object]:
+                df[column] = df[column].where(df[column].notna(), np.nan)
+            yield df
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "ParquetChunkReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Chunk reader for each accepted upload file extension
+INGEST_READERS = {
+    ".xlsx": ExcelChunkReader,
+    ".csv": CsvChunkReader,
+    ".parquet": ParquetChunkReader
+}
+
+
+def open_reader(path: str, chunk_rows: int = INGEST_CHUNK_ROWS, sheet: Optional[Union[int, str]] = None):
+    """Chunk reader for an upload file, picked by its extension
+
+    Readers have `columns` and `total_rows` and iterate DataFrames whose
+    index + 2 is the row number reported for skipped rows. `sheet` only
+    applies to .xlsx files (default: the first sheet).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in INGEST_READERS:
+        raise ValueError(f"Unsupported file type: {extension or path}")
+    if extension == ".xlsx":
+        return ExcelChunkReader(path, chunk_rows, 0 if sheet is None else sheet)
+    return INGEST_READERS[extension](path, chunk_rows)
+
+
+def file_sheets(path: str) -> List[Tuple[Optional[str], int]]:
+    """Name and estimated data row count of every worksheet of an upload file
+
+    CSV and Parquet files have a single, unnamed (None) sheet.
+    """
+    if os.path.splitext(path)[1].lower() != ".xlsx":
+        with open_reader(path) as reader:
+            return [(None, reader.total_rows)]
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [(sheet.title, sheet_rows(sheet)) for sheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+
+def parse_sheet(path: str, sheet: Optional[str], chunk_rows: int = INGEST_CHUNK_ROWS) -> Dict[str, Any]:
+    """Parse one worksheet (or CSV/Parquet file) into ParsedRows chunks; runs in a worker process
+
+    Returns {"chunks": [...]}, or {"error": ...} when the sheet lacks a
+    required column or cannot be read.
+    """
+    try:
+        with open_reader(path, chunk_rows, sheet) as reader:
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in reader.columns]
+            if missing_columns:
+                return {"error": f"Missing required columns: {', '.join(missing_columns)}"}
+            return {"chunks": [parse_frame(df) for df in reader]}
+    except Exception as e:
+        return {"error": f"Error processing file: {str(e)}"}
+
+
+def sheet_tasks(paths: List[str]) -> List[Dict[str, Any]]:
+    """{"path", "sheet", "total_rows"} of every sheet of every file, in file then sheet order
+
+    A file that cannot be opened gets a single entry with sheet None and an "error".
+    """
+    tasks = []
+    for path in paths:
+        try:
+            tasks.extend({"path": path, "sheet": name, "total_rows": rows} for name, rows in file_sheets(path))
+        except Exception as e:
+            tasks.append({"path": path, "sheet": None, "total_rows": 0,
+                          "error": f"Error processing file: {str(e)}"})
+    return tasks
+
+
+def parse_workbooks(tasks: List[Dict[str, Any]], max_workers: Optional[int] = None,
+                    chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Parse the sheets of sheet_tasks in parallel, yielding each task with parse_sheet's result
+
+    Results come in task order whatever order the workers finish in.
+    """
+    parse = [task for task in tasks if "error" not in task]
+    workers = min(max_workers or INGEST_WORKERS, len(parse))
+    if workers <= 1:
+        # One sheet, or one worker: not worth a pool
+        results = (parse_sheet(task["path"], task["sheet"], chunk_rows) for task in parse)
+        for task in tasks:
+            yield task if "error" in task else dict(task, **next(results))
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        futures = iter([pool.submit(parse_sheet, task["path"], task["sheet"], chunk_rows) for task in parse])
+        for task in tasks:
+            yield task if "error" in task else dict(task, **next(futures).result())
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+
+    from import_goods_app import ImportGoodsApp
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Ingest every sheet of several .xlsx, .csv or .parquet files in one commit")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--data", default="import_goods_data.json", help="data file to ingest into")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"],
+                        help="storage engine (default: from the data file extension)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+
+    result = ImportGoodsApp(args.data, storage=args.storage).process_batch(args.files, max_workers=args.workers)
+    if "error" in result:
+        raise SystemExit(result["error"])
+    def where(entry: Dict[str, Any]) -> str:
+        return entry["file"] if entry["sheet"] is None else f"{entry['file']} [{entry['sheet']}]"
+
+    for sheet in result["sheets"]:
+        print(f"{where(sheet)}: processed {sheet['processed']}, skipped {sheet['skipped']}, "
+              f"duplicates {sheet['duplicates']}" + (f", {sheet['error']}" if "error" in sheet else ""))
+    print(f"Processed: {result['processed']}, Created: {result['created']}, Skipped: {result['skipped']}, "
+          f"Duplicates: {result['duplicates']}")
+    for error in result["errors"]:
+        print(f"{where(error)} row {error['row']}: {error['reason']}")
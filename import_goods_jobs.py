@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Background ingest jobs for the Import Goods Dashboard
+Uploads are queued as jobs and run one at a time on a single worker thread,
+so a request returns as soon as its file is on disk and concurrent uploads
+never interleave their writes. Each job reports rows processed, entities
+created, rows skipped, duplicate rows left out and an ETA while it runs.
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs remembered for polling; older ones are forgotten first
+JOB_HISTORY = 100
+
+
+class IngestJob:
+    """One queued upload and its progress"""
+
+    def __init__(self, filename: str, run: Callable[["IngestJob"], Dict[str, Any]]):
+        self.id = str(uuid.uuid4())
+        self.filename = filename
+        self.status = "queued"
+        self._run = run
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self.total_rows: Optional[int] = None
+        self.processed = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.created: Dict[str, int] = {"molecules": 0, "companies": 0, "distributors": 0, "imports": 0}
+        self.errors = []
+        # Per-sheet summaries of a batch upload
+        self.sheets: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._updated_at: Optional[float] = None
+
+    def update(self, processed: int, skipped: int, created: Dict[str, int], total_rows: Optional[int] = None,
+               duplicates: int = 0):
+        """Record progress; called by the ingest after each committed chunk"""
+        with self._lock:
+            self.processed, self.skipped, self.created = processed, skipped, dict(created)
+            self.duplicates = duplicates
+            self._updated_at = time.time()
+            if total_rows is not None:
+                self.total_rows = total_rows
+
+    def run(self):
+        """Run the job on the calling thread and record its outcome"""
+        with self._lock:
+            self.status, self.started_at = "running", time.time()
+        try:
+            result = self._run(self)
+        except Exception as e:
+            logger.error(f"Ingest job {self.id} failed: {e}")
+            result = {"error": str(e)}
+        with self._lock:
+            if "error" in result:
+                self.status, self.error = "failed", result["error"]
+            else:
+                self.status = "done"
+                self.processed, self.skipped = result["processed"], result["skipped"]
+                self.created, self.errors = result["created"], result["errors"]
+                self.duplicates = result.get("duplicates", 0)
+                self.sheets = result.get("sheets")
+                self.total_rows = self.processed
+            self.finished_at = time.time()
+        self._finished.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job has finished; False if `timeout` ran out first"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready snapshot of the job"""
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at is not None else 0.0
+            eta = None
+            if self.status == "running" and self.total_rows and self.processed:
+                # Rows still to go at the rate seen up to the last update, less the time since it
+                so_far = self._updated_at - self.started_at
+                eta = max(0.0, so_far * (self.total_rows - self.processed) / self.processed - (now - self._updated_at))
+            elif self.status in ("done", "failed"):
+                eta = 0.0
+            return {
+                "id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "total_rows": self.total_rows,
+                "processed": self.processed,
+                "created": dict(self.created),
+                "skipped": self.skipped,
+                "duplicates": self.duplicates,
+                "errors": list(self.errors),
+                "sheets": self.sheets,
+                "error": self.error,
+                "elapsed_seconds": round(elapsed, 3),
+                "eta_seconds": None if eta is None else round(eta, 3)
+            }
+
+
+class IngestQueue:
+    """FIFO of ingest jobs run by one daemon worker thread, started on first submit"""
+
+    def __init__(self, history: int = JOB_HISTORY):
+        self.history = history
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue()
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, filename: str, run: Callable[[IngestJob], Dict[str, Any]]) -> IngestJob:
+        """Queue `run(job)`, which returns an upload result dict, and return the job"""
+        job = IngestJob(filename, run)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="ingest-jobs", daemon=True)
+                self._worker.start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond the history size"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                self._queue.task_done()
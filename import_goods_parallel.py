@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Process-pool metrics aggregation for the Import Goods Dashboard
+Large date windows are split into month shards. Each worker process
+aggregates its shard from a read-only snapshot of the import table held in
+shared memory, so requests only send a few integers to the workers, and the
+partial aggregates are merged into the usual metrics structure.
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from import_goods_index import EntityRegistry
+from import_goods_metrics import _columnar_metrics
+from import_goods_rollup import CELL_FIELDS
+from import_goods_table import ImportSelection
+from import_goods_tdigest import month_index, month_bounds
+
+# Worker processes in the aggregation pool
+PARALLEL_WORKERS = min(4, os.cpu_count() or 1)
+
+# Snapshot columns, 8-byte columns first so every column stays aligned
+SNAPSHOT_COLUMNS = [("position", np.int64), ("quantity", np.float64), ("date_ordinal", np.int32)] + \
+                   [(field, np.int32) for field in CELL_FIELDS]
+
+
+def _snapshot_views(buffer, length: int) -> Dict[str, np.ndarray]:
+    """Column arrays laid out back to back in a snapshot buffer"""
+    views, offset = {}, 0
+    for field, dtype in SNAPSHOT_COLUMNS:
+        views[field] = np.ndarray(length, dtype=dtype, buffer=buffer, offset=offset)
+        offset += length * np.dtype(dtype).itemsize
+    return views
+
+
+def _snapshot_size(length: int) -> int:
+    return max(1, length * sum(np.dtype(dtype).itemsize for _, dtype in SNAPSHOT_COLUMNS))
+
+
+class TableSnapshot:
+    """Live rows of an ImportTable in date order, copied into one shared memory block"""
+
+    def __init__(self, table):
+        positions = table.by_date().positions
+        self.length = len(positions)
+        self.shm = SharedMemory(create=True, size=_snapshot_size(self.length))
+        views = _snapshot_views(self.shm.buf, self.length)
+        views["position"][:] = positions
+        for field, _ in SNAPSHOT_COLUMNS[1:]:
+            views[field][:] = table.column(field)[positions]
+        # Views pin the buffer; drop them so close() can unmap it
+        del views
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        """Unmap and remove the shared memory block"""
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Worker side: the snapshot currently mapped by this process
+_attached: Dict[str, Tuple[SharedMemory, Dict[str, np.ndarray]]] = {}
+
+
+def _attach(name: str, length: int) -> Dict[str, np.ndarray]:
+    """Map a snapshot by name, releasing any older one"""
+    if name not in _attached:
+        for old in list(_attached):
+            shm, _ = _attached.pop(old)
+            shm.close()
+        shm = SharedMemory(name=name)
+        _attached[name] = (shm, _snapshot_views(shm.buf, length))
+    return _attached[name][1]
+
+
+def shard_partial(name: str, length: int, start: int, end: int,
+                  filters: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Aggregate the snapshot rows dated within [start, end] that pass `filters`
+
+    Returns one entry per molecule x company x distributor x country with its
+    import count, quantity sum and the order key of its first row.
+    """
+    views = _attach(name, length)
+    low, high = np.searchsorted(views["date_ordinal"], [start, end + 1])
+    rows = np.arange(low, high)
+    for field, codes in filters.items():
+        rows = rows[np.isin(views[field][rows], codes)]
+
+    keys = np.stack([views[field][rows] for field in CELL_FIELDS], axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    first = np.full(len(unique), len(rows), dtype=np.int64)
+    np.minimum.at(first, inverse, np.arange(len(rows)))
+    first_rows = rows[first]
+    return {
+        "codes": unique.astype(np.int32),
+        "count": np.bincount(inverse, minlength=len(unique)).astype(np.int64),
+        "quantity": np.bincount(inverse, weights=views["quantity"][rows], minlength=len(unique)),
+        # Rows are iterated by date, then by position within a day
+        "key": (views["date_ordinal"][first_rows].astype(np.int64) << 32) + views["position"][first_rows]
+    }
+
+
+def month_shards(start: int, end: int) -> List[Tuple[int, int]]:
+    """Split [start, end] (date ordinals) at month boundaries"""
+    first_month, last_month = month_index([start, end]).tolist()
+    shards = []
+    for month in range(first_month, last_month + 1):
+        month_start, month_end = month_bounds(month)
+        shards.append((max(start, month_start), min(end, month_end)))
+    return shards
+
+
+def can_shard(imports: Iterable) -> bool:
+    """Whether a selection is a date window query the shards can re-run"""
+    return (isinstance(imports, ImportSelection) and imports.window is not None
+            and set(imports.filters) <= set(CELL_FIELDS))
+
+
+class ParallelAggregator:
+    """Month-sharded metrics over a process pool and a shared table snapshot
+
+    The snapshot is rebuilt when the table or the data version changes.
+    `table_lock` must be the lock that guards the table's mutations.
+    """
+
+    def __init__(self, table_lock, max_workers: int = PARALLEL_WORKERS):
+        self.max_workers = max_workers
+        self._table_lock = table_lock
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._snapshot: Optional[TableSnapshot] = None
+        self._snapshot_of: Tuple[Any, int] = (None, -1)
+        atexit.register(self.close)
+
+    def _snapshot_for(self, table, version: int) -> TableSnapshot:
+        table_of, version_of = self._snapshot_of
+        if table_of is not table or version_of != version:
+            with self._table_lock:
+                snapshot = TableSnapshot(table)
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot, self._snapshot_of = snapshot, (table, version)
+        return self._snapshot
+
+    def partials(self, selection: ImportSelection, version: int) -> List[Dict[str, np.ndarray]]:
+        """Per-shard aggregates of a date window selection, in date order"""
+        # One request at a time: a newer snapshot must not replace one still being read
+        with self._lock:
+            snapshot = self._snapshot_for(selection.table, version)
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.max_workers)
+            futures = [self._pool.submit(shard_partial, snapshot.name, snapshot.length, start, end,
+                                         selection.filters)
+                       for start, end in month_shards(*selection.window)]
+            return [future.result() for future in futures]
+
+    def metrics(self, selection: ImportSelection, registry: EntityRegistry, version: int,
+                top_n: int) -> Dict[str, Any]:
+        """Calculate the metrics of a date window selection from merged month shards
+
+        Distinct counts are exact; quantity totals add per-shard sums, so they
+        can differ from a row scan in the last bits.
+        """
+        parts = self.partials(selection, version)
+        codes = np.concatenate([part["codes"] for part in parts])
+        return _columnar_metrics(selection.table.dictionaries, registry,
+                                 {field: codes[:, column] for column, field in enumerate(CELL_FIELDS)},
+                                 np.concatenate([part["count"] for part in parts]),
+                                 np.concatenate([part["quantity"] for part in parts]),
+                                 np.concatenate([part["key"] for part in parts]), top_n)
+
+    def close(self):
+        """Stop the workers and remove the snapshot"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot, self._snapshot_of = None, (None, -1)
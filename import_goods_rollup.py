@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Daily rollup of import records
+Keeps import counts and quantity sums per day x molecule x company x
+distributor x country, updated in place as rows are added or deleted, so
+dashboard metrics for a date window sum at most one bucket per day instead
+of scanning raw rows.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from import_goods_table import Column
+
+# Coded fields that, with the day, make up a rollup cell
+CELL_FIELDS = ["molecule_id", "company_id", "distributor_id", "country"]
+
+# `first` of a cell with no live rows
+NO_ROW = np.iinfo(np.int64).max
+
+
+class DailyRollup:
+    """Import count and quantity sum per day x molecule x company x distributor x country
+
+    Each cell also records the position of its first live row, so rankings can
+    break ties by first appearance in date order exactly like a row scan.
+    Attach it as `table.rollup` and the table keeps it up to date.
+    """
+
+    def __init__(self, table=None):
+        self._cells: Dict[bytes, int] = {}
+        self.day = Column(np.int32)
+        self.codes = {field: Column(np.int32) for field in CELL_FIELDS}
+        self.count = Column(np.int64)
+        self.quantity = Column(np.float64)
+        self.first = Column(np.int64)
+        # Cell ids per day, and the days in sorted order for window lookups
+        self._days: Dict[int, List[int]] = {}
+        self._sorted_days: List[int] = []
+        if table is not None:
+            self.add(table, table.live_positions())
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+    def _cells_of(self, table, positions: np.ndarray) -> np.ndarray:
+        """Cell id of each row, creating cells for new combinations"""
+        keys = np.stack([table.column("date_ordinal")[positions]] +
+                        [table.column(field)[positions] for field in CELL_FIELDS], axis=1).astype(np.int32)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        # Cells are keyed by the raw bytes of (day, codes...)
+        width = unique.shape[1] * unique.itemsize
+        raw = unique.tobytes()
+        packed = [raw[offset:offset + width] for offset in range(0, len(raw), width)]
+        cells = np.fromiter((self._cells.get(key, -1) for key in packed), dtype=np.int64, count=len(packed))
+
+        new = np.flatnonzero(cells == -1)
+        if len(new):
+            cells[new] = np.arange(len(self.count), len(self.count) + len(new))
+            self._cells.update(zip((packed[i] for i in new.tolist()), cells[new].tolist()))
+            days = unique[new, 0]
+            self.day.extend(days)
+            for column, field in enumerate(CELL_FIELDS, start=1):
+                self.codes[field].extend(unique[new, column])
+            self.count.extend(np.zeros(len(new), dtype=np.int64))
+            self.quantity.extend(np.zeros(len(new)))
+            self.first.extend(np.full(len(new), NO_ROW, dtype=np.int64))
+            # np.unique sorted the keys, so new cells of a day are contiguous
+            day_values, starts = np.unique(days, return_index=True)
+            bounds = starts.tolist() + [len(new)]
+            for index, day in enumerate(day_values.tolist()):
+                if day not in self._days:
+                    self._days[day] = []
+                    insort(self._sorted_days, day)
+                self._days[day].extend(cells[new[bounds[index]:bounds[index + 1]]].tolist())
+        return cells[inverse.reshape(-1)]
+
+    def add(self, table, positions: np.ndarray):
+        """Count rows just added to `table`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return
+        cells = self._cells_of(table, positions)
+        np.add.at(self.count.view(), cells, 1)
+        np.add.at(self.quantity.view(), cells, table.column("quantity")[positions])
+        np.minimum.at(self.first.view(), cells, positions)
+
+    def remove(self, table, positions: np.ndarray):
+        """Uncount rows just tombstoned in `table`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return
+        cells = self._cells_of(table, positions)
+        count, quantity, first = self.count.view(), self.quantity.view(), self.first.view()
+        np.add.at(count, cells, -1)
+        np.subtract.at(quantity, cells, table.column("quantity")[positions])
+
+        touched = np.unique(cells)
+        emptied = touched[count[touched] == 0]
+        # Reset empty cells exactly, so rounding from the subtractions does not linger
+        quantity[emptied] = 0.0
+        first[emptied] = NO_ROW
+        for cell in touched[(count[touched] > 0) & np.isin(first[touched], positions)].tolist():
+            first[cell] = self._first_live_row(table, cell)
+
+    def _first_live_row(self, table, cell: int) -> int:
+        """Scan the cell's day for its first live row"""
+        day = int(self.day[cell])
+        positions = table.date_range(day, day).positions
+        for field in CELL_FIELDS:
+            positions = positions[table.column(field)[positions] == self.codes[field][cell]]
+        return int(positions.min())
+
+    def renumber(self, keep: np.ndarray):
+        """Follow a table compaction that dropped the rows where `keep` is False"""
+        first = self.first.view()
+        live = first != NO_ROW
+        first[live] = (np.cumsum(keep, dtype=np.int64) - 1)[first[live]]
+
+    def cells(self, start: int, end: int,
+              filters: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """Ids of non-empty cells dated within [start, end] whose codes pass `filters`"""
+        low = bisect_left(self._sorted_days, start)
+        high = bisect_right(self._sorted_days, end)
+        cells = np.fromiter(chain.from_iterable(self._days[day] for day in self._sorted_days[low:high]),
+                            dtype=np.int64)
+        cells = cells[self.count.view()[cells] > 0]
+        for field, codes in (filters or {}).items():
+            cells = cells[np.isin(self.codes[field].view()[cells], codes)]
+        return cells
+
+    def column(self, field: str) -> np.ndarray:
+        """Return a zero-copy view of a cell column"""
+        if field in self.codes:
+            return self.codes[field].view()
+        if field in ("day", "count", "quantity", "first"):
+            return getattr(self, field).view()
+        raise KeyError(field)
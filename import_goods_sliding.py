@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Sliding-window metrics for the Import Goods Dashboard
+Keeps running import counts and quantity sums per molecule x company x
+distributor x country for each standard dashboard window (daily, weekly,
+monthly, quarterly, yearly, all ending today). Mutations apply deltas, and
+when the date rolls over each window subtracts the days that left it and
+adds the days that entered it from the daily rollup, so serving a standard
+dashboard never rescans the window.
+"""
+
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from import_goods_index import EntityRegistry
+from import_goods_metrics import _columnar_metrics
+from import_goods_rollup import CELL_FIELDS, NO_ROW
+from import_goods_table import Column
+
+# Days before today at which each standard time filter's window starts; windows run through today
+WINDOW_DAYS = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 30,
+    "quarterly": 90,
+    "yearly": 365
+}
+
+
+def _unique_rows(codes: np.ndarray):
+    """Distinct rows of a 2-D code array and each row's index into them
+
+    Same result as np.unique(codes, axis=0, return_inverse=True), but sorts
+    with lexsort instead of comparing rows as opaque byte strings.
+    """
+    if not len(codes):
+        return codes, np.zeros(0, dtype=np.int64)
+    order = np.lexsort(codes.T[::-1])
+    ordered = codes[order]
+    starts = np.concatenate([[True], np.any(ordered[1:] != ordered[:-1], axis=1)])
+    inverse = np.empty(len(codes), dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    return ordered[starts], inverse
+
+
+class _Window:
+    """Running totals per combination for the days [start, end]"""
+
+    def __init__(self, days: int):
+        self.days = days
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.count = np.zeros(0, dtype=np.int64)
+        self.quantity = np.zeros(0)
+        # Order key, (day << 32) + position, of each combination's first row
+        self.first = np.zeros(0, dtype=np.int64)
+        # Set when a removal may have taken away a combination's first row
+        self.stale_first = False
+
+    def grow(self, size: int):
+        extra = size - len(self.count)
+        if extra > 0:
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            self.quantity = np.concatenate([self.quantity, np.zeros(extra)])
+            self.first = np.concatenate([self.first, np.full(extra, NO_ROW, dtype=np.int64)])
+
+    def add(self, combos: np.ndarray, counts: np.ndarray, quantity: np.ndarray, keys: np.ndarray):
+        np.add.at(self.count, combos, counts)
+        np.add.at(self.quantity, combos, quantity)
+        np.minimum.at(self.first, combos, keys)
+
+    def subtract(self, combos: np.ndarray, counts: np.ndarray, quantity: np.ndarray, keys: np.ndarray):
+        np.subtract.at(self.count, combos, counts)
+        np.subtract.at(self.quantity, combos, quantity)
+        touched = np.unique(combos)
+        emptied = touched[self.count[touched] == 0]
+        # Reset empty combinations exactly, so rounding from the subtractions does not linger
+        self.quantity[emptied] = 0.0
+        self.first[emptied] = NO_ROW
+        if np.any(np.isin(self.first[combos], keys)):
+            self.stale_first = True
+
+
+class SlidingWindows:
+    """Running metrics for each WINDOW_DAYS window ending today
+
+    Attach to an ImportTable that has a DailyRollup. A window is built from
+    the rollup the first time it is asked for, then kept up to date by the
+    listener calls and rolled forward (or back) a day at a time as `today`
+    moves. Serving costs one pass over the combinations present in the
+    window, however many rows it holds.
+    """
+
+    def __init__(self):
+        # Molecule x company x distributor x country combinations, keyed by the bytes of their codes
+        self._combos: Dict[bytes, int] = {}
+        self.codes = {field: Column(np.int32) for field in CELL_FIELDS}
+        # Combination of each rollup cell, filled in as the rollup grows
+        self._cell_combo = Column(np.int64)
+        self._windows = {name: _Window(days) for name, days in WINDOW_DAYS.items()}
+
+    def _combo_ids(self, codes: np.ndarray) -> np.ndarray:
+        """Combination id of each row of an (n, len(CELL_FIELDS)) code array, creating new ones"""
+        unique, inverse = _unique_rows(np.ascontiguousarray(codes, dtype=np.int32))
+        width = unique.shape[1] * unique.itemsize
+        raw = unique.tobytes()
+        packed = [raw[offset:offset + width] for offset in range(0, len(raw), width)]
+        ids = np.fromiter((self._combos.get(key, -1) for key in packed), dtype=np.int64, count=len(packed))
+
+        new = np.flatnonzero(ids == -1)
+        if len(new):
+            ids[new] = np.arange(len(self._combos), len(self._combos) + len(new))
+            self._combos.update(zip((packed[i] for i in new.tolist()), ids[new].tolist()))
+            for column, field in enumerate(CELL_FIELDS):
+                self.codes[field].extend(unique[new, column])
+            for window in self._windows.values():
+                window.grow(len(self._combos))
+        return ids[inverse]
+
+    def _rows(self, table, positions: np.ndarray):
+        """Days, combinations and order keys of table rows"""
+        positions = np.asarray(positions, dtype=np.int64)
+        days = table.column("date_ordinal")[positions].astype(np.int64)
+        combos = self._combo_ids(np.stack([table.column(field)[positions] for field in CELL_FIELDS], axis=1))
+        return days, combos, (days << 32) + positions
+
+    def add(self, table, positions: np.ndarray):
+        """Count rows just added to `table` in every built window they fall in"""
+        if not len(positions):
+            return
+        days, combos, keys = self._rows(table, positions)
+        quantity = table.column("quantity")[positions]
+        for window in self._windows.values():
+            if window.start is not None:
+                rows = (days >= window.start) & (days <= window.end)
+                window.add(combos[rows], np.ones(int(rows.sum()), dtype=np.int64), quantity[rows], keys[rows])
+
+    def remove(self, table, positions: np.ndarray):
+        """Uncount rows just tombstoned in `table`"""
+        if not len(positions):
+            return
+        days, combos, keys = self._rows(table, positions)
+        quantity = table.column("quantity")[positions]
+        for window in self._windows.values():
+            if window.start is not None:
+                rows = (days >= window.start) & (days <= window.end)
+                window.subtract(combos[rows], np.ones(int(rows.sum()), dtype=np.int64), quantity[rows], keys[rows])
+
+    def renumber(self, keep: np.ndarray):
+        """Follow a table compaction that dropped the rows where `keep` is False"""
+        new_positions = np.cumsum(keep, dtype=np.int64) - 1
+        for window in self._windows.values():
+            live = window.first != NO_ROW
+            days, positions = window.first[live] >> 32, window.first[live] & 0xFFFFFFFF
+            window.first[live] = (days << 32) + new_positions[positions]
+
+    def _cells(self, rollup, start: int, end: int):
+        """Combinations, counts, quantities and order keys of the rollup cells dated within [start, end]"""
+        known = len(self._cell_combo)
+        if known < len(rollup):
+            new = np.arange(known, len(rollup))
+            self._cell_combo.extend(self._combo_ids(
+                np.stack([rollup.column(field)[new] for field in CELL_FIELDS], axis=1)))
+        cells = rollup.cells(start, end)
+        keys = (rollup.column("day")[cells].astype(np.int64) << 32) + rollup.column("first")[cells]
+        return (self._cell_combo.view()[cells], rollup.column("count")[cells],
+                rollup.column("quantity")[cells], keys)
+
+    def _roll(self, window: _Window, rollup, today: int):
+        """Move a window to end on `today`"""
+        start, end = today - window.days, today
+        if window.start is None or start > window.end or start < window.start:
+            # First use, a jump past the whole window, or the clock went back: build afresh
+            window.grow(len(self._combos))
+            window.count[:], window.quantity[:], window.first[:] = 0, 0.0, NO_ROW
+            window.start, window.end = start, end
+            window.add(*self._cells(rollup, start, end))
+            window.stale_first = False
+            return
+        if start > window.start:
+            window.subtract(*self._cells(rollup, window.start, start - 1))
+        if end > window.end:
+            window.add(*self._cells(rollup, window.end + 1, end))
+        window.start, window.end = start, end
+        if window.stale_first:
+            combos, _, _, keys = self._cells(rollup, start, end)
+            window.first[:] = NO_ROW
+            np.minimum.at(window.first, combos, keys)
+            window.stale_first = False
+
+    def metrics(self, table, time_filter: str, registry: EntityRegistry, today: int,
+                top_n: int) -> Dict[str, Any]:
+        """Metrics of the `time_filter` window ending on day ordinal `today`"""
+        window = self._windows[time_filter]
+        self._roll(window, table.rollup, today)
+        live = np.flatnonzero(window.count > 0)
+        codes = {field: self.codes[field].view()[live] for field in CELL_FIELDS}
+        return _columnar_metrics(table.dictionaries, registry, codes, window.count[live],
+                                 window.quantity[live], window.first[live], top_n)
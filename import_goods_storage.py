@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Storage engines for the Import Goods Dashboard
+Persists molecules, companies, distributors and imports as a single JSON
+document (optionally with an append-only journal) or in a SQLite database with
+one row per record.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# Entity collections held by every storage engine, in load order
+ENTITY_TYPES = ["molecules", "companies", "distributors", "imports"]
+
+# Column layout of each collection (first column is the primary key)
+TABLE_COLUMNS = {
+    "molecules": ["id", "name", "description"],
+    "companies": ["id", "name", "location"],
+    "distributors": ["id", "name", "location"],
+    "imports": ["id", "date", "molecule_id", "company_id", "distributor_id", "country",
+                "shipment_mode", "quantity", "unit", "unit_price", "currency", "hs_code"]
+}
+
+# Key of the ingest checkpoints in the data document: source file digest -> resume state
+CHECKPOINTS = "ingest_checkpoints"
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Journal size that triggers folding the journal into a new snapshot
+JOURNAL_COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS molecules (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS companies (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT
+);
+CREATE TABLE IF NOT EXISTS distributors (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT
+);
+CREATE TABLE IF NOT EXISTS imports (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    molecule_id TEXT NOT NULL,
+    company_id TEXT NOT NULL,
+    distributor_id TEXT NOT NULL,
+    country TEXT NOT NULL,
+    shipment_mode TEXT,
+    quantity REAL NOT NULL,
+    unit TEXT NOT NULL,
+    unit_price REAL NOT NULL,
+    currency TEXT NOT NULL,
+    hs_code TEXT
+);
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_molecules_name ON molecules (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_companies_name ON companies (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_distributors_name ON distributors (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_imports_date ON imports (date);
+CREATE INDEX IF NOT EXISTS idx_imports_molecule ON imports (molecule_id);
+CREATE INDEX IF NOT EXISTS idx_imports_company ON imports (company_id);
+CREATE INDEX IF NOT EXISTS idx_imports_distributor ON imports (distributor_id);
+CREATE INDEX IF NOT EXISTS idx_imports_country ON imports (country);
+"""
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize collections that are not plain lists (e.g. the columnar import table)"""
+    if hasattr(value, "to_records"):
+        return value.to_records()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def empty_data() -> Dict[str, Any]:
+    """Return an empty data structure"""
+    data = {entity_type: [] for entity_type in ENTITY_TYPES}
+    data[CHECKPOINTS] = {}
+    return data
+
+
+def apply_checkpoints(stored: Dict[str, Any], checkpoints: Optional[Dict[str, Optional[Dict[str, Any]]]]):
+    """Set each checkpoint, or drop it where the new state is None"""
+    for source, state in (checkpoints or {}).items():
+        if state is None:
+            stored.pop(source, None)
+        else:
+            stored[source] = state
+
+
+class JsonStorage:
+    """Whole-document JSON storage; every write rewrites the file atomically"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the stored document, or None if nothing has been saved yet"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        """Save the full document to the JSON file atomically"""
+        try:
+            # Write to temporary file first
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False, default=_json_default)
+
+            # Atomic move
+            os.replace(temp_file, self.path)
+
+            logger.info(f"Data saved to {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
+            return False
+
+    def apply(self, data: Dict[str, Any], inserts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+              deletes: Optional[Dict[str, List[str]]] = None,
+              checkpoints: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> bool:
+        """Persist a mutation (and checkpoints) that has already been applied to `data`"""
+        return self.save(data)
+
+    def close(self):
+        """Release any resources held by the engine"""
+
+
+class JournaledJsonStorage(JsonStorage):
+    """JSON snapshot plus an append-only journal of mutations
+
+    Every mutation is appended to `<path>.journal` as one JSON line and fsynced,
+    so a write costs O(record). Once the journal passes `compact_threshold` bytes
+    it is sealed as `<path>.journal.1` and a background thread folds it into a
+    fresh snapshot. Loading replays snapshot, sealed segment and live journal;
+    replay skips records whose id already exists, so it is idempotent.
+    """
+
+    def __init__(self, path: str, compact_threshold: int = JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(path)
+        self.journal_path = f"{path}.journal"
+        self.sealed_path = f"{path}.journal.1"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the snapshot with the sealed and live journals replayed on top"""
+        snapshot = super().load()
+        journals = [p for p in (self.sealed_path, self.journal_path) if os.path.exists(p)]
+        if snapshot is None and not journals:
+            return None
+
+        data = snapshot if snapshot is not None else empty_data()
+        # Replay into id-keyed maps (insertion ordered) so each entry is O(record)
+        records = {}
+        for entity_type in ENTITY_TYPES:
+            records[entity_type] = {
+                record.get("id", ("missing-id", index)): record
+                for index, record in enumerate(data.get(entity_type, []))
+            }
+        data.setdefault(CHECKPOINTS, {})
+        for journal in journals:
+            self._replay(records, data[CHECKPOINTS], journal)
+
+        for entity_type in ENTITY_TYPES:
+            data[entity_type] = list(records[entity_type].values())
+        return data
+
+    def _replay(self, records: Dict[str, Dict[Any, Dict[str, Any]]], checkpoints: Dict[str, Any], journal: str):
+        """Apply every complete entry of a journal file to the id-keyed records and the checkpoints"""
+        with open(journal, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line means the process died mid-append
+                    logger.warning(f"Skipping unreadable journal entry {journal}:{line_number}")
+                    continue
+
+                for entity_type, inserted in entry.get("inserts", {}).items():
+                    for record in inserted:
+                        records[entity_type].setdefault(record.get("id"), record)
+                for entity_type, ids in entry.get("deletes", {}).items():
+                    for record_id in ids:
+                        records[entity_type].pop(record_id, None)
+                apply_checkpoints(checkpoints, entry.get("checkpoints"))
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        """Write a full snapshot and discard the journal it supersedes"""
+        self.wait_for_compaction()
+        with self._lock:
+            if not super().save(data):
+                return False
+            for journal in (self.sealed_path, self.journal_path):
+                if os.path.exists(journal):
+                    os.remove(journal)
+            return True
+
+    def apply(self, data: Dict[str, Any], inserts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+              deletes: Optional[Dict[str, List[str]]] = None,
+              checkpoints: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> bool:
+        """Append one journal line describing the mutation; a torn line is dropped whole on replay"""
+        entry = {}
+        if inserts:
+            entry["inserts"] = inserts
+        if deletes:
+            entry["deletes"] = deletes
+        if checkpoints:
+            entry["checkpoints"] = checkpoints
+        if not entry:
+            return True
+
+        try:
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            with self._lock:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                journal_size = os.path.getsize(self.journal_path)
+                if journal_size >= self.compact_threshold and not os.path.exists(self.sealed_path):
+                    self._start_compaction(data)
+            return True
+        except Exception as e:
+            logger.error(f"Error appending to journal: {e}")
+            return False
+
+    def _start_compaction(self, data: Dict[str, Any]):
+        """Seal the live journal and fold it into a snapshot in the background"""
+        # Shallow copies pin the record lists as of the sealed journal's last entry
+        snapshot = {entity_type: data.get(entity_type, []).copy() for entity_type in ENTITY_TYPES}
+        snapshot[CHECKPOINTS] = dict(data.get(CHECKPOINTS, {}))
+        os.replace(self.journal_path, self.sealed_path)
+
+        self._compaction = threading.Thread(target=self._compact, args=(snapshot,),
+                                            name="journal-compaction", daemon=True)
+        self._compaction.start()
+
+    def _compact(self, snapshot: Dict[str, Any]):
+        """Write the snapshot, then drop the sealed journal it now contains"""
+        if JsonStorage.save(self, snapshot):
+            with self._lock:
+                os.remove(self.sealed_path)
+            logger.info(f"Compacted journal into {self.path}")
+
+    def wait_for_compaction(self):
+        """Block until a running compaction has finished"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def close(self):
+        """Let a running compaction finish"""
+        self.wait_for_compaction()
+
+
+class SQLiteStorage:
+    """SQLite storage with one row per record; each mutation is a single transaction"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._conn.commit()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Read every table into the in-memory data structure"""
+        data = empty_data()
+        with self._lock:
+            for entity_type in ENTITY_TYPES:
+                columns = TABLE_COLUMNS[entity_type]
+                cursor = self._conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {entity_type} ORDER BY rowid")
+                data[entity_type] = [dict(zip(columns, row)) for row in cursor]
+            data[CHECKPOINTS] = {source: json.loads(state) for source, state in
+                                 self._conn.execute("SELECT source, state FROM ingest_checkpoints")}
+        return data
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        """Replace the contents of every table with `data` in one transaction"""
+        try:
+            with self._lock, self._conn:
+                for entity_type in ENTITY_TYPES:
+                    self._conn.execute(f"DELETE FROM {entity_type}")
+                    self._insert_rows(entity_type, data.get(entity_type, []))
+                self._conn.execute("DELETE FROM ingest_checkpoints")
+                self._write_checkpoints(data.get(CHECKPOINTS, {}))
+            logger.info(f"Data saved to {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
+            return False
+
+    def apply(self, data: Dict[str, Any], inserts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+              deletes: Optional[Dict[str, List[str]]] = None,
+              checkpoints: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> bool:
+        """Write only the inserted and deleted rows and the checkpoints, in a single transaction"""
+        try:
+            with self._lock, self._conn:
+                for entity_type, records in (inserts or {}).items():
+                    self._insert_rows(entity_type, records)
+                for entity_type, ids in (deletes or {}).items():
+                    self._conn.executemany(f"DELETE FROM {entity_type} WHERE id = ?",
+                                           [(record_id,) for record_id in ids])
+                self._write_checkpoints(checkpoints or {})
+            return True
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
+            return False
+
+    def _insert_rows(self, entity_type: str, records: List[Dict[str, Any]]):
+        """Insert records into a table, ignoring keys that have no column"""
+        columns = TABLE_COLUMNS[entity_type]
+        placeholders = ", ".join("?" for _ in columns)
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {entity_type} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(record.get(column) for column in columns) for record in records]
+        )
+
+    def _write_checkpoints(self, checkpoints: Dict[str, Optional[Dict[str, Any]]]):
+        """Upsert checkpoints, deleting those whose state is None"""
+        self._conn.executemany("DELETE FROM ingest_checkpoints WHERE source = ?",
+                               [(source,) for source, state in checkpoints.items() if state is None])
+        self._conn.executemany("INSERT OR REPLACE INTO ingest_checkpoints (source, state) VALUES (?, ?)",
+                               [(source, json.dumps(state)) for source, state in checkpoints.items()
+                                if state is not None])
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def open_storage(path: str, engine: Optional[str] = None):
+    """Create a storage engine by name, or pick one from the data file extension"""
+    if engine is None:
+        engine = "sqlite" if path.lower().endswith(SQLITE_EXTENSIONS) else "json"
+
+    if engine == "sqlite":
+        return SQLiteStorage(path)
+    if engine == "journal":
+        return JournaledJsonStorage(path)
+    if engine == "json":
+        return JsonStorage(path)
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> Dict[str, int]:
+    """Copy an existing JSON data file into a SQLite database, return row counts"""
+    data = JsonStorage(json_path).load()
+    if data is None:
+        raise FileNotFoundError(f"JSON data file not found: {json_path}")
+
+    storage = SQLiteStorage(db_path)
+    try:
+        if not storage.save(data):
+            raise RuntimeError(f"Failed to write {db_path}")
+    finally:
+        storage.close()
+
+    counts = {entity_type: len(data.get(entity_type, [])) for entity_type in ENTITY_TYPES}
+    logger.info(f"Migrated {json_path} to {db_path}: {counts}")
+    return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migrate Import Goods JSON data to SQLite")
+    parser.add_argument("json_path", nargs="?", default="import_goods_data.json")
+    parser.add_argument("db_path", nargs="?", default="import_goods_data.db")
+    args = parser.parse_args()
+
+    counts = migrate_json_to_sqlite(args.json_path, args.db_path)
+    for entity_type, count in counts.items():
+        print(f"{entity_type}: {count}")
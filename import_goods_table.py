@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+Columnar storage for import records
+Keeps imports in NumPy columns instead of one dict per row, with a read-only
+row-view API so existing code can keep treating records as mappings.
+"""
+
+import math
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+
+import numpy as np
+
+# Field order of an import record
+IMPORT_FIELDS = ["id", "date", "molecule_id", "company_id", "distributor_id", "country",
+                 "shipment_mode", "quantity", "unit", "unit_price", "currency", "hs_code"]
+
+# Fields stored as integer codes into a per-column dictionary of distinct values
+CODED_FIELDS = ["date", "molecule_id", "company_id", "distributor_id", "country",
+                "shipment_mode", "unit", "currency", "hs_code"]
+
+# Coded fields that reference entities; the table keeps a row count per value
+REFERENCE_FIELDS = ["molecule_id", "company_id", "distributor_id"]
+
+# Fields stored as float64 columns
+NUMERIC_FIELDS = ["quantity", "unit_price"]
+
+# Ordinal stored for dates that are not valid YYYY-MM-DD strings
+INVALID_DATE = 0
+
+
+def _to_float(value: Any) -> float:
+    """Convert a stored numeric value, keeping unparseable values as NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def parse_date_ordinal(value: Any) -> int:
+    """Return the proleptic ordinal of a YYYY-MM-DD string, or INVALID_DATE"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return INVALID_DATE
+
+
+class Column:
+    """Growable NumPy column; `view()` slices are zero-copy and stay valid after appends"""
+
+    __slots__ = ("_data", "_size")
+
+    def __init__(self, dtype, values: Optional[np.ndarray] = None):
+        self._data = np.array(values, dtype=dtype) if values is not None else np.empty(16, dtype=dtype)
+        self._size = len(values) if values is not None else 0
+
+    def _reserve(self, size: int):
+        """Make room for `size` values, at least doubling the capacity"""
+        if size > len(self._data):
+            grown = np.empty(max(16, size, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def append(self, value):
+        """Append one value"""
+        self._reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: np.ndarray):
+        """Append an array of values"""
+        self._reserve(self._size + len(values))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def __getitem__(self, position: int):
+        return self._data[position]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def view(self) -> np.ndarray:
+        """Return the filled part of the column without copying"""
+        return self._data[:self._size]
+
+    def insert(self, index: int, value):
+        """Insert one value before `index`"""
+        self._reserve(self._size + 1)
+        self._data[index + 1:self._size + 1] = self._data[index:self._size]
+        self._data[index] = value
+        self._size += 1
+
+    def widen(self, itemsize: int):
+        """Grow the item size of a fixed-width bytes column"""
+        if self._data.dtype.itemsize < itemsize:
+            self._data = self._data.astype(f"S{itemsize}")
+
+    def compress(self, keep: np.ndarray) -> "Column":
+        """Return a new column holding only the rows where `keep` is True"""
+        return Column(self._data.dtype, self.view()[keep])
+
+    def copy(self) -> "Column":
+        """Return an independent copy of the column"""
+        return Column(self._data.dtype, self.view())
+
+
+class IdIndex:
+    """Open-addressing hash index from record id to row position
+
+    Slots hold the Python hash of the id and the row position in two NumPy
+    arrays (12 bytes per slot, at most half full), so the index costs no
+    per-row Python objects. Hash matches are confirmed against the id column.
+    """
+
+    def __init__(self, id_at, capacity: int = 16):
+        self._id_at = id_at
+        self._hashes = np.zeros(capacity, dtype=np.int64)
+        self._positions = np.full(capacity, -1, dtype=np.int32)
+        self._used = 0
+
+    @classmethod
+    def build(cls, id_at, hashes: np.ndarray) -> "IdIndex":
+        """Build an index where row i has id hash hashes[i], with vectorized probing"""
+        capacity = 16
+        while capacity < 2 * len(hashes) + 2:
+            capacity *= 2
+        index = cls(id_at, capacity)
+        if len(hashes):
+            index._insert_many(np.array(hashes, dtype=np.int64), np.arange(len(hashes), dtype=np.int32))
+        return index
+
+    def copy(self, id_at) -> "IdIndex":
+        """Return an independent copy that confirms matches with `id_at`"""
+        index = IdIndex(id_at, len(self._hashes))
+        index._hashes[:] = self._hashes
+        index._positions[:] = self._positions
+        index._used = self._used
+        return index
+
+    def _insert_many(self, hashes: np.ndarray, positions: np.ndarray):
+        """Linear probing in rounds: each round claims one empty slot per contested bucket"""
+        mask = len(self._hashes) - 1
+        slots = hashes & mask
+        pending = np.arange(len(hashes))
+        while pending.size:
+            candidate = slots[pending]
+            free = self._positions[candidate] == -1
+            # Among pending entries aiming at the same free slot, the first one wins
+            _, first = np.unique(candidate[free], return_index=True)
+            winners = pending[free][first]
+            self._hashes[slots[winners]] = hashes[winners]
+            self._positions[slots[winners]] = positions[winners]
+            won = np.zeros(len(hashes), dtype=bool)
+            won[winners] = True
+            pending = pending[~won[pending]]
+            slots[pending] = (slots[pending] + 1) & mask
+        self._used += len(hashes)
+
+    def _find_slot(self, record_id: str, record_hash: int) -> int:
+        """Return the slot holding `record_id`, or the empty slot where it would go"""
+        mask = len(self._hashes) - 1
+        slot = record_hash & mask
+        while True:
+            position = self._positions[slot]
+            if position == -1 or (self._hashes[slot] == record_hash and self._id_at(position) == record_id):
+                return slot
+            slot = (slot + 1) & mask
+
+    def add(self, record_id: str, position: int, record_hash: int):
+        """Point `record_id` (whose hash is `record_hash`) at `position`"""
+        if 2 * (self._used + 1) > len(self._hashes):
+            occupied = self._positions != -1
+            hashes, positions = self._hashes[occupied], self._positions[occupied]
+            self._hashes = np.zeros(2 * len(self._hashes), dtype=np.int64)
+            self._positions = np.full(len(self._hashes), -1, dtype=np.int32)
+            self._used = 0
+            self._insert_many(hashes, positions)
+
+        slot = self._find_slot(record_id, record_hash)
+        if self._positions[slot] == -1:
+            self._used += 1
+        self._hashes[slot] = record_hash
+        self._positions[slot] = position
+
+    def get(self, record_id: str) -> Optional[int]:
+        """Return the row position of `record_id`, if indexed"""
+        slot = self._find_slot(record_id, hash(record_id))
+        position = self._positions[slot]
+        return int(position) if position != -1 else None
+
+
+class DateIndex:
+    """Row positions ordered by date ordinal, ties kept in insertion order
+
+    A date window is two binary searches plus a slice, so range queries cost
+    O(log n + window) no matter how much history is stored.
+    """
+
+    def __init__(self):
+        self._ordinals = Column(np.int32)
+        self._positions = Column(np.int32)
+
+    @classmethod
+    def build(cls, ordinals: np.ndarray) -> "DateIndex":
+        """Index rows whose date ordinals are `ordinals` (row i at ordinals[i])"""
+        index = cls()
+        order = np.argsort(ordinals, kind="stable")
+        index._ordinals = Column(np.int32, ordinals[order])
+        index._positions = Column(np.int32, order)
+        return index
+
+    def add(self, position: int, ordinal: int):
+        """Insert one row, keeping the index sorted"""
+        at = int(np.searchsorted(self._ordinals.view(), ordinal, side="right"))
+        self._ordinals.insert(at, ordinal)
+        self._positions.insert(at, position)
+
+    def add_many(self, positions: np.ndarray, ordinals: np.ndarray):
+        """Insert a batch of rows appended after every indexed row"""
+        if not len(positions):
+            return
+        current = self._ordinals.view()
+        if (not len(current) or ordinals[0] >= current[-1]) and np.all(ordinals[1:] >= ordinals[:-1]):
+            # In-order batch: append without re-sorting
+            self._ordinals.extend(ordinals)
+            self._positions.extend(positions)
+            return
+        # Stable merge; new rows sort after existing rows of the same date
+        merged_ordinals = np.concatenate([current, ordinals])
+        merged_positions = np.concatenate([self._positions.view(), positions])
+        order = np.argsort(merged_ordinals, kind="stable")
+        self._ordinals = Column(np.int32, merged_ordinals[order])
+        self._positions = Column(np.int32, merged_positions[order])
+
+    def remap(self, keep: np.ndarray):
+        """Drop rows where `keep` is False and renumber the survivors"""
+        new_positions = np.cumsum(keep, dtype=np.int64) - 1
+        positions = self._positions.view()
+        kept = keep[positions]
+        self._ordinals = Column(np.int32, self._ordinals.view()[kept])
+        self._positions = Column(np.int32, new_positions[positions[kept]])
+
+    def range(self, start: int, end: int) -> np.ndarray:
+        """Return positions of rows dated within [start, end], in date order"""
+        ordinals = self._ordinals.view()
+        low = np.searchsorted(ordinals, start, side="left")
+        high = np.searchsorted(ordinals, end, side="right")
+        return self._positions.view()[low:high]
+
+    def positions(self) -> np.ndarray:
+        """Return every row position in date order"""
+        return self._positions.view()
+
+    def copy(self) -> "DateIndex":
+        """Return an independent copy"""
+        index = DateIndex()
+        index._ordinals = self._ordinals.copy()
+        index._positions = self._positions.copy()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+
+class ValueDictionary:
+    """Append-only mapping between distinct column values and integer codes"""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+
+    def encode(self, value: Any) -> int:
+        """Return the code for a value, assigning a new one if needed"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ImportRow(Mapping):
+    """Read-only view of one row of an ImportTable"""
+
+    __slots__ = ("_table", "_position")
+
+    def __init__(self, table: "ImportTable", position: int):
+        self._table = table
+        self._position = position
+
+    @property
+    def position(self) -> int:
+        """Physical row position in the table"""
+        return self._position
+
+    def __getitem__(self, field: str) -> Any:
+        return self._table.value(self._position, field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(IMPORT_FIELDS)
+
+    def __len__(self) -> int:
+        return len(IMPORT_FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize the row as a plain dict"""
+        return self._table.record(self._position)
+
+    def __repr__(self) -> str:
+        return f"ImportRow({self.to_dict()!r})"
+
+
+class ImportSelection:
+    """Subset of an ImportTable's rows, identified by position
+
+    Selections made by date_range() and where() also remember the query that
+    produced them (`window` and `filters`), so it can be re-run on a rollup.
+    """
+
+    def __init__(self, table: "ImportTable", positions: np.ndarray,
+                 window: Optional[Tuple[int, int]] = None,
+                 filters: Optional[Dict[str, np.ndarray]] = None):
+        self.table = table
+        self.positions = positions
+        self.window = window
+        self.filters = filters or {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __iter__(self) -> Iterator[ImportRow]:
+        table = self.table
+        for position in self.positions.tolist():
+            yield ImportRow(table, position)
+
+    def __getitem__(self, index: int) -> ImportRow:
+        return ImportRow(self.table, int(self.positions[index]))
+
+    def column(self, field: str) -> np.ndarray:
+        """Return the selected values of a numeric, ordinal or code column"""
+        return self.table.column(field)[self.positions]
+
+    def where(self, field: str, codes: Iterable[int]) -> "ImportSelection":
+        """Keep only rows whose code in a coded column is one of `codes`"""
+        codes = np.fromiter(codes, dtype=np.int32)
+        if field in self.filters:
+            codes = np.intersect1d(self.filters[field], codes)
+        mask = np.isin(self.column(field), codes)
+        return ImportSelection(self.table, self.positions[mask], self.window, {**self.filters, field: codes})
+
+
+class ImportTable:
+    """Column-oriented table of import records
+
+    Numeric fields and the parsed date ordinal live in float64/int32 columns;
+    every other field is an int32 code into a ValueDictionary. Columns can be
+    read as zero-copy NumPy arrays through `column()` for vectorized scans.
+
+    Deleted rows are tombstoned: they stay in the columns, flagged dead in the
+    `alive` column, until `compact()` removes them. Readers skip dead rows.
+    """
+
+    def __init__(self, records: Iterable[Mapping] = ()):
+        # Ids are UTF-8 bytes in a fixed-width column, widened as longer ids arrive;
+        # their hashes are kept so the id index can be rebuilt without rehashing
+        self._ids = Column("S1")
+        self._id_hashes = Column(np.int64)
+        self._positions = IdIndex(self._id_at)
+        self.date_ordinal = Column(np.int32)
+        self.alive = Column(np.bool_)
+        self._tombstones = 0
+        self.numeric = {field: Column(np.float64) for field in NUMERIC_FIELDS}
+        self.codes = {field: Column(np.int32) for field in CODED_FIELDS}
+        self.dictionaries = {field: ValueDictionary() for field in CODED_FIELDS}
+        # Parsed ordinal per date code, so each distinct date is parsed once
+        self._date_ordinals: List[int] = []
+        self.dates = DateIndex()
+        # Rows per code of each reference field, so entity usage is a single lookup
+        self._ref_counts = {field: np.zeros(0, dtype=np.int64) for field in REFERENCE_FIELDS}
+        # Optional DailyRollup, and other listeners with add/remove/renumber
+        # methods, kept in step with every write
+        self.rollup = None
+        self.listeners: List[Any] = []
+        self.extend(records)
+
+    # Writes
+
+    def append(self, record: Mapping) -> int:
+        """Append a record and return its row position"""
+        position = len(self._ids)
+        record_id = record.get("id")
+        encoded_id = self._encode_id(record_id)
+        self._ids.widen(len(encoded_id))
+        self._ids.append(encoded_id)
+        decoded_id = self._id_at(position)
+        self._id_hashes.append(hash(decoded_id))
+        self._positions.add(decoded_id, position, self._id_hashes[position])
+        self.alive.append(True)
+
+        for field in CODED_FIELDS:
+            dictionary = self.dictionaries[field]
+            code = dictionary.encode(record.get(field))
+            if field == "date" and code == len(self._date_ordinals):
+                self._date_ordinals.append(parse_date_ordinal(record.get(field)))
+            self.codes[field].append(code)
+        self.date_ordinal.append(self._date_ordinals[self.codes["date"][position]])
+        self.dates.add(position, self.date_ordinal[position])
+
+        for field in NUMERIC_FIELDS:
+            self.numeric[field].append(_to_float(record.get(field)))
+        self._count_references(np.array([position]), 1)
+        for listener in self._listeners():
+            listener.add(self, np.array([position]))
+        return position
+
+    def extend(self, records: Iterable[Mapping]):
+        """Append several records, building each column in one pass"""
+        records = list(records)
+        if not records:
+            return
+        count = len(records)
+
+        ids = ["" if r.get("id") is None else str(r.get("id")) for r in records]
+        encoded_ids = [record_id.encode("utf-8") for record_id in ids]
+        self._ids.widen(max(map(len, encoded_ids)))
+        self._ids.extend(np.array(encoded_ids, dtype=self._ids.view().dtype))
+        self._id_hashes.extend(np.fromiter(map(hash, ids), dtype=np.int64, count=count))
+        self.alive.extend(np.ones(count, dtype=np.bool_))
+
+        for field in CODED_FIELDS:
+            encode = self.dictionaries[field].encode
+            self.codes[field].extend(
+                np.fromiter((encode(r.get(field)) for r in records), dtype=np.int32, count=count))
+        dates = self.dictionaries["date"].values
+        for code in range(len(self._date_ordinals), len(dates)):
+            self._date_ordinals.append(parse_date_ordinal(dates[code]))
+        date_codes = self.codes["date"].view()[-count:]
+        self.date_ordinal.extend(np.array(self._date_ordinals, dtype=np.int32)[date_codes])
+        start = len(self.date_ordinal) - count
+        self.dates.add_many(np.arange(start, start + count, dtype=np.int32), self.date_ordinal.view()[start:])
+
+        for field in NUMERIC_FIELDS:
+            self.numeric[field].extend(
+                np.fromiter((_to_float(r.get(field)) for r in records), dtype=np.float64, count=count))
+
+        self._positions = IdIndex.build(self._id_at, self._id_hashes.view())
+        self._count_references(np.arange(start, start + count), 1)
+        for listener in self._listeners():
+            listener.add(self, np.arange(start, start + count))
+
+    @staticmethod
+    def _encode_id(record_id: Any) -> bytes:
+        """Encode an id for the bytes column (missing ids become empty)"""
+        return str(record_id).encode("utf-8") if record_id is not None else b""
+
+    def _id_at(self, position: int) -> str:
+        """Decode the id stored at a row position"""
+        return self._ids[position].decode("utf-8")
+
+    def tombstone(self, import_ids: Iterable[str]) -> int:
+        """Mark rows dead by id and return how many were marked; O(len(import_ids))"""
+        alive = self.alive.view()
+        positions = {self._positions.get(str(i)) for i in set(import_ids)} - {None}
+        positions = np.fromiter((p for p in positions if alive[p]), dtype=np.int64)
+        if not len(positions):
+            return 0
+
+        alive[positions] = False
+        self._tombstones += len(positions)
+        self._count_references(positions, -1)
+        for listener in self._listeners():
+            listener.remove(self, positions)
+        return len(positions)
+
+    def delete(self, import_ids: Iterable[str]) -> int:
+        """Remove rows by id right away and return how many were removed"""
+        deleted = self.tombstone(import_ids)
+        if deleted:
+            self.compact()
+        return deleted
+
+    @property
+    def tombstones(self) -> int:
+        """Number of dead rows still held in the columns"""
+        return self._tombstones
+
+    def compact(self) -> int:
+        """Physically remove tombstoned rows and return how many were removed"""
+        removed = self._tombstones
+        if not removed:
+            return 0
+
+        keep = self.alive.view().copy()
+        self.alive = self.alive.compress(keep)
+        self._tombstones = 0
+        for listener in self._listeners():
+            listener.renumber(keep)
+        self._ids = self._ids.compress(keep)
+        self._id_hashes = self._id_hashes.compress(keep)
+        self._positions = IdIndex.build(self._id_at, self._id_hashes.view())
+        self.date_ordinal = self.date_ordinal.compress(keep)
+        self.dates.remap(keep)
+        for field in NUMERIC_FIELDS:
+            self.numeric[field] = self.numeric[field].compress(keep)
+        for field in CODED_FIELDS:
+            self.codes[field] = self.codes[field].compress(keep)
+        return removed
+
+    def _listeners(self) -> List[Any]:
+        """The rollup, if attached, followed by the other listeners"""
+        return ([self.rollup] if self.rollup is not None else []) + self.listeners
+
+    def _count_references(self, positions: np.ndarray, sign: int):
+        """Add (sign=1) or subtract (sign=-1) the reference counts of the given rows"""
+        for field in REFERENCE_FIELDS:
+            size = len(self.dictionaries[field])
+            counts = self._ref_counts[field]
+            if len(counts) < size:
+                counts = self._ref_counts[field] = np.concatenate(
+                    [counts, np.zeros(size - len(counts), dtype=np.int64)])
+            codes = self.codes[field].view()[positions]
+            counts[:size] += sign * np.bincount(codes, minlength=size)
+
+    # Reads
+
+    def reference_count(self, field: str, value: Any) -> int:
+        """Number of rows whose reference `field` equals `value`"""
+        code = self.dictionaries[field].codes.get(value)
+        if code is None or code >= len(self._ref_counts[field]):
+            return 0
+        return int(self._ref_counts[field][code])
+
+    def reference_counts(self, field: str) -> np.ndarray:
+        """Rows per code of a reference field, indexed by code"""
+        return self._ref_counts[field]
+
+    def __len__(self) -> int:
+        return len(self._ids) - self._tombstones
+
+    def live_positions(self) -> np.ndarray:
+        """Positions of rows that are not tombstoned, in insertion order"""
+        if not self._tombstones:
+            return np.arange(len(self._ids))
+        return np.flatnonzero(self.alive.view())
+
+    def _skip_dead(self, positions: np.ndarray) -> np.ndarray:
+        """Drop tombstoned rows from an array of positions"""
+        if not self._tombstones:
+            return positions
+        return positions[self.alive.view()[positions]]
+
+    def __iter__(self) -> Iterator[ImportRow]:
+        for position in self.live_positions().tolist():
+            yield ImportRow(self, position)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ImportRow(self, position) for position in self.live_positions()[index].tolist()]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("import row index out of range")
+        if self._tombstones:
+            index = int(self.live_positions()[index])
+        return ImportRow(self, index)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (ImportTable, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(dict(a) == dict(b) for a, b in zip(self, other))
+
+    def date_range(self, start: int, end: int) -> ImportSelection:
+        """Return the rows dated within [start, end] (date ordinals), in date order"""
+        return ImportSelection(self, self._skip_dead(self.dates.range(start, end)), (start, end))
+
+    def by_date(self) -> ImportSelection:
+        """Return every row in date order"""
+        return ImportSelection(self, self._skip_dead(self.dates.positions()))
+
+    def get(self, import_id: str) -> Optional[ImportRow]:
+        """Return the row with the given id, if any"""
+        position = self._positions.get(import_id)
+        if position is None or not self.alive[position]:
+            return None
+        return ImportRow(self, position)
+
+    def value(self, position: int, field: str) -> Any:
+        """Return one field of one row"""
+        if field == "id":
+            return self._id_at(position)
+        if field in self.numeric:
+            return float(self.numeric[field][position])
+        if field in self.codes:
+            return self.dictionaries[field].values[self.codes[field][position]]
+        raise KeyError(field)
+
+    def record(self, position: int) -> Dict[str, Any]:
+        """Return one row as a plain dict"""
+        return {field: self.value(position, field) for field in IMPORT_FIELDS}
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Return all rows as plain dicts (used for serialization)"""
+        return [self.record(position) for position in self.live_positions().tolist()]
+
+    def column(self, field: str) -> np.ndarray:
+        """Return a zero-copy NumPy view of a numeric, ordinal or code column,
+        indexed by row position (tombstoned rows included)"""
+        if field == "date_ordinal":
+            return self.date_ordinal.view()
+        if field in self.numeric:
+            return self.numeric[field].view()
+        if field in self.codes:
+            return self.codes[field].view()
+        raise KeyError(field)
+
+    def compacted(self) -> "ImportTable":
+        """Return a copy without tombstoned rows that takes over the rollup and listeners"""
+        table = self.copy()
+        table.rollup = self.rollup
+        table.listeners = list(self.listeners)
+        table.compact()
+        return table
+
+    def copy(self) -> "ImportTable":
+        """Return an independent copy without rollup or listeners; value dictionaries are append-only and shared"""
+        table = ImportTable.__new__(ImportTable)
+        table._ids = self._ids.copy()
+        table._id_hashes = self._id_hashes.copy()
+        table._positions = self._positions.copy(table._id_at)
+        table.date_ordinal = self.date_ordinal.copy()
+        table.alive = self.alive.copy()
+        table._tombstones = self._tombstones
+        table.numeric = {field: column.copy() for field, column in self.numeric.items()}
+        table.codes = {field: column.copy() for field, column in self.codes.items()}
+        table.dictionaries = self.dictionaries
+        table._date_ordinals = self._date_ordinals
+        table.dates = self.dates.copy()
+        table._ref_counts = {field: counts.copy() for field, counts in self._ref_counts.items()}
+        table.rollup = None
+        table.listeners = []
+        return table
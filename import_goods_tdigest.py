@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Streaming unit-price quantiles for the Import Goods Dashboard
+Mergeable t-digests of unit prices per molecule x currency, bucketed by
+month. A date window merges the digests of the months it fully covers and
+adds the raw rows of the partial months at its edges.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple, Iterable
+
+import numpy as np
+
+from import_goods_table import INVALID_DATE
+
+# Compression (delta) of every digest: at most about delta centroids, with
+# rank error roughly proportional to q(1 - q) / delta
+TDIGEST_COMPRESSION = 100
+
+
+class TDigest:
+    """Merging t-digest (Dunning) with the arcsine scale function, built with NumPy"""
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add_many(self, values: np.ndarray, weights: Optional[np.ndarray] = None):
+        """Add values (with optional weights) and recompress"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, weights]))
+
+    def merge(self, other: "TDigest"):
+        """Fold another digest into this one"""
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    @classmethod
+    def merged(cls, digests: Iterable["TDigest"], compression: int = TDIGEST_COMPRESSION) -> "TDigest":
+        """A new digest holding every centroid of `digests`"""
+        result = cls(compression)
+        digests = [d for d in digests if len(d.means)]
+        if digests:
+            result.min = min(d.min for d in digests)
+            result.max = max(d.max for d in digests)
+            result._compress(np.concatenate([d.means for d in digests]),
+                             np.concatenate([d.weights for d in digests]))
+        return result
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """Cluster sorted centroids so each cluster spans at most one unit of the scale function"""
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Scale k(q) = delta / (2 pi) * asin(2q - 1), taken at each centroid's midpoint rank
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        clusters = np.floor(k - k[0]).astype(np.int64)
+        _, clusters = np.unique(clusters, return_inverse=True)
+        clusters = clusters.reshape(-1)
+        self.weights = np.bincount(clusters, weights=weights)
+        self.means = np.bincount(clusters, weights=weights * means) / self.weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), or None for an empty digest"""
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # Centroid midpoints, pinned to the exact extremes at both ends
+        ranks = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, ranks, values))
+
+
+def month_index(ordinals: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 for proleptic Gregorian day ordinals"""
+    days = np.datetime64("0001-01-01", "D") + (np.asarray(ordinals, dtype=np.int64) - 1)
+    return days.astype("datetime64[M]").astype(np.int64)
+
+
+def month_bounds(month: int) -> Tuple[int, int]:
+    """First and last day ordinal of a month given as months since 1970-01"""
+    year, month0 = divmod(month, 12)
+    first = date(1970 + year, month0 + 1, 1).toordinal()
+    following = date(1970 + year + (month0 + 1) // 12, (month0 + 1) % 12 + 1, 1).toordinal()
+    return first, following - 1
+
+
+class MonthlyPriceDigests:
+    """Unit-price t-digests per month x molecule x currency of an ImportTable
+
+    Attach to the table's listeners. Digests cannot forget values, so a month
+    that loses rows is marked stale and rebuilt from its live rows the next
+    time a window covering it is queried.
+    """
+
+    def __init__(self, table=None, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        # Month -> (molecule code, currency code) -> digest
+        self._months: Dict[int, Dict[Tuple[int, int], TDigest]] = {}
+        self._stale: Set[int] = set()
+        if table is not None:
+            self.add(table, table.live_positions())
+
+    def _groups(self, table, positions: np.ndarray):
+        """Yield ((month, molecule code, currency code), positions) for dated rows"""
+        positions = np.asarray(positions, dtype=np.int64)
+        ordinals = table.column("date_ordinal")[positions]
+        positions = positions[ordinals != INVALID_DATE]
+        if not len(positions):
+            return
+        keys = np.stack([month_index(table.column("date_ordinal")[positions]),
+                         table.column("molecule_id")[positions],
+                         table.column("currency")[positions]], axis=1)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        for group, key in enumerate(unique.tolist()):
+            yield tuple(key), positions[order[bounds[group]:bounds[group + 1]]]
+
+    def add(self, table, positions: np.ndarray):
+        """Add the unit prices of rows just added to `table`"""
+        prices = table.column("unit_price")
+        for (month, molecule, currency), rows in self._groups(table, positions):
+            digests = self._months.setdefault(month, {})
+            digest = digests.get((molecule, currency))
+            if digest is None:
+                digest = digests[(molecule, currency)] = TDigest(self.compression)
+            digest.add_many(prices[rows])
+
+    def remove(self, table, positions: np.ndarray):
+        """Mark the months of rows just tombstoned for a rebuild"""
+        ordinals = table.column("date_ordinal")[positions]
+        self._stale.update(month_index(ordinals[ordinals != INVALID_DATE]).tolist())
+
+    def renumber(self, keep: np.ndarray):
+        """Digests hold prices, not positions"""
+
+    def _rebuild(self, table, month: int):
+        """Re-digest a month from its live rows"""
+        self._months.pop(month, None)
+        self._stale.discard(month)
+        self.add(table, table.date_range(*month_bounds(month)).positions)
+
+    def window(self, table, start: int, end: int, molecule_codes: Optional[Set[int]] = None,
+               currency_codes: Optional[Set[int]] = None) -> Dict[Tuple[int, int], TDigest]:
+        """Merged digest per (molecule code, currency code) for rows dated within [start, end]"""
+        def wanted(molecule: int, currency: int) -> bool:
+            return ((molecule_codes is None or molecule in molecule_codes) and
+                    (currency_codes is None or currency in currency_codes))
+
+        parts: Dict[Tuple[int, int], List[TDigest]] = {}
+        first_month, last_month = month_index([start, end]).tolist()
+        for month in range(first_month, last_month + 1):
+            month_start, month_end = month_bounds(month)
+            if month_start < start or month_end > end:
+                continue
+            if month in self._stale:
+                self._rebuild(table, month)
+            for key, digest in self._months.get(month, {}).items():
+                if wanted(*key):
+                    parts.setdefault(key, []).append(digest)
+
+        # Partial months at the edges come from raw rows
+        prices = table.column("unit_price")
+        edges = []
+        for month in sorted({first_month, last_month}):
+            month_start, month_end = month_bounds(month)
+            if month_start < start or month_end > end:
+                edges.append(table.date_range(max(start, month_start), min(end, month_end)).positions)
+        if edges:
+            for (_, molecule, currency), rows in self._groups(table, np.concatenate(edges)):
+                if wanted(molecule, currency):
+                    edge = TDigest(self.compression)
+                    edge.add_many(prices[rows])
+                    parts.setdefault((molecule, currency), []).append(edge)
+
+        merged = {key: TDigest.merged(digests, self.compression) for key, digests in parts.items()}
+        # Groups whose prices were all missing have nothing to report
+        return {key: digest for key, digest in merged.items() if len(digest.means)}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Time series for the Import Goods Dashboard
+Buckets per-day values by day, week or month over a date window, filling
+empty buckets with zeros, and downsamples long series with
+Largest-Triangle-Three-Buckets (Steinarsson) so payload size is bounded by
+the requested point count rather than by the length of history.
+"""
+
+from datetime import date
+from typing import Tuple
+
+import numpy as np
+
+from import_goods_tdigest import month_index, month_bounds
+
+GRANULARITIES = ["day", "week", "month"]
+
+
+def bucket_starts(ordinals: np.ndarray, granularity: str) -> np.ndarray:
+    """Ordinal of the first day of the bucket each day ordinal falls in (weeks start on Monday)"""
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if granularity == "day":
+        return ordinals
+    if granularity == "week":
+        # Ordinal 1 (0001-01-01) is a Monday
+        return ordinals - (ordinals - 1) % 7
+    if granularity == "month":
+        months = month_index(ordinals)
+        first = np.datetime64("1970-01", "M") + months
+        return first.astype("datetime64[D]").astype(np.int64) + date(1970, 1, 1).toordinal()
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def bucket_series(ordinals: np.ndarray, weights: np.ndarray, start: int, end: int,
+                  granularity: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Every bucket start from `start` to `end` and the summed weights of the days in it"""
+    first, last = bucket_starts([start, end], granularity).tolist()
+    if granularity == "month":
+        months = range(month_index([first])[0], month_index([last])[0] + 1)
+        starts = np.array([month_bounds(month)[0] for month in months], dtype=np.int64)
+    else:
+        starts = np.arange(first, last + 1, 1 if granularity == "day" else 7, dtype=np.int64)
+    index = np.searchsorted(starts, bucket_starts(ordinals, granularity))
+    values = np.bincount(index, weights=np.asarray(weights, dtype=np.float64), minlength=len(starts))
+    return starts, values
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indexes of at most `threshold` points that keep the visual shape of the series
+
+    The first and last points are always kept; each of the threshold - 2
+    buckets in between contributes the point forming the largest triangle
+    with the previously kept point and the average of the next bucket.
+    """
+    if threshold < 3:
+        raise ValueError("LTTB needs at least 3 points")
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.zeros(threshold, dtype=np.int64)
+    previous = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        # Average of the following bucket (the last point for the final bucket)
+        next_low, next_high = high, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x, avg_y = x[next_low:next_high].mean(), y[next_low:next_high].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[low:high] - y[previous]) -
+                       (x[previous] - x[low:high]) * (avg_y - y[previous]))
+        previous = low + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    kept[-1] = n - 1
+    return kept
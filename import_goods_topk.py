@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Top-k selection for the Import Goods Dashboard
+Exact top-k with a bounded heap (or a partial partition of NumPy totals)
+instead of sorting every group, and a Space-Saving sketch for approximate
+top-k over the stream of every import recorded.
+"""
+
+import heapq
+from typing import Dict, List, Any, Callable, Hashable, Iterable, Tuple
+
+import numpy as np
+
+from import_goods_table import REFERENCE_FIELDS
+
+# Items tracked by each Space-Saving sketch
+SKETCH_CAPACITY = 1000
+
+
+def top_k_items(items: Iterable[Tuple[Hashable, Any]], k: int,
+                key: Callable[[Tuple[Hashable, Any]], Any]) -> List[Tuple[Hashable, Any]]:
+    """The k largest items by `key`, ties in input order
+
+    Same result as sorted(items, key=key, reverse=True)[:k], with a k-sized heap.
+    """
+    return heapq.nlargest(k, items, key=key)
+
+
+def top_k_indices(totals: np.ndarray, first: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k largest totals in rank order, ties broken by smallest `first`"""
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.arange(len(totals))
+    if len(totals) > k:
+        # Partition instead of sorting; keep every tie of the k-th total
+        threshold = np.partition(totals, len(totals) - k)[len(totals) - k]
+        candidates = np.flatnonzero(totals >= threshold)
+    order = np.lexsort((first[candidates], -totals[candidates]))[:k]
+    return candidates[order]
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch over a weighted stream (Metwally et al.)
+
+    Tracks at most `capacity` items. A reported count overestimates the true
+    count by at most the item's error, and every item whose true count
+    exceeds total / capacity is tracked.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        # Min-heap of (count, sequence, item); entries whose count is outdated are skipped
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _push(self, item: Hashable):
+        heapq.heappush(self._heap, (self._counts[item], self._sequence, item))
+        self._sequence += 1
+        if len(self._heap) > 4 * self.capacity + 16:
+            self._heap = [(count, i, key) for i, (key, count) in enumerate(self._counts.items())]
+            heapq.heapify(self._heap)
+            self._sequence = len(self._heap)
+
+    def _pop_min(self) -> Tuple[int, Hashable]:
+        """Remove and return the tracked item with the smallest count"""
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self._counts.get(item) == count:
+                del self._counts[item]
+                del self._errors[item]
+                return count, item
+
+    def add(self, item: Hashable, count: int = 1):
+        """Record `count` occurrences of `item`"""
+        self.total += count
+        if item in self._counts:
+            self._counts[item] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[item] = count
+            self._errors[item] = 0
+        else:
+            # Replace the smallest counter; its count bounds the newcomer's error
+            floor, _ = self._pop_min()
+            self._counts[item] = floor + count
+            self._errors[item] = floor
+        self._push(item)
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        """The k items with the highest estimated counts
+
+        `count` is an upper bound and `count - error` a lower bound on the true
+        count; `guaranteed` marks items certain to be in the true top k.
+        """
+        ranked = heapq.nlargest(k + 1, self._counts.items(), key=lambda x: x[1])
+        runner_up = ranked[k][1] if len(ranked) > k else 0
+        return [{
+            "item": item,
+            "count": count,
+            "error": self._errors[item],
+            "guaranteed": count - self._errors[item] >= runner_up
+        } for item, count in ranked[:k]]
+
+
+class HistoryTopK:
+    """Space-Saving sketches of molecule, company and distributor codes over every import recorded
+
+    Attach to an ImportTable's listeners. Deletes are not subtracted: the
+    sketches describe the history of imports, not the current table.
+    """
+
+    def __init__(self, table=None, capacity: int = SKETCH_CAPACITY):
+        self.sketches = {field: SpaceSaving(capacity) for field in REFERENCE_FIELDS}
+        if table is not None:
+            self.add(table, table.live_positions())
+
+    def add(self, table, positions: np.ndarray):
+        """Feed rows just added to `table`, one weighted update per distinct code"""
+        for field, sketch in self.sketches.items():
+            codes, counts = np.unique(table.column(field)[positions], return_counts=True)
+            for code, count in zip(codes.tolist(), counts.tolist()):
+                sketch.add(code, count)
+
+    def remove(self, table, positions: np.ndarray):
+        """History keeps deleted imports"""
+
+    def renumber(self, keep: np.ndarray):
+        """Codes do not change when the table is compacted"""
@@ -8,8 +8,21 @@ import unittest
 import json
 import tempfile
 import os
+import sys
+import importlib.util
 from datetime import datetime, timedelta
 from import_goods_app import ImportGoodsApp, Molecule, Company, Distributor, Import, ALLOWED_CURRENCIES
+from import_goods_table import ImportTable
+from import_goods_index import EntityRegistry, TrigramIndex
+from import_goods_metrics import python_metrics, vectorized_metrics, rollup_metrics, MetricsCache
+from import_goods_topk import SpaceSaving, top_k_indices
+from import_goods_hll import HyperLogLog, DailyDistinct, hash64
+from import_goods_tdigest import TDigest
+from import_goods_fingerprint import FingerprintIndex
+from import_goods_timeseries import bucket_series, lttb
+from import_goods_sliding import SlidingWindows, WINDOW_DAYS
+from import_goods_ingest import generate_ids, ExcelChunkReader
+from import_goods_storage import SQLiteStorage, JournaledJsonStorage, migrate_json_to_sqlite
 
 class TestImportGoodsApp(unittest.TestCase):
     
@@ -322,13 +335,1185 @@ class TestImportGoodsApp(unittest.TestCase):
         issues = self.app.validate_and_fix_data(invalid_data)
         self.assertGreater(len(issues), 0)
 
+class TestSQLiteStorage(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test environment with temporary JSON and SQLite files"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_file = os.path.join(self.temp_dir.name, 'data.json')
+        self.db_file = os.path.join(self.temp_dir.name, 'data.db')
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.temp_dir.cleanup()
+    
+    def _populate(self, app):
+        """Add one molecule, company, distributor and import"""
+        app.add_molecule("SQL Molecule", "Description")
+        app.add_company("SQL Company", "USA")
+        app.add_distributor("SQL Distributor", "UK")
+        success, _ = app.add_import({
+            'date': '2024-01-01',
+            'molecule_id': app.data['molecules'][0]['id'],
+            'company_id': app.data['companies'][0]['id'],
+            'distributor_id': app.data['distributors'][0]['id'],
+            'country': 'USA',
+            'quantity': 10.0,
+            'unit': 'KG',
+            'unit_price': 5.0,
+            'currency': 'USD'
+        })
+        self.assertTrue(success)
+    
+    def test_sqlite_round_trip(self):
+        """Test single-row writes are persisted in SQLite"""
+        app = ImportGoodsApp(self.db_file)
+        self.assertIsInstance(app.storage, SQLiteStorage)
+        self._populate(app)
+        
+        reloaded = ImportGoodsApp(self.db_file)
+        self.assertEqual(len(reloaded.data['molecules']), 1)
+        self.assertEqual(len(reloaded.data['imports']), 1)
+        self.assertEqual(reloaded.data['imports'][0]['quantity'], 10.0)
+        
+        # Deletes are persisted as well
+        success, _ = app.bulk_delete_imports([app.data['imports'][0]['id']])
+        self.assertTrue(success)
+        success, _ = app.delete_molecule(app.data['molecules'][0]['id'])
+        self.assertTrue(success)
+        
+        reloaded = ImportGoodsApp(self.db_file)
+        self.assertEqual(len(reloaded.data['molecules']), 0)
+        self.assertEqual(len(reloaded.data['imports']), 0)
+    
+    def test_migrate_json_to_sqlite(self):
+        """Test one-shot migration from the JSON data file"""
+        self._populate(ImportGoodsApp(self.json_file))
+        
+        counts = migrate_json_to_sqlite(self.json_file, self.db_file)
+        self.assertEqual(counts, {'molecules': 1, 'companies': 1, 'distributors': 1, 'imports': 1})
+        
+        migrated = ImportGoodsApp(self.db_file)
+        original = ImportGoodsApp(self.json_file)
+        self.assertEqual(migrated.data['imports'], original.data['imports'])
+
+class TestJournaledJsonStorage(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test environment with a temporary journaled JSON store"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.temp_dir.name, 'data.json')
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.temp_dir.cleanup()
+    
+    def test_journal_replay(self):
+        """Test mutations are appended to the journal and replayed on load"""
+        app = ImportGoodsApp(self.data_file, storage="journal")
+        app.add_molecule("Journal Molecule 1")
+        app.add_molecule("Journal Molecule 2")
+        app.delete_molecule(app.data['molecules'][0]['id'])
+        
+        # Nothing is rewritten; only the journal grows
+        self.assertFalse(os.path.exists(self.data_file))
+        with open(app.storage.journal_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+        
+        reloaded = ImportGoodsApp(self.data_file, storage="journal")
+        self.assertEqual([m['name'] for m in reloaded.data['molecules']], ["Journal Molecule 2"])
+    
+    def test_compaction(self):
+        """Test the journal is folded into a snapshot past the threshold"""
+        storage = JournaledJsonStorage(self.data_file, compact_threshold=1)
+        app = ImportGoodsApp(self.data_file, storage=storage)
+        app.add_molecule("Compacted Molecule")
+        storage.wait_for_compaction()
+        
+        self.assertTrue(os.path.exists(self.data_file))
+        self.assertFalse(os.path.exists(storage.journal_path))
+        self.assertFalse(os.path.exists(storage.sealed_path))
+        
+        app.add_company("After Compaction")
+        storage.wait_for_compaction()
+        reloaded = ImportGoodsApp(self.data_file, storage="journal")
+        self.assertEqual(len(reloaded.data['molecules']), 1)
+        self.assertEqual(len(reloaded.data['companies']), 1)
+
+class TestImportTable(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a small import table"""
+        self.records = [
+            {'id': f'imp-{i}', 'date': f'2024-01-{i + 1:02d}', 'molecule_id': f'm{i % 3}',
+             'company_id': 'c1', 'distributor_id': 'd1', 'country': 'USA', 'shipment_mode': None,
+             'quantity': float(i + 1), 'unit': 'KG', 'unit_price': 2.5, 'currency': 'USD', 'hs_code': None}
+            for i in range(10)
+        ]
+        self.table = ImportTable(self.records)
+    
+    def test_row_views(self):
+        """Test rows read back exactly as they were stored"""
+        self.assertEqual(len(self.table), 10)
+        self.assertEqual([dict(row) for row in self.table], self.records)
+        self.assertEqual(self.table[-1]['id'], 'imp-9')
+        self.assertEqual(self.table.get('imp-4')['quantity'], 5.0)
+        self.assertIsNone(self.table.get('missing'))
+    
+    def test_append_and_delete(self):
+        """Test appends and deletes keep columns and the id index aligned"""
+        self.table.append(dict(self.records[0], id='imp-new', date='not-a-date'))
+        self.assertEqual(self.table.get('imp-new')['date'], 'not-a-date')
+        
+        self.assertEqual(self.table.delete(['imp-0', 'imp-5', 'missing']), 2)
+        self.assertEqual(len(self.table), 9)
+        self.assertIsNone(self.table.get('imp-5'))
+        self.assertEqual(self.table.get('imp-6')['quantity'], 7.0)
+        self.assertEqual(self.table.get('imp-new')['date'], 'not-a-date')
+    
+    def test_columns(self):
+        """Test vectorized column access"""
+        self.assertEqual(self.table.column('quantity').sum(), 55.0)
+        ordinals = self.table.column('date_ordinal')
+        self.assertEqual(ordinals[0], datetime(2024, 1, 1).toordinal())
+        codes = self.table.column('molecule_id')
+        self.assertEqual(len(set(codes.tolist())), 3)
+    
+    def test_app_persistence(self):
+        """Test the app serializes the table through the JSON engine"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = os.path.join(temp_dir, 'data.json')
+            app = ImportGoodsApp(data_file)
+            app.data['imports'].extend(self.records)
+            self.assertTrue(app.save_data(app.data))
+            
+            reloaded = ImportGoodsApp(data_file)
+            self.assertIsInstance(reloaded.data['imports'], ImportTable)
+            self.assertEqual(reloaded.data['imports'], self.records)
+
+class TestEntityRegistry(unittest.TestCase):
+    
+    def test_lookups(self):
+        """Test id and normalized-name lookups stay in sync with adds and removes"""
+        registry = EntityRegistry({
+            'molecules': [{'id': 'm1', 'name': 'Aspirin'}, {'id': 'm2', 'name': ' ASPIRIN '}],
+            'companies': [],
+            'distributors': []
+        })
+        self.assertEqual(registry.get('molecules', 'm2')['id'], 'm2')
+        self.assertEqual(registry.find_by_name('molecules', 'aspirin')['id'], 'm1')
+        
+        # Removing the first of two same-named entities falls back to the second
+        registry.remove('molecules', 'm1')
+        self.assertFalse(registry.exists('molecules', 'm1'))
+        self.assertEqual(registry.find_by_name('molecules', 'Aspirin')['id'], 'm2')
+        
+        registry.add('companies', {'id': 'c1', 'name': 'Acme'})
+        self.assertEqual(registry.name_of('companies', 'c1'), 'Acme')
+        self.assertEqual(registry.name_of('companies', 'missing'), 'Unknown')
+    
+    def test_app_uses_registry(self):
+        """Test duplicate checks and entity resolution go through the registry"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = ImportGoodsApp(os.path.join(temp_dir, 'data.json'))
+            app.add_molecule("Registry Molecule")
+            molecule = app.registry.find_by_name('molecules', 'registry molecule')
+            self.assertIsNotNone(molecule)
+            
+            counts = {'molecules': 0}
+            found = app._find_or_create_entity('molecules', 'REGISTRY MOLECULE', lambda name: {'id': 'x', 'name': name},
+                                               counts, 'molecules')
+            self.assertIs(found, molecule)
+            self.assertEqual(counts['molecules'], 0)
+            
+            success, _ = app.delete_molecule(molecule['id'])
+            self.assertTrue(success)
+            self.assertIsNone(app.registry.find_by_name('molecules', 'Registry Molecule'))
+
+class TestDateIndex(unittest.TestCase):
+    
+    def _record(self, index, date):
+        """Build an import record for the given date"""
+        return {'id': f'imp-{index}', 'date': date, 'molecule_id': 'm1', 'company_id': 'c1',
+                'distributor_id': 'd1', 'country': 'USA', 'quantity': 1.0, 'unit': 'KG',
+                'unit_price': 1.0, 'currency': 'USD'}
+    
+    def _brute_force(self, table, start, end):
+        """Ids in [start, end] ordered by date, then by row position"""
+        rows = [(row['date'], position, row['id']) for position, row in enumerate(table)
+                if start <= row['date'] <= end]
+        return [record_id for _, _, record_id in sorted(rows)]
+    
+    def test_range_queries_stay_sorted(self):
+        """Test out-of-order appends, batches and deletes keep range queries exact"""
+        base = datetime(2024, 1, 1)
+        dates = [(base + timedelta(days=(i * 37) % 100)).strftime('%Y-%m-%d') for i in range(60)]
+        table = ImportTable([self._record(i, d) for i, d in enumerate(dates[:20])])
+        for i in range(20, 40):
+            table.append(self._record(i, dates[i]))
+        table.extend(self._record(i, dates[i]) for i in range(40, 60))
+        table.delete([f'imp-{i}' for i in range(0, 60, 7)])
+        table.append(self._record(99, 'bad-date'))
+        
+        for start, end in [('2024-01-01', '2024-12-31'), ('2024-02-01', '2024-02-10'), ('2024-03-05', '2024-03-05')]:
+            start_ordinal = datetime.strptime(start, '%Y-%m-%d').toordinal()
+            end_ordinal = datetime.strptime(end, '%Y-%m-%d').toordinal()
+            selection = table.date_range(start_ordinal, end_ordinal)
+            self.assertEqual([row['id'] for row in selection], self._brute_force(table, start, end))
+    
+    def test_filtered_data_uses_index(self):
+        """Test custom date and search filters match the rows a full scan would pick"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = ImportGoodsApp(os.path.join(temp_dir, 'data.json'))
+            app.add_molecule("Alpha")
+            app.add_molecule("Beta")
+            app.add_company("Company")
+            app.add_distributor("Distributor")
+            molecule_ids = [m['id'] for m in app.data['molecules']]
+            for i in range(30):
+                app.add_import({
+                    'date': f'2024-01-{30 - i:02d}', 'molecule_id': molecule_ids[i % 2],
+                    'company_id': app.data['companies'][0]['id'],
+                    'distributor_id': app.data['distributors'][0]['id'],
+                    'country': ['India', 'USA', 'Indonesia'][i % 3], 'quantity': 1.0,
+                    'unit': 'KG', 'unit_price': 1.0, 'currency': 'USD'
+                })
+            
+            result = app.get_custom_date_data('2024-01-05', '2024-01-20', 'alp', 'ind')
+            expected = [imp['id'] for imp in app.data['imports']
+                        if '2024-01-05' <= imp['date'] <= '2024-01-20'
+                        and imp['molecule_id'] == molecule_ids[0] and 'ind' in imp['country'].lower()]
+            self.assertEqual(sorted(row['id'] for row in result['imports']), sorted(expected))
+
+class TestTrigramIndex(unittest.TestCase):
+    
+    def test_matches_substring_scan(self):
+        """Test index answers equal a brute-force substring scan"""
+        names = {i: name for i, name in enumerate([
+            "Paracetamol", "Para-Aminophenol", "Amlodipine", "Metformin HCl", "Aspirin",
+            "aspirin 500", "Ibuprofen", "Omeprazole", "Esomeprazole", "A"
+        ])}
+        index = TrigramIndex()
+        for key, name in names.items():
+            index.add(key, name)
+        index.remove(6)
+        del names[6]
+        
+        for needle in ["", "a", "AS", "pra", "prazole", "para-a", "in", "xyz", "500", "metformin hcl"]:
+            expected = {key for key, name in names.items() if needle.lower() in name.lower()}
+            self.assertEqual(index.search(needle), expected, needle)
+        self.assertEqual(index.search_ordered("prazole"), [7, 8])
+    
+    def test_entity_and_country_search(self):
+        """Test entity pages and search filters see entities as they are created"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = ImportGoodsApp(os.path.join(temp_dir, 'data.json'))
+            app.add_company("Global Pharma")
+            app.add_company("Pharmacorp")
+            app._find_or_create_entity('companies', 'Local Pharmacy', lambda name: {'id': 'c3', 'name': name},
+                                       {'companies': 0}, 'companies')
+            self.assertEqual([c['name'] for c in app.registry.search('companies', 'pharma')],
+                             ["Global Pharma", "Pharmacorp", "Local Pharmacy"])
+            
+            app.add_molecule("Omeprazole")
+            app.add_distributor("Distributor")
+            for country in ["India", "Indonesia", "USA"]:
+                app.add_import({
+                    'date': '2024-01-01', 'molecule_id': app.data['molecules'][0]['id'],
+                    'company_id': 'c3', 'distributor_id': app.data['distributors'][0]['id'],
+                    'country': country, 'quantity': 1.0, 'unit': 'KG', 'unit_price': 1.0, 'currency': 'USD'
+                })
+            result = app.get_custom_date_data('2024-01-01', '2024-01-01', 'PRAZ', 'indo')
+            self.assertEqual([row['country'] for row in result['imports']], ["Indonesia"])
+
+class TestReferenceCounts(unittest.TestCase):
+    
+    def test_counts_follow_mutations(self):
+        """Test reference counts track add, bulk delete and the delete guard"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = ImportGoodsApp(os.path.join(temp_dir, 'data.json'))
+            app.add_molecule("Paracetamol")
+            app.add_molecule("Aspirin")
+            app.add_company("Pharma Corp")
+            app.add_distributor("Distributor")
+            molecule_ids = [m['id'] for m in app.data['molecules']]
+            company_id = app.data['companies'][0]['id']
+            distributor_id = app.data['distributors'][0]['id']
+            for i in range(3):
+                app.add_import({
+                    'date': '2024-01-0%d' % (i + 1), 'molecule_id': molecule_ids[0],
+                    'company_id': company_id, 'distributor_id': distributor_id,
+                    'country': 'India', 'quantity': 1.0, 'unit': 'KG', 'unit_price': 1.0, 'currency': 'USD'
+                })
+            imports = app.data['imports']
+            self.assertEqual(imports.reference_count('molecule_id', molecule_ids[0]), 3)
+            self.assertEqual(imports.reference_count('molecule_id', molecule_ids[1]), 0)
+            self.assertEqual(imports.reference_count('company_id', company_id), 3)
+            
+            success, _ = app.delete_molecule(molecule_ids[0])
+            self.assertFalse(success)
+            success, _ = app.delete_molecule(molecule_ids[1])
+            self.assertTrue(success)
+            
+            app.bulk_delete_imports([row['id'] for row in list(imports)[:2]])
+            app.wait_for_compaction()
+            imports = app.data['imports']
+            self.assertEqual(imports.reference_count('distributor_id', distributor_id), 1)
+            app.bulk_delete_imports([row['id'] for row in imports])
+            self.assertEqual(app.data['imports'].reference_count('molecule_id', molecule_ids[0]), 0)
+            success, _ = app.delete_molecule(molecule_ids[0])
+            self.assertTrue(success)
+    
+    def test_counts_match_scan(self):
+        """Test counts after bulk extend and reload equal a full scan"""
+        records = [{'id': 'i%d' % i, 'date': '2024-02-01', 'molecule_id': 'm%d' % (i % 4),
+                    'company_id': 'c%d' % (i % 3), 'distributor_id': 'd1', 'quantity': 1.0}
+                   for i in range(50)]
+        table = ImportTable(records)
+        table.append({'id': 'x', 'date': '2024-02-02', 'molecule_id': 'm9', 'company_id': 'c0',
+                      'distributor_id': 'd1', 'quantity': 1.0})
+        table.delete(['i1', 'i2', 'i3'])
+        copy = table.copy()
+        for field in ['molecule_id', 'company_id', 'distributor_id']:
+            for value in {row[field] for row in records} | {'m9', 'missing'}:
+                expected = sum(1 for row in table if row[field] == value)
+                self.assertEqual(table.reference_count(field, value), expected)
+                self.assertEqual(copy.reference_count(field, value), expected)
+
+class TestTombstones(unittest.TestCase):
+    
+    def setUp(self):
+        self.records = [{'id': 'i%d' % i, 'date': '2024-03-%02d' % (10 - i % 10), 'molecule_id': 'm%d' % (i % 3),
+                         'company_id': 'c1', 'distributor_id': 'd1', 'country': 'India',
+                         'quantity': float(i), 'unit_price': 1.0} for i in range(30)]
+        self.table = ImportTable(self.records)
+    
+    def test_readers_skip_tombstones(self):
+        """Test tombstoned rows are invisible before and identical after compaction"""
+        dead = {'i0', 'i5', 'i17', 'i29'}
+        self.assertEqual(self.table.tombstone(list(dead) + ['missing', 'i5']), 4)
+        self.assertEqual(self.table.tombstone(['i5']), 0)
+        live = [r for r in self.records if r['id'] not in dead]
+        
+        def snapshot(table):
+            return (len(table), [row['id'] for row in table], table[0]['id'], table[-1]['id'],
+                    [row['id'] for row in table.date_range(738950, 738960)],
+                    [row['id'] for row in table.by_date()], table.reference_count('molecule_id', 'm2'))
+        
+        before = snapshot(self.table)
+        self.assertEqual(before[0], 26)
+        self.assertEqual(before[1], [r['id'] for r in live])
+        self.assertIsNone(self.table.get('i17'))
+        self.assertEqual(self.table.to_records(), ImportTable(live).to_records())
+        self.assertEqual(self.table.reference_count('molecule_id', 'm2'),
+                         sum(1 for r in live if r['molecule_id'] == 'm2'))
+        
+        self.assertEqual(self.table.compact(), 4)
+        self.assertEqual(self.table.tombstones, 0)
+        self.assertEqual(snapshot(self.table), before)
+        self.assertEqual(self.table.get('i18')['quantity'], 18.0)
+    
+    def test_bulk_delete_by_date_range(self):
+        """Test app bulk delete tombstones rows and compacts them in the background"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = os.path.join(temp_dir, 'data.json')
+            app = ImportGoodsApp(data_file)
+            app.data['imports'].extend(self.records)
+            app.save_data(app.data)
+            
+            old_table = app.data['imports']
+            result = app.get_custom_date_data('2024-03-01', '2024-03-03', '', 'ind')
+            success, _ = app.bulk_delete_imports([row['id'] for row in result['imports']])
+            self.assertTrue(success)
+            app.wait_for_compaction()
+            
+            self.assertIsNot(app.data['imports'], old_table)
+            self.assertEqual(app.data['imports'].tombstones, 0)
+            self.assertEqual(len(app.data['imports']), 21)
+            self.assertEqual(len(ImportGoodsApp(data_file).data['imports']), 21)
+            self.assertEqual(len(app.get_custom_date_data('2024-03-01', '2024-03-03')['imports']), 0)
+
+class TestMetricsEngines(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def make_app(self, rows=3000):
+        """App with random imports; every fifth entity is missing from the catalog"""
+        import random
+        rng = random.Random(7)
+        app = ImportGoodsApp(os.path.join(self.temp_dir.name, 'data.json'))
+        for kind, count in [('molecules', 30), ('companies', 25), ('distributors', 15)]:
+            app.data[kind] = [{'id': '%s%d' % (kind[0], i), 'name': '%s %d' % (kind, i), 'location': 'X'}
+                              for i in range(count) if i % 5]
+        app.registry.rebuild(app.data)
+        app.data['imports'].extend({
+            'id': 'i%d' % i,
+            'date': (datetime(2024, 1, 1) + timedelta(days=rng.randrange(200))).strftime('%Y-%m-%d'),
+            'molecule_id': 'm%d' % rng.randrange(30), 'company_id': 'c%d' % rng.randrange(25),
+            'distributor_id': 'd%d' % rng.randrange(15),
+            'country': rng.choice(['India', 'China', 'Germany', 'USA', 'Italy']),
+            'quantity': rng.uniform(0.1, 1000.0), 'unit_price': 1.0, 'currency': 'USD'
+        } for i in range(rows))
+        return app
+    
+    def windows(self, app):
+        """Date window selections, with and without search filters"""
+        return [
+            app.get_custom_date_data('2024-01-01', '2024-12-31')['imports'],
+            app.get_custom_date_data('2024-02-01', '2024-02-03', 'molecules 1', 'i')['imports'],
+            app.get_custom_date_data('2024-03-01', '2024-05-31', '', 'in')['imports'],
+            app.get_custom_date_data('2025-01-01', '2025-01-02')['imports'],
+        ]
+    
+    def assertSameMetrics(self, actual, expected):
+        """Compare metrics, allowing quantity sums to differ in the last bits"""
+        def rounded(metrics):
+            metrics = json.loads(json.dumps(metrics))
+            metrics['kpis']['total_quantity'] = round(metrics['kpis']['total_quantity'], 6)
+            for section in (metrics['charts'], metrics['tables']):
+                for rows in section.values():
+                    for row in rows:
+                        if 'total_quantity' in row:
+                            row['total_quantity'] = round(row['total_quantity'], 6)
+            return metrics
+        self.assertEqual(rounded(actual), rounded(expected))
+    
+    def test_vectorized_matches_python(self):
+        """Test the vectorized engine returns exactly the pure-Python engine's output"""
+        app = self.make_app()
+        app.data['imports'].tombstone(['i%d' % i for i in range(0, 3000, 7)])
+        
+        selections = self.windows(app) + [
+            app.data['imports'],
+            list(app.data['imports'])[:500],
+        ]
+        for imports in selections:
+            expected = python_metrics(imports, app.registry)
+            self.assertEqual(vectorized_metrics(imports, app.registry), expected)
+            self.assertEqual(app.calculate_metrics({'imports': imports}, engine='python'), expected)
+        self.assertEqual(len(expected['tables']['top_distributors']), 8)
+    
+    def test_top_n(self):
+        """Test every engine honours top_n, and all-history top-k matches the counters"""
+        app = self.make_app()
+        imports = app.get_custom_date_data('2024-01-01', '2024-12-31')['imports']
+        for top_n in [1, 3, 50]:
+            expected = python_metrics(imports, app.registry, top_n)
+            self.assertEqual(vectorized_metrics(imports, app.registry, top_n), expected)
+            self.assertSameMetrics(rollup_metrics(imports, app.registry, top_n), expected)
+        self.assertEqual(len(expected['tables']['top_molecules']), 24)
+        
+        exact = app.top_entities('molecules', 5)
+        approximate = app.top_entities('molecules', 5, approximate=True)
+        self.assertEqual([row['count'] for row in exact],
+                         sorted(app.data['imports'].reference_counts('molecule_id'), reverse=True)[:5])
+        self.assertEqual([row['id'] for row in approximate], [row['id'] for row in exact])
+    
+    def test_rollup_matches_python(self):
+        """Test rollup answers track adds, deletes and compaction"""
+        app = self.make_app()
+        self.assertEqual(app.metrics_engine, 'rollup')
+        
+        def check():
+            for imports in self.windows(app):
+                self.assertIsNotNone(imports.window)
+                self.assertSameMetrics(rollup_metrics(imports, app.registry),
+                                       python_metrics(imports, app.registry))
+        
+        check()
+        app.bulk_delete_imports(['i%d' % i for i in range(0, 3000, 3)])
+        app.wait_for_compaction()
+        self.assertEqual(app.data['imports'].tombstones, 0)
+        check()
+        app.add_import({'date': '2024-02-02', 'molecule_id': 'm1', 'company_id': 'c1', 'distributor_id': 'd1',
+                        'country': 'India', 'quantity': 5.0, 'unit': 'KG', 'unit_price': 2.0, 'currency': 'USD'})
+        app.bulk_delete_imports(['i%d' % i for i in range(1, 3000, 11)])
+        check()
+        
+        # A rollup rebuilt from scratch holds the same non-empty cells
+        from import_goods_rollup import DailyRollup
+        imports = app.data['imports']
+        fresh = DailyRollup(imports)
+        cells = imports.rollup.cells(0, 10 ** 7)
+        self.assertEqual(len(cells), len(fresh.cells(0, 10 ** 7)))
+        self.assertEqual(int(imports.rollup.column('count')[cells].sum()), len(imports))
+    
+    def test_parallel_matches_python(self):
+        """Test month-sharded process pool metrics, before and after the snapshot goes stale"""
+        app = self.make_app()
+        self.addCleanup(app.parallel.close)
+        
+        def check():
+            for imports in self.windows(app):
+                self.assertSameMetrics(app.calculate_metrics({'imports': imports}, 'parallel'),
+                                       python_metrics(imports, app.registry))
+        
+        check()
+        app.bulk_delete_imports(['i%d' % i for i in range(0, 3000, 7)])
+        check()
+        
+        # Row-scanning engines switch to the pool for large windows
+        app.metrics_engine = 'python'
+        app.parallel_rows = 100
+        imports = app.get_custom_date_data('2024-01-01', '2024-12-31')['imports']
+        app.parallel.close()
+        app.calculate_metrics({'imports': imports})
+        self.assertIsNotNone(app.parallel._snapshot)
+    
+    def test_sliding_windows_match_python(self):
+        """Test sliding windows through day roll-overs, adds, deletes and compaction"""
+        app = self.make_app()
+        windows = next(l for l in app.data['imports'].listeners if isinstance(l, SlidingWindows))
+        
+        def check(today):
+            imports = app.data['imports']
+            for name, days in WINDOW_DAYS.items():
+                expected = python_metrics(imports.date_range(today - days, today), app.registry)
+                self.assertSameMetrics(windows.metrics(imports, name, app.registry, today, 10), expected)
+        
+        start = datetime(2024, 1, 1).toordinal()
+        for today in [start + 40, start + 41, start + 45, start + 150, start + 120, start + 400]:
+            check(today)
+        check(start + 100)
+        app.bulk_delete_imports(['i%d' % i for i in range(0, 3000, 3)])
+        app.add_import({'date': '2024-04-01', 'molecule_id': 'm3', 'company_id': 'c3', 'distributor_id': 'd3',
+                        'country': 'Peru', 'quantity': 5.0, 'unit': 'KG', 'unit_price': 2.0, 'currency': 'USD'})
+        check(start + 100)
+        app.wait_for_compaction()
+        check(start + 101)
+        check(start + 130)
+        
+        # Unfiltered standard dashboards are served from the sliding windows
+        monthly = app.get_metrics('monthly')
+        today = datetime.now().date().toordinal()
+        self.assertSameMetrics(monthly, python_metrics(app.data['imports'].date_range(today - 30, today), app.registry))
+
+class TestMetricsCache(unittest.TestCase):
+    
+    def test_lru_day_and_version(self):
+        """Test eviction order, day expiry and version invalidation"""
+        today = [datetime(2024, 1, 1).date()]
+        cache = MetricsCache(capacity=2, clock=lambda: today[0])
+        calls = []
+        compute = lambda key: (lambda: calls.append(key) or {'key': key})
+        
+        cache.get_or_compute('a', 0, compute('a'))
+        cache.get_or_compute('b', 0, compute('b'))
+        cache.get_or_compute('a', 0, compute('a'))
+        cache.get_or_compute('c', 0, compute('c'))  # evicts b, the least recently used
+        cache.get_or_compute('a', 0, compute('a'))
+        cache.get_or_compute('b', 0, compute('b'))
+        self.assertEqual(calls, ['a', 'b', 'c', 'b'])
+        
+        today[0] = datetime(2024, 1, 2).date()
+        cache.get_or_compute('a', 0, compute('a'))
+        cache.get_or_compute('a', 1, compute('a'))
+        self.assertEqual(calls, ['a', 'b', 'c', 'b', 'a', 'a'])
+        self.assertEqual(cache.stats(), {'size': 1, 'capacity': 2, 'hits': 2, 'misses': 6,
+                                         'evictions': 2, 'invalidations': 2})
+    
+    def test_app_writes_invalidate(self):
+        """Test every write path bumps the data version seen by cached metrics"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            app = ImportGoodsApp(os.path.join(temp_dir, 'data.json'))
+            app.add_molecule("Paracetamol")
+            app.add_company("Pharma Corp")
+            app.add_distributor("Distributor")
+            record = {
+                'date': datetime.now().strftime('%Y-%m-%d'), 'molecule_id': app.data['molecules'][0]['id'],
+                'company_id': app.data['companies'][0]['id'], 'distributor_id': app.data['distributors'][0]['id'],
+                'country': 'India', 'quantity': 2.0, 'unit': 'KG', 'unit_price': 1.0, 'currency': 'USD'
+            }
+            
+            self.assertEqual(app.get_metrics('monthly')['kpis']['total_imports'], 0)
+            self.assertIs(app.get_metrics('monthly', '', ''), app.get_metrics('monthly'))
+            app.add_import(record)
+            self.assertEqual(app.get_metrics('monthly')['kpis']['total_imports'], 1)
+            app.add_import(record)
+            metrics = app.get_metrics('monthly', 'PARA', 'india')
+            self.assertIs(app.get_metrics('monthly', 'para', 'INDIA'), metrics)
+            self.assertEqual(metrics['kpis']['total_imports'], 2)
+            
+            version = app.data_version
+            app.bulk_delete_imports([app.data['imports'][0]['id']])
+            self.assertGreater(app.data_version, version)
+            self.assertEqual(app.get_metrics('monthly', 'para', 'india')['kpis']['total_imports'], 1)
+            self.assertIn('error', app.get_custom_date_metrics('2024-02-01', '2024-01-01'))
+            self.assertGreaterEqual(app.metrics_cache.stats()['hits'], 2)
+
+class TestConditionalResponses(unittest.TestCase):
+    
+    def setUp(self):
+        import import_goods_app
+        self.module = import_goods_app
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_app = import_goods_app.import_app
+        self.app = import_goods_app.import_app = ImportGoodsApp(os.path.join(self.temp_dir.name, 'data.json'))
+        self.client = import_goods_app.app.test_client()
+    
+    def tearDown(self):
+        self.module.import_app = self.original_app
+        self.temp_dir.cleanup()
+    
+    def test_etag_revalidation(self):
+        """Test If-None-Match gets 304 until a write changes the data version"""
+        for url in ['/api/chart-data?time_filter=weekly&search_country=in',
+                    '/api/custom-date-data?start_date=2024-01-01&end_date=2024-01-31']:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            etag = first.headers['ETag']
+            self.assertFalse(etag.startswith('W/'))
+            self.assertIn('Last-Modified', first.headers)
+            
+            lookups = self.app.metrics_cache.stats()['hits'] + self.app.metrics_cache.stats()['misses']
+            repeat = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.data, b'')
+            since = self.client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+            self.assertEqual(since.status_code, 304)
+            # Revalidation never reached the metrics layer
+            stats = self.app.metrics_cache.stats()
+            self.assertEqual(stats['hits'] + stats['misses'], lookups)
+            
+            self.app.add_molecule("Molecule %s" % url)
+            changed = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed.headers['ETag'], etag)
+        
+        error = self.client.get('/api/custom-date-data?start_date=2024-02-01&end_date=2024-01-01')
+        self.assertEqual(error.status_code, 400)
+        self.assertNotIn('ETag', error.headers)
+
+class TestTopK(unittest.TestCase):
+    
+    def test_top_k_indices_matches_full_sort(self):
+        """Test partition-based top-k equals a full sort, ties included"""
+        import numpy as np
+        rng = np.random.default_rng(3)
+        for size, k in [(0, 5), (4, 10), (500, 10), (500, 1), (50, 50)]:
+            totals = rng.integers(0, 8, size)
+            first = rng.permutation(size)
+            expected = np.lexsort((first, -totals))[:k]
+            self.assertEqual(top_k_indices(totals, first, k).tolist(), expected.tolist())
+    
+    def test_space_saving_bounds(self):
+        """Test Space-Saving counts bracket the true counts and keep heavy hitters"""
+        import random
+        from collections import Counter
+        rng = random.Random(11)
+        stream = [min(int(rng.paretovariate(1.2)), 5000) for _ in range(20000)]
+        sketch = SpaceSaving(capacity=50)
+        for item in stream:
+            sketch.add(item)
+        true_counts = Counter(stream)
+        
+        self.assertEqual(len(sketch), 50)
+        for entry in sketch.top(50):
+            self.assertLessEqual(entry['count'] - entry['error'], true_counts[entry['item']])
+            self.assertGreaterEqual(entry['count'], true_counts[entry['item']])
+        tracked = {entry['item'] for entry in sketch.top(50)}
+        for item, count in true_counts.items():
+            if count > len(stream) / 50:
+                self.assertIn(item, tracked)
+        guaranteed = [entry['item'] for entry in sketch.top(3) if entry['guaranteed']]
+        self.assertTrue(guaranteed)
+        self.assertLessEqual(set(guaranteed), {item for item, _ in true_counts.most_common(3)})
+
+class TestHyperLogLog(unittest.TestCase):
+    
+    def test_estimate_within_error_bound(self):
+        """Test estimates stay within three standard errors and merging equals a union"""
+        import numpy as np
+        for cardinality in [0, 1, 100, 5000, 200000]:
+            sketch = HyperLogLog()
+            sketch.add_hashes(hash64(np.arange(cardinality)))
+            sketch.add_hashes(hash64(np.arange(cardinality // 2)))
+            self.assertLessEqual(abs(sketch.count() - cardinality), 3 * 0.0163 * cardinality + 1)
+        
+        left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        left.add_hashes(hash64(np.arange(0, 60000)))
+        right.add_hashes(hash64(np.arange(40000, 100000)))
+        union.add_hashes(hash64(np.arange(0, 100000)))
+        left.merge(right)
+        self.assertEqual(left.count(), union.count())
+    
+    def test_daily_sketches_follow_deletes(self):
+        """Test window estimates track adds and deletes, and large windows use them"""
+        import import_goods_metrics
+        engines = TestMetricsEngines('test_top_n')
+        engines.setUp()
+        self.addCleanup(engines.tearDown)
+        app = engines.make_app(rows=6000)
+        imports = app.data['imports']
+        sketches = next(l for l in imports.listeners if isinstance(l, DailyDistinct))
+        
+        def exact(start, end):
+            rows = imports.date_range(start, end)
+            return {field: len(set(rows.column(field).tolist())) for field in ['company_id', 'distributor_id']}
+        
+        start = datetime(2024, 1, 1).toordinal()
+        app.bulk_delete_imports([row['id'] for row in imports.date_range(start, start + 60)
+                                 if row['company_id'] in ('c1', 'c2', 'c3')])
+        imports = app.data['imports']
+        for end in [start, start + 30, start + 199]:
+            self.assertEqual(sketches.distinct(imports, start, end), exact(start, end))
+        
+        selection = app.get_custom_date_data('2024-01-01', '2024-12-31')['imports']
+        original = import_goods_metrics.EXACT_DISTINCT_ROWS
+        import_goods_metrics.EXACT_DISTINCT_ROWS = 100
+        try:
+            metrics = rollup_metrics(selection, app.registry)
+        finally:
+            import_goods_metrics.EXACT_DISTINCT_ROWS = original
+        expected = python_metrics(selection, app.registry)['kpis']
+        self.assertEqual(metrics['kpis']['active_companies'], expected['active_companies'])
+        self.assertEqual(metrics['kpis']['active_distributors'], expected['active_distributors'])
+
+class TestFingerprintIndex(unittest.TestCase):
+    
+    def test_bloom_filter_and_exact_set(self):
+        """Test the index finds every live row, forgets deleted ones and survives Bloom filter growth"""
+        records = [{'id': str(i), 'date': '2024-03-%02d' % (i % 28 + 1), 'molecule_id': 'm%d' % (i % 7),
+                    'company_id': 'c', 'distributor_id': 'd', 'country': 'India', 'shipment_mode': None,
+                    'quantity': float(i), 'unit': 'KG', 'unit_price': 1.5, 'currency': 'USD', 'hs_code': None}
+                   for i in range(3000)]
+        table = ImportTable(records[:100])
+        index = FingerprintIndex(table)
+        table.listeners.append(index)
+        table.extend(records[100:])
+        self.assertEqual(len(index), 3000)
+        self.assertGreaterEqual(index.bloom.capacity, 3000)
+
+        fresh = [dict(record, id='new', quantity=record['quantity'] + 0.5) for record in records]
+        self.assertTrue(index.duplicates([dict(record, id='new') for record in records]).all())
+        self.assertFalse(index.duplicates(fresh).any())
+        self.assertEqual(index.duplicates([fresh[0], fresh[1], fresh[0]]).tolist(), [False, False, True])
+
+        table.tombstone(['0', '1'])
+        self.assertEqual(index.duplicates(records[:3]).tolist(), [False, False, True])
+        table.compact()
+        self.assertEqual(index.duplicates(records[:3]).tolist(), [False, False, True])
+
+class TestTDigest(unittest.TestCase):
+    
+    def test_quantiles_within_rank_error(self):
+        """Test digest quantiles stay close in rank and merged digests match one built at once"""
+        import numpy as np
+        values = np.random.default_rng(3).lognormal(3, 1, 50000)
+        parts = []
+        for chunk in np.array_split(values, 12):
+            digest = TDigest()
+            for batch in np.array_split(chunk, 20):
+                digest.add_many(batch)
+            parts.append(digest)
+        merged = TDigest.merged(parts)
+        
+        self.assertEqual(merged.count, len(values))
+        self.assertLessEqual(len(merged.means), merged.compression)
+        self.assertEqual(merged.quantile(0), values.min())
+        self.assertEqual(merged.quantile(1), values.max())
+        for q in [0.01, 0.1, 0.5, 0.9, 0.99]:
+            self.assertLess(abs(np.mean(values < merged.quantile(q)) - q), 0.01)
+        self.assertIsNone(TDigest().quantile(0.5))
+    
+    def test_window_quantiles_follow_deletes(self):
+        """Test price quantiles per molecule x currency over partial and whole months, after deletes"""
+        import random
+        import numpy as np
+        rng = random.Random(11)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        app = ImportGoodsApp(os.path.join(temp_dir.name, 'data.json'))
+        app.data['molecules'] = [{'id': 'm%d' % i, 'name': 'molecule %d' % i} for i in range(4)]
+        app.registry.rebuild(app.data)
+        app.data['imports'].extend({
+            'id': 'i%d' % i,
+            'date': (datetime(2024, 1, 1) + timedelta(days=rng.randrange(180))).strftime('%Y-%m-%d'),
+            'molecule_id': 'm%d' % rng.randrange(4), 'company_id': 'c1', 'distributor_id': 'd1',
+            'country': 'India', 'quantity': 1.0, 'unit_price': rng.lognormvariate(3, 0.5),
+            'currency': rng.choice(['USD', 'EUR'])
+        } for i in range(8000))
+        app.bulk_delete_imports([row['id'] for row in app.data['imports'].date_range(
+            datetime(2024, 3, 1).toordinal(), datetime(2024, 3, 31).toordinal()) if row['molecule_id'] == 'm1'])
+        
+        result = app.price_quantiles('2024-01-10', '2024-05-20', quantiles=[0.1, 0.5, 0.9], top_n=100)
+        rows = [row for row in app.data['imports'] if '2024-01-10' <= row['date'] <= '2024-05-20']
+        self.assertEqual(len(result['groups']), 8)
+        self.assertEqual(sum(group['count'] for group in result['groups']), len(rows))
+        for group in result['groups']:
+            prices = np.array([row['unit_price'] for row in rows if row['molecule_id'] == group['molecule_id']
+                               and row['currency'] == group['currency']])
+            self.assertEqual(group['count'], len(prices))
+            for q, value in group['quantiles'].items():
+                self.assertLess(abs(np.mean(prices < value) - float(q)), 0.02)
+        
+        usd = app.price_quantiles('2024-01-10', '2024-05-20', 'molecule 2', 'usd')
+        self.assertTrue(usd['groups'])
+        self.assertTrue(all(g['currency'] == 'USD' and g['molecule_id'] == 'm2' for g in usd['groups']))
+        self.assertIn('error', app.price_quantiles('2024-05-20', '2024-01-10'))
+
+class TestTimeSeries(unittest.TestCase):
+    
+    def test_bucket_series(self):
+        """Test day, week and month buckets cover the window and keep empty buckets"""
+        import numpy as np
+        days = np.array([datetime(2024, 1, 31).toordinal(), datetime(2024, 2, 1).toordinal(),
+                         datetime(2024, 4, 15).toordinal()])
+        start, end = datetime(2024, 1, 10).toordinal(), datetime(2024, 4, 30).toordinal()
+        
+        starts, values = bucket_series(days, np.array([1.0, 2.0, 4.0]), start, end, 'month')
+        self.assertEqual([datetime.fromordinal(d).strftime('%Y-%m-%d') for d in starts.tolist()],
+                         ['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01'])
+        self.assertEqual(values.tolist(), [1.0, 2.0, 0.0, 4.0])
+        
+        starts, values = bucket_series(days, np.ones(3), start, end, 'week')
+        self.assertTrue(all(datetime.fromordinal(d).weekday() == 0 for d in starts.tolist()))
+        self.assertEqual(values.sum(), 3)
+        self.assertEqual(len(bucket_series(days, np.ones(3), start, end, 'day')[0]), end - start + 1)
+    
+    def test_lttb_keeps_ends_and_peaks(self):
+        """Test LTTB returns the requested number of points, including the endpoints and a spike"""
+        import numpy as np
+        x = np.arange(1000)
+        y = np.sin(x / 50.0)
+        y[437] = 25.0
+        kept = lttb(x, y, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(kept) > 0))
+        self.assertIn(437, kept.tolist())
+        self.assertEqual(lttb(x[:20], y[:20], 50).tolist(), list(range(20)))
+    
+    def test_app_timeseries(self):
+        """Test the app series totals, filters and point limit"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        app = ImportGoodsApp(os.path.join(temp_dir.name, 'data.json'))
+        app.data['imports'].extend({
+            'id': 'i%d' % i, 'date': (datetime(2023, 1, 1) + timedelta(days=i % 700)).strftime('%Y-%m-%d'),
+            'molecule_id': 'm1', 'company_id': 'c1', 'distributor_id': 'd1', 'country': 'India',
+            'quantity': 2.0, 'unit_price': 3.0, 'currency': 'USD' if i % 2 else 'EUR'
+        } for i in range(2000))
+        
+        monthly = app.timeseries('count', 'month')
+        self.assertEqual(monthly['buckets'], 23)
+        self.assertEqual(sum(value for _, value in monthly['points']), 2000)
+        
+        value = app.timeseries('value', 'month', currency='usd')
+        self.assertEqual(sum(v for _, v in value['points']), 1000 * 6.0)
+        
+        daily = app.timeseries('quantity', 'day', '2023-01-01', '2024-12-31', max_points=100)
+        self.assertEqual(daily['buckets'], 731)
+        self.assertEqual(len(daily['points']), 100)
+        self.assertEqual(daily['points'][-1], ['2024-12-31', 0.0])
+        self.assertIn('error', app.timeseries('price'))
+
+class TestExcelIngest(unittest.TestCase):
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = ImportGoodsApp(os.path.join(self.temp_dir.name, 'data.json'))
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def upload(self, rows):
+        import io
+        import pandas as pd
+        stream = io.BytesIO()
+        pd.DataFrame(rows).to_excel(stream, index=False)
+        stream.seek(0)
+        return self.app.process_excel_data(stream, {})
+    
+    def test_skip_reasons_in_row_order(self):
+        """Test each check rejects rows with the row loop's reasons, first failing check wins"""
+        good = {'Date': '2024-03-05', 'HS Code': 29420000, 'Product Description': 'Aspirin',
+                'Consignee Name': 'Comp A', 'Shipper Name': 'Ship A', 'Country of Origin': ' India ',
+                'QTY': 5, 'Unit': 'KG', 'Rate In FC': 1.5, 'Rate Currency': ' usd '}
+        rows = [
+            dict(good),
+            dict(good, Date='not a date', QTY=-1),
+            dict(good, QTY='many'),
+            dict(good, Unit=' '),
+            dict(good, **{'Rate In FC': -2}),
+            dict(good, **{'Rate Currency': 'XYZ'}),
+            dict(good, **{'Product Description': ' ', 'Consignee Name': ''}),
+            dict(good, **{'Product Description': 'New Molecule', 'Consignee Name': ' '}),
+            dict(good, **{'Product Description': 'aspirin', 'Consignee Name': 'COMP A', 'QTY': '7'}),
+        ]
+        result = self.upload(rows)
+        
+        self.assertEqual(result['processed'], 9)
+        self.assertEqual(result['skipped'], 7)
+        self.assertEqual(result['errors'], [
+            {'row': 3, 'reason': 'Invalid date format: not a date'},
+            {'row': 4, 'reason': 'Invalid quantity: many'},
+            {'row': 5, 'reason': 'Unit is required'},
+            {'row': 6, 'reason': 'Invalid unit price: -2.0'},
+            {'row': 7, 'reason': 'Invalid currency: XYZ'},
+            {'row': 8, 'reason': 'Product description is required'},
+            {'row': 9, 'reason': 'Consignee name is required'},
+        ])
+        # A molecule is created before the consignee check rejects its row; names match case-insensitively
+        self.assertEqual(result['created'], {'molecules': 2, 'companies': 1, 'distributors': 1, 'imports': 2})
+        imports = list(self.app.data['imports'])
+        self.assertEqual(len({row['molecule_id'] for row in imports}), 1)
+        self.assertEqual([row['quantity'] for row in imports], [5.0, 7.0])
+        self.assertEqual(imports[0]['currency'], 'USD')
+        self.assertEqual(imports[0]['country'], 'India')
+        self.assertEqual(imports[0]['date'], '2024-03-05')
+        self.assertIsNone(imports[0]['shipment_mode'])
+    
+    def test_generate_ids(self):
+        """Test bulk ids are distinct version 4 UUIDs"""
+        import uuid
+        ids = generate_ids(1000)
+        self.assertEqual(len(set(ids)), 1000)
+        for value in ids[:50]:
+            self.assertEqual(str(uuid.UUID(value)), value)
+            self.assertEqual(uuid.UUID(value).version, 4)
+        self.assertEqual(generate_ids(0), [])
+
+    def test_streamed_file_matches_dataframe(self):
+        """Test a workbook streamed in small chunks gives the same result as a single read"""
+        import pandas as pd
+        good = {'Date': '2024-03-05', 'Product Description': 'Aspirin', 'Consignee Name': 'Comp A',
+                'Shipper Name': 'Ship A', 'Country of Origin': 'India', 'QTY': 5, 'Unit': 'KG',
+                'Rate In FC': 1.5, 'Rate Currency': 'USD'}
+        rows = [dict(good, QTY=i + 1) for i in range(5)]
+        rows[1]['QTY'] = 'many'
+        rows[4]['Rate Currency'] = 'XYZ'
+        path = os.path.join(self.temp_dir.name, 'upload.xlsx')
+        pd.DataFrame(rows).to_excel(path, index=False)
+
+        with ExcelChunkReader(path, chunk_rows=2) as reader:
+            frames = list(reader)
+        self.assertEqual([len(frame) for frame in frames], [2, 2, 1])
+        self.assertEqual(list(frames[2].index + 2), [6])
+
+        expected = self.app.process_excel_data(path, {})
+        other = ImportGoodsApp(os.path.join(self.temp_dir.name, 'other.json'))
+        result = other.process_file(path, chunk_rows=2)
+        self.assertEqual(result, expected)
+        self.assertEqual(result['errors'], [
+            {'row': 3, 'reason': 'Invalid quantity: many'},
+            {'row': 6, 'reason': 'Invalid currency: XYZ'},
+        ])
+        self.assertEqual([row['quantity'] for row in other.data['imports']], [1.0, 3.0, 4.0])
+
+    def test_upload_runs_as_background_job(self):
+        """Test uploads return a job at once, run in order, and report progress"""
+        import io
+        import pandas as pd
+        import import_goods_app
+        original = import_goods_app.import_app
+        import_goods_app.import_app = self.app
+        try:
+            client = import_goods_app.app.test_client()
+            jobs = []
+            for batch in range(2):
+                rows = [{'Date': '2024-03-05', 'Product Description': 'Aspirin', 'Consignee Name': 'Comp A',
+                         'Shipper Name': 'Ship A', 'Country of Origin': 'India', 'QTY': batch * 10 + i + 1,
+                         'Unit': 'KG', 'Rate In FC': 1.5, 'Rate Currency': 'USD'} for i in range(3)]
+                stream = io.BytesIO()
+                pd.DataFrame(rows).to_excel(stream, index=False)
+                stream.seek(0)
+                response = client.post('/upload_excel', data={'file': (stream, 'batch.xlsx')},
+                                       headers={'Accept': 'application/json'})
+                self.assertEqual(response.status_code, 202)
+                self.assertIn(response.get_json()['status'], ['queued', 'running', 'done'])
+                self.assertTrue(response.headers['Location'].endswith(response.get_json()['id']))
+                jobs.append(response.get_json()['id'])
+
+            for job_id in jobs:
+                self.assertTrue(self.app.ingest_jobs.get(job_id).wait(30))
+                status = client.get(f'/api/ingest-jobs/{job_id}').get_json()
+                self.assertEqual(status['status'], 'done')
+                self.assertEqual((status['processed'], status['skipped'], status['eta_seconds']), (3, 0, 0.0))
+                self.assertEqual(status['created']['imports'], 3)
+            # The second upload ran after the first, so it found the entities already created
+            self.assertEqual(client.get(f'/api/ingest-jobs/{jobs[1]}').get_json()['created']['molecules'], 0)
+            self.assertEqual([row['quantity'] for row in self.app.data['imports']], [1.0, 2.0, 3.0, 11.0, 12.0, 13.0])
+            self.assertEqual(client.get('/api/ingest-jobs/missing').status_code, 404)
+        finally:
+            import_goods_app.import_app = original
+
+    def test_batch_merges_entities_across_files_and_sheets(self):
+        """Test a batch reads every sheet, creates each new entity once and commits once"""
+        import pandas as pd
+        good = {'Date': '2024-03-05', 'Product Description': 'Aspirin', 'Consignee Name': 'Comp A',
+                'Shipper Name': 'Ship A', 'Country of Origin': 'India', 'QTY': 1, 'Unit': 'KG',
+                'Rate In FC': 1.5, 'Rate Currency': 'USD'}
+        paths = [os.path.join(self.temp_dir.name, name) for name in ('mumbai.xlsx', 'chennai.xlsx')]
+        with pd.ExcelWriter(paths[0]) as writer:
+            pd.DataFrame([good, dict(good, QTY=2, **{'Product Description': ' ASPIRIN '})]).to_excel(
+                writer, sheet_name='Air', index=False)
+            pd.DataFrame([dict(good, QTY=3, **{'Consignee Name': 'Comp B'})]).to_excel(
+                writer, sheet_name='Sea', index=False)
+            pd.DataFrame({'Notes': ['not imports']}).to_excel(writer, sheet_name='Notes', index=False)
+        pd.DataFrame([dict(good, QTY=4, **{'Consignee Name': 'comp b'}), dict(good, QTY=-1)]).to_excel(
+            paths[1], index=False)
+
+        version = self.app.data_version
+        result = self.app.process_batch(paths, max_workers=2)
+        self.assertEqual(self.app.data_version, version + 1)
+        self.assertEqual(result['created'], {'molecules': 1, 'companies': 2, 'distributors': 1, 'imports': 4})
+        self.assertEqual((result['processed'], result['skipped']), (5, 1))
+        self.assertEqual(result['errors'], [
+            {'row': 3, 'reason': 'Invalid quantity: -1', 'file': 'chennai.xlsx', 'sheet': 'Sheet1'}])
+        self.assertEqual([(sheet['file'], sheet['sheet'], sheet['processed']) for sheet in result['sheets']],
+                         [('mumbai.xlsx', 'Air', 2), ('mumbai.xlsx', 'Sea', 1), ('mumbai.xlsx', 'Notes', 0),
+                          ('chennai.xlsx', 'Sheet1', 2)])
+        self.assertIn('Missing required columns', result['sheets'][2]['error'])
+        # Records follow file then sheet order whichever worker finished first
+        self.assertEqual([row['quantity'] for row in self.app.data['imports']], [1.0, 2.0, 3.0, 4.0])
+
+    def test_failed_chunk_rolls_back_and_resumes(self):
+        """Test a chunk that fails to save leaves nothing behind, and the ingest resumes from its checkpoint"""
+        import pandas as pd
+        from import_goods_storage import CHECKPOINTS
+        good = {'Date': '2024-03-05', 'Product Description': 'Aspirin', 'Consignee Name': 'Comp A',
+                'Shipper Name': 'Ship A', 'Country of Origin': 'India', 'QTY': 1, 'Unit': 'KG',
+                'Rate In FC': 1.5, 'Rate Currency': 'USD'}
+        rows = [dict(good, QTY=1), dict(good, QTY='many'),
+                dict(good, QTY=3, **{'Product Description': 'Ibuprofen', 'Consignee Name': 'Comp B'}),
+                dict(good, QTY=4), dict(good, QTY=5, **{'Shipper Name': 'Ship C'})]
+        path = os.path.join(self.temp_dir.name, 'upload.xlsx')
+        pd.DataFrame(rows).to_excel(path, index=False)
+
+        for engine, name in (('json', 'data.json'), ('journal', 'journal.json'), ('sqlite', 'data.db')):
+            with self.subTest(engine=engine):
+                data_file = os.path.join(self.temp_dir.name, name)
+                app = ImportGoodsApp(data_file, storage=engine)
+                apply, calls = app.storage.apply, []
+
+                def failing_apply(*args, **kwargs):
+                    calls.append(kwargs)
+                    return len(calls) != 2 and apply(*args, **kwargs)
+
+                app.storage.apply = failing_apply
+                result = app.process_file(path, chunk_rows=2)
+                self.assertIn('Could not save', result['error'])
+                # Chunk 2 brought Ibuprofen and Comp B; neither may outlive its failed commit
+                self.assertEqual([row['quantity'] for row in app.data['imports']], [1.0])
+                self.assertEqual([m['name'] for m in app.data['molecules']], ['Aspirin'])
+                self.assertIsNone(app.registry.find_by_name('companies', 'Comp B'))
+                [state] = app.data[CHECKPOINTS].values()
+                self.assertEqual((state['row'], state['processed'], state['skipped']), (3, 2, 1))
+                app.storage.close()
+
+                app = ImportGoodsApp(data_file, storage=engine)
+                self.assertEqual(list(app.data[CHECKPOINTS].values()), [state])
+                result = app.process_file(path, chunk_rows=2)
+                self.assertEqual(result['resumed_after_row'], 3)
+                self.assertEqual((result['processed'], result['skipped']), (5, 1))
+                self.assertEqual(result['created'], {'molecules': 2, 'companies': 2, 'distributors': 2, 'imports': 4})
+                self.assertEqual(result['errors'], [{'row': 3, 'reason': 'Invalid quantity: many'}])
+                self.assertEqual([row['quantity'] for row in app.data['imports']], [1.0, 3.0, 4.0, 5.0])
+                self.assertEqual(app.data[CHECKPOINTS], {})
+                app.storage.close()
+
+                app = ImportGoodsApp(data_file, storage=engine)
+                self.assertEqual((len(app.data['imports']), len(app.data['companies'])), (4, 2))
+                self.assertEqual(app.data[CHECKPOINTS], {})
+                app.storage.close()
+
+    def test_reupload_skips_duplicate_rows(self):
+        """Test rows already imported, or repeated within an upload, are counted as duplicates and not added"""
+        import pandas as pd
+        good = {'Date': '2024-03-05', 'Product Description': 'Aspirin', 'Consignee Name': 'Comp A',
+                'Shipper Name': 'Ship A', 'Country of Origin': 'India', 'QTY': 1, 'Unit': 'KG',
+                'Rate In FC': 1.5, 'Rate Currency': 'USD'}
+        first = [dict(good, QTY=1), dict(good, QTY=2), dict(good, QTY=2)]
+        self.assertEqual(self.upload(first)['duplicates'], 1)
+        self.assertEqual(len(self.app.data['imports']), 2)
+
+        # An overlapping extract; names match case-insensitively, the shipment mode is not compared
+        path = os.path.join(self.temp_dir.name, 'overlap.csv')
+        pd.DataFrame([dict(good, QTY=2, **{'Consignee Name': 'COMP A', 'Shipment Mode': 'Sea'}),
+                      dict(good, QTY=3), dict(good, QTY=1, **{'Rate Currency': 'EUR'})]).to_csv(path, index=False)
+        reloaded = ImportGoodsApp(self.app.data_file)
+        result = reloaded.process_file(path, chunk_rows=2)
+        self.assertEqual((result['duplicates'], result['created']['imports'], result['skipped']), (1, 2, 0))
+        self.assertEqual(sorted((row['quantity'], row['currency']) for row in reloaded.data['imports']),
+                         [(1.0, 'EUR'), (1.0, 'USD'), (2.0, 'USD'), (3.0, 'USD')])
+
+        # Once deleted, a row can be imported again
+        deleted = [row['id'] for row in reloaded.data['imports'] if row['quantity'] == 3.0]
+        reloaded.bulk_delete_imports(deleted)
+        result = reloaded.process_file(path)
+        self.assertEqual((result['duplicates'], result['created']['imports']), (2, 1))
+
+        batch = reloaded.process_batch([path])
+        self.assertEqual((batch['duplicates'], batch['sheets'][0]['duplicates']), (3, 3))
+        self.assertEqual(batch['created']['imports'], 0)
+
+    def format_rows(self):
+        good = {'Date': '2024-03-05', 'HS Code': '0101', 'Product Description': 'Aspirin',
+                'Consignee Name': 'Comp A', 'Shipper Name': 'Ship A', 'Country of Origin': 'India',
+                'QTY': 5, 'Unit': 'KG', 'Rate In FC': 1.5, 'Rate Currency': 'usd'}
+        return [good, dict(good, Date='2024-02-30'), dict(good, QTY='many'), dict(good, Unit=' '),
+                dict(good, **{'Rate Currency': 'XYZ'}), dict(good, **{'Consignee Name': ' '}),
+                dict(good, Date='2024-03-06 10:30:00', QTY='7', **{'Product Description': ' aspirin '})]
+
+    def imported(self, app):
+        return [(row['date'], app.registry.name_of('molecules', row['molecule_id']), row['quantity'],
+                 row['currency'], row['hs_code']) for row in app.data['imports']]
+
+    def test_csv_matches_xlsx(self):
+        """Test a CSV upload gets the same checks, skip reasons and entities as the same rows in .xlsx"""
+        import pandas as pd
+        rows = self.format_rows()
+        xlsx, csv = (os.path.join(self.temp_dir.name, name) for name in ('upload.xlsx', 'upload.csv'))
+        pd.DataFrame(rows).to_excel(xlsx, index=False)
+        pd.DataFrame(rows).to_csv(csv, index=False)
+        # A blank line still counts towards the line numbers of the rows after it
+        with open(csv) as source:
+            lines = source.read().splitlines()
+        with open(csv, 'w') as target:
+            target.write('\n'.join(lines[:3] + [''] + lines[3:]) + '\n')
+
+        expected = self.app.process_file(xlsx, chunk_rows=3)
+        other = ImportGoodsApp(os.path.join(self.temp_dir.name, 'other.json'))
+        result = other.process_file(csv, chunk_rows=3)
+        self.assertEqual(result['created'], expected['created'])
+        self.assertEqual([error['reason'] for error in result['errors']],
+                         [error['reason'] for error in expected['errors']])
+        self.assertEqual([error['row'] for error in result['errors']], [3, 5, 6, 7, 8])
+        self.assertEqual(self.imported(other), [('2024-03-05', 'Aspirin', 5.0, 'USD', '0101'),
+                                                ('2024-03-06', 'Aspirin', 7.0, 'USD', '0101')])
+        self.assertEqual(self.imported(other), [row[:4] + ('0101',) for row in self.imported(self.app)])
+
+        unsupported = os.path.join(self.temp_dir.name, 'upload.txt')
+        open(unsupported, 'w').close()
+        self.assertIn('Unsupported file type', self.app.process_file(unsupported)['error'])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'Parquet uploads need pyarrow')
+    def test_parquet_matches_xlsx(self):
+        """Test a Parquet upload gets the same results as the same rows in .xlsx"""
+        import pandas as pd
+        rows = self.format_rows()
+        xlsx, parquet = (os.path.join(self.temp_dir.name, name) for name in ('upload.xlsx', 'upload.parquet'))
+        pd.DataFrame(rows).to_excel(xlsx, index=False)
+        pd.DataFrame(rows).astype({'QTY': str}).to_parquet(parquet, index=False)
+
+        expected = self.app.process_file(xlsx, chunk_rows=3)
+        other = ImportGoodsApp(os.path.join(self.temp_dir.name, 'other.json'))
+        result = other.process_file(parquet, chunk_rows=3)
+        self.assertEqual((result['created'], result['errors']), (expected['created'], expected['errors']))
+        self.assertEqual(self.imported(other), self.imported(self.app))
+
 def run_tests():
     """Run all tests"""
     print("Running Import Goods Application Tests...")
     print("=" * 50)
     
     # Create test suite
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestImportGoodsApp)
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)